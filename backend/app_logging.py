@@ -0,0 +1,194 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# Logging settings (override via environment variables)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" (one object per line) or "text"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Prompt / answer / item dumps: off by default; when on, LOG_PAYLOAD_SAMPLE_RATE of them are kept
+LOG_PAYLOADS = os.getenv("LOG_PAYLOADS", "0") == "1"
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "1"))
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "2000"))
+
+ROOT_LOGGER = "hdc"
+REDACTED = "[REDACTED]"
+
+# Provider key formats (Groq, Anthropic / OpenAI, Google) and bearer tokens
+_SECRET_PATTERN = re.compile(
+    r'gsk_[A-Za-z0-9]{8,}|sk-[A-Za-z0-9_\-]{8,}|AIza[A-Za-z0-9_\-]{20,}|(?<=Bearer )[A-Za-z0-9._\-]{8,}')
+# Whole field names only: "prompt_tokens" or "cache_key" are not secrets
+_SECRET_FIELD = re.compile(r'^(api_?key|.*secret|(access|auth|refresh|bearer)_?token|password|authorization)$',
+                           re.IGNORECASE)
+_SECRET_ENV = re.compile(r'(_API_KEY|_SECRET|_TOKEN|_PASSWORD)$')
+
+# LogRecord attributes; anything else on a record came from extra={...}
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+def get_logger(component: str) -> logging.Logger:
+    """Logger for a part of the app ("pdf", "dispatch", ...); its records go through the queue"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{component}")
+
+
+class Redactor:
+    """Masks API keys in log output: known key formats and the values of *_API_KEY style variables"""
+
+    def __init__(self):
+        self._secrets: set = set()
+        self._lock = threading.Lock()
+
+    def add_secret(self, value: Optional[str]):
+        if value and len(value) >= 8:
+            with self._lock:
+                self._secrets = self._secrets | {value}
+
+    def add_environment_secrets(self):
+        for name, value in os.environ.items():
+            if _SECRET_ENV.search(name):
+                self.add_secret(value)
+
+    def redact(self, text: str) -> str:
+        for secret in self._secrets:
+            if secret in text:
+                text = text.replace(secret, REDACTED)
+        return _SECRET_PATTERN.sub(REDACTED, text)
+
+    def redact_field(self, name: str, value):
+        if _SECRET_FIELD.search(name):
+            return REDACTED
+        if isinstance(value, str):
+            return self.redact(value)
+        if isinstance(value, (int, float, bool)) or value is None:
+            return value
+        return self.redact(str(value))
+
+
+redactor = Redactor()
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    One JSON object per record (ts, level, logger, msg, fields passed with
+    extra={...}, exc), or a readable line when json_output is False.
+    Secrets are redacted here, in the listener thread.
+    """
+
+    def __init__(self, json_output: bool = True):
+        super().__init__()
+        self.json_output = json_output
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {name: redactor.redact_field(name, value) for name, value in vars(record).items()
+                  if name not in _RECORD_FIELDS and not name.startswith("_")}
+        message = redactor.redact(record.getMessage())
+        component = record.name[len(ROOT_LOGGER) + 1:] if record.name.startswith(ROOT_LOGGER + ".") else record.name
+        if self.json_output:
+            entry = {"ts": round(record.created, 3), "level": record.levelname, "logger": component, "msg": message}
+            entry.update(fields)
+            if record.exc_text:
+                entry["exc"] = redactor.redact(record.exc_text)
+            return json.dumps(entry, ensure_ascii=False, default=str)
+        line = f"{self.formatTime(record)} {record.levelname:<7} [{component}] {message}"
+        if fields:
+            line += " " + " ".join(f"{name}={value}" for name, value in fields.items())
+        if record.exc_text:
+            line += "\n" + redactor.redact(record.exc_text)
+        return line
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread without waiting: the message is
+    merged with its args and the traceback rendered here (so the record no
+    longer references live objects), and when the queue is full the record
+    is dropped and counted instead of blocking the event loop.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+_setup_lock = threading.Lock()
+
+
+def configure_logging(level: str = LOG_LEVEL, json_output: bool = LOG_FORMAT != "text", stream=None):
+    """
+    Route the app's loggers through a bounded queue to a background thread
+    that formats and writes them (stdout by default). Safe to call more than
+    once; only the first call installs the pipeline.
+    """
+    global _listener, _queue_handler
+    with _setup_lock:
+        if _listener is not None:
+            return
+        redactor.add_environment_secrets()
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(StructuredFormatter(json_output))
+        log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        _queue_handler = NonBlockingQueueHandler(log_queue)
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(level)
+        root.addHandler(_queue_handler)
+        root.propagate = False
+        _listener = QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Write out the queued records and stop the listener thread"""
+    global _listener
+    with _setup_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        _listener = None
+        if _queue_handler is not None and _queue_handler.dropped:
+            print(f"[Logging] {_queue_handler.dropped} records dropped (queue full)", file=sys.stderr)
+
+
+def dropped_records() -> int:
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+def log_payload(logger: logging.Logger, message: str, **payload):
+    """
+    Debug dump of a prompt, answer or item list. Skipped (before anything is
+    formatted) unless LOG_PAYLOADS=1, then sampled at LOG_PAYLOAD_SAMPLE_RATE
+    and logged at INFO; long values are cut to LOG_PAYLOAD_MAX_CHARS.
+    """
+    if not LOG_PAYLOADS or (LOG_PAYLOAD_SAMPLE_RATE < 1 and random.random() >= LOG_PAYLOAD_SAMPLE_RATE):
+        return
+    fields = {}
+    for name, value in payload.items():
+        text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+        fields[name] = text if len(text) <= LOG_PAYLOAD_MAX_CHARS else text[:LOG_PAYLOAD_MAX_CHARS] + "..."
+    logger.info(message, extra={"payload": True, **fields})
@@ -0,0 +1,212 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app_logging import get_logger
+
+logger = get_logger("cache")
+
+
+def canonical_hash(data: Any) -> str:
+    """SHA-256 of a JSON-serializable value, independent of key order and whitespace"""
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class TieredCache:
+    """
+    Bounded LRU cache of bytes values with an optional on-disk tier.
+
+    The memory tier is limited by entry count and total size. Entries evicted
+    from memory stay on disk (limited by max_disk_bytes) and are promoted
+    back on their next hit. Every entry expires ttl seconds after it was stored.
+    Keys must be safe to use as file names (e.g. hex digests).
+
+    From async code use aget() / aset(): a memory hit is answered right
+    away, disk reads and writes run in a worker thread. Values are read
+    and written outside the lock.
+    """
+
+    def __init__(self, name: str, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024,
+                 ttl: float = 24 * 3600, disk_dir: Optional[str] = None,
+                 max_disk_bytes: int = 512 * 1024 * 1024):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, stored_at)
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()  # key -> size, oldest first
+        self._disk_bytes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.bin")
+
+    def _load_disk_index(self):
+        """Index entries left on disk by a previous run, oldest first"""
+        entries = []
+        for file_name in os.listdir(self.disk_dir):
+            if not file_name.endswith('.bin'):
+                continue
+            stat = os.stat(os.path.join(self.disk_dir, file_name))
+            entries.append((stat.st_mtime, file_name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Cached value for key, or None if missing or expired"""
+        value, on_disk = self._get_memory(key)
+        if on_disk:
+            return self._get_disk(key)
+        return value
+
+    async def aget(self, key: str) -> Optional[bytes]:
+        """get() for the event loop: only a disk lookup leaves the loop"""
+        value, on_disk = self._get_memory(key)
+        if on_disk:
+            return await asyncio.to_thread(self._get_disk, key)
+        return value
+
+    def set(self, key: str, value: bytes):
+        """Store value under key in memory and, if configured, on disk"""
+        self._set_memory(key, value)
+        if self.disk_dir:
+            self._write_disk(key, value)
+
+    async def aset(self, key: str, value: bytes):
+        """set() for the event loop: the disk write runs in a worker thread"""
+        self._set_memory(key, value)
+        if self.disk_dir:
+            await asyncio.to_thread(self._write_disk, key, value)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            for key in list(self._disk):
+                self._drop_disk(key)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._memory),
+            "bytes": self._memory_bytes,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+        }
+
+    def _get_memory(self, key: str) -> Tuple[Optional[bytes], bool]:
+        """(value, False) on a memory hit, (None, True) when only the disk tier can have it, else a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                if now - stored_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value, False
+                self._drop_memory(key)
+            if key in self._disk:
+                return None, True
+            self.misses += 1
+            return None, False
+
+    def _get_disk(self, key: str) -> Optional[bytes]:
+        value, stored_at = self._read_disk(key)
+        with self._lock:
+            if value is not None and time.time() - stored_at <= self.ttl:
+                self._drop_memory(key)
+                self._store_memory(key, value, stored_at)
+                self.hits += 1
+                self.disk_hits += 1
+                return value
+            self._drop_disk(key)  # Expired or gone
+            self.misses += 1
+            return None
+
+    def _set_memory(self, key: str, value: bytes):
+        with self._lock:
+            self._drop_memory(key)
+            self._store_memory(key, value, time.time())
+
+    def _read_disk(self, key: str) -> tuple:
+        try:
+            path = self._disk_path(key)
+            with open(path, 'rb') as f:
+                return f.read(), os.path.getmtime(path)
+        except OSError:
+            return None, 0.0
+
+    def _write_disk(self, key: str, value: bytes):
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"  # Per thread: writers of one key may overlap
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("%s disk write failed: %s", self.name, e)
+            return
+        with self._lock:
+            self._disk_bytes -= self._disk.pop(key, 0)
+            self._disk[key] = len(value)
+            self._disk_bytes += len(value)
+            self._evict_disk()
+
+    # Internal helpers (called with the lock held)
+
+    def _store_memory(self, key: str, value: bytes, stored_at: float):
+        if len(value) > self.max_bytes:
+            return
+        self._memory[key] = (value, stored_at)
+        self._memory_bytes += len(value)
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes:
+            oldest_key = next(iter(self._memory))
+            self._drop_memory(oldest_key)
+            self.evictions += 1
+
+    def _drop_memory(self, key: str):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= len(entry[0])
+
+    def _drop_disk(self, key: str):
+        size = self._disk.pop(key, None)
+        if size is None:
+            return
+        self._disk_bytes -= size
+        try:
+            os.remove(self._disk_path(key))
+        except OSError:
+            pass
+
+    def _evict_disk(self):
+        while self._disk and self._disk_bytes > self.max_disk_bytes:
+            self._drop_disk(next(iter(self._disk)))
+            self.evictions += 1
@@ -0,0 +1,265 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS categories (
+    name TEXT PRIMARY KEY,          -- "cameras/ip_cameras"
+    section TEXT NOT NULL,          -- "cameras"
+    subcategory TEXT NOT NULL,      -- "ip_cameras"
+    position INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS inventory_items (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    category TEXT NOT NULL REFERENCES categories(name),
+    price REAL NOT NULL,
+    unit TEXT NOT NULL,
+    description TEXT,
+    extra TEXT,                     -- JSON of the other inventory.json fields (warranty, channels, ...)
+    position INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_inventory_items_category ON inventory_items(category, position);
+
+CREATE TABLE IF NOT EXISTS inventory_rules (
+    name TEXT PRIMARY KEY,          -- "camera_dependencies", "cabling_calculation", ...
+    body TEXT NOT NULL,             -- JSON
+    position INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS quotations (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,       -- Unix time
+    raw_input TEXT NOT NULL,
+    ai_provider TEXT,
+    cache_hit INTEGER NOT NULL DEFAULT 0,
+    item_count INTEGER NOT NULL,
+    total REAL NOT NULL,
+    duration_ms REAL
+);
+CREATE INDEX IF NOT EXISTS idx_quotations_created_at ON quotations(created_at);
+CREATE INDEX IF NOT EXISTS idx_quotations_provider ON quotations(ai_provider, created_at);
+
+CREATE TABLE IF NOT EXISTS quotation_items (
+    quotation_id INTEGER NOT NULL REFERENCES quotations(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    rate REAL NOT NULL,
+    amount REAL NOT NULL,
+    inventory_id TEXT,              -- Inventory item the line was matched to, if any
+    category TEXT,
+    PRIMARY KEY (quotation_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_quotation_items_inventory ON quotation_items(inventory_id, quotation_id);
+CREATE INDEX IF NOT EXISTS idx_quotation_items_category ON quotation_items(category, quotation_id);
+"""
+
+
+class QuotationDatabase:
+    """
+    SQLite storage for the inventory, its dependency rules and the history of
+    processed quotations.
+
+    The database runs in WAL mode, so reads (from any thread, each with its
+    own connection) do not block on a write in progress. Writes are
+    serialized with a lock.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            with self._write_lock, conn:
+                conn.executescript(SCHEMA)
+                conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.execute("PRAGMA synchronous=NORMAL")  # Safe in WAL mode; fsync at checkpoints only
+            self._local.conn = conn
+        return conn
+
+    # Meta values (e.g. the hash of the last imported inventory.json)
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._connection().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_meta(self, key: str, value: str):
+        conn = self._connection()
+        with self._write_lock, conn:
+            conn.execute("INSERT INTO meta (key, value) VALUES (?, ?) "
+                         "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, value))
+
+    # Inventory
+
+    def replace_inventory(self, items: Iterable[Dict], rules: Optional[Dict] = None):
+        """
+        Make the inventory tables match items (dicts with id, name, category,
+        price, unit, description and optionally extra). Items without an
+        `extra` key keep the extra fields stored earlier. Rules are replaced
+        only when given.
+        """
+        items = list(items)
+        categories: Dict[str, None] = {}
+        for item in items:
+            categories.setdefault(item["category"], None)
+
+        conn = self._connection()
+        with self._write_lock, conn:
+            for position, name in enumerate(categories):
+                section, _, subcategory = name.partition('/')
+                conn.execute(
+                    "INSERT INTO categories (name, section, subcategory, position) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET position = excluded.position",
+                    (name, section, subcategory, position))
+
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS current_ids (id TEXT PRIMARY KEY)")
+            conn.execute("DELETE FROM current_ids")
+            conn.executemany("INSERT OR IGNORE INTO current_ids (id) VALUES (?)", [(item["id"],) for item in items])
+            conn.execute("DELETE FROM inventory_items WHERE id NOT IN (SELECT id FROM current_ids)")
+
+            conn.executemany(
+                "INSERT INTO inventory_items (id, name, category, price, unit, description, extra, position) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET name = excluded.name, category = excluded.category, "
+                "price = excluded.price, unit = excluded.unit, description = excluded.description, "
+                "extra = COALESCE(excluded.extra, inventory_items.extra), position = excluded.position",
+                [(item["id"], item["name"], item["category"], item["price"], item["unit"],
+                  item.get("description"), json.dumps(item["extra"]) if "extra" in item else None, position)
+                 for position, item in enumerate(items)])
+            conn.execute("DELETE FROM categories WHERE name NOT IN (SELECT DISTINCT category FROM inventory_items)")
+
+            if rules is not None:
+                conn.execute("DELETE FROM inventory_rules")
+                conn.executemany("INSERT INTO inventory_rules (name, body, position) VALUES (?, ?, ?)",
+                                 [(name, json.dumps(body), position) for position, (name, body) in enumerate(rules.items())])
+
+    def inventory_items(self, category: Optional[str] = None) -> List[Dict]:
+        """Inventory items in catalogue order (InventoryItem fields only)"""
+        query = ("SELECT i.id, i.name, i.category, i.price, i.unit, i.description FROM inventory_items i "
+                 "JOIN categories c ON c.name = i.category")
+        params: tuple = ()
+        if category is not None:
+            query += " WHERE i.category = ?"
+            params = (category,)
+        query += " ORDER BY c.position, i.position"
+        return [dict(row) for row in self._connection().execute(query, params)]
+
+    def inventory_specs(self) -> Dict[str, Dict]:
+        """Item id -> the extra inventory.json fields of the item (channels, capacity, ports, ...)"""
+        rows = self._connection().execute("SELECT id, extra FROM inventory_items WHERE extra IS NOT NULL")
+        return {row["id"]: json.loads(row["extra"]) for row in rows}
+
+    def inventory_rules(self) -> Dict:
+        rows = self._connection().execute("SELECT name, body FROM inventory_rules ORDER BY position")
+        return {row["name"]: json.loads(row["body"]) for row in rows}
+
+    # Quotation history
+
+    def save_quotation(self, raw_input: str, ai_provider: str, items: List[Dict], cache_hit: bool = False,
+                       duration_ms: Optional[float] = None, created_at: Optional[float] = None) -> int:
+        """
+        Record a processed quotation; items are dicts with description,
+        quantity, rate, amount and optionally inventory_id and category.
+        Returns the quotation id.
+        """
+        conn = self._connection()
+        with self._write_lock, conn:
+            cursor = conn.execute(
+                "INSERT INTO quotations (created_at, raw_input, ai_provider, cache_hit, item_count, total, duration_ms) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (created_at if created_at is not None else time.time(), raw_input, ai_provider, int(cache_hit),
+                 len(items), sum(item["amount"] for item in items), duration_ms))
+            quotation_id = cursor.lastrowid
+            conn.executemany(
+                "INSERT INTO quotation_items (quotation_id, position, description, quantity, rate, amount, inventory_id, category) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(quotation_id, position, item["description"], item["quantity"], item["rate"], item["amount"],
+                  item.get("inventory_id"), item.get("category"))
+                 for position, item in enumerate(items)])
+        return quotation_id
+
+    def get_quotation(self, quotation_id: int) -> Optional[Dict]:
+        row = self._connection().execute("SELECT * FROM quotations WHERE id = ?", (quotation_id,)).fetchone()
+        if row is None:
+            return None
+        return self._with_items([dict(row)])[0]
+
+    def find_quotations(self, inventory_id: Optional[str] = None, category: Optional[str] = None,
+                        text: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+                        ai_provider: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """
+        Quotations, newest first, filtered by what they contain and when they
+        were made. inventory_id, category, since/until and ai_provider use
+        indexes; text is a substring match on item descriptions.
+        """
+        conditions, params = [], []
+        if inventory_id is not None:
+            conditions.append("q.id IN (SELECT quotation_id FROM quotation_items WHERE inventory_id = ?)")
+            params.append(inventory_id)
+        if category is not None:
+            # A section ("cameras") matches all of its subcategories; a range instead of LIKE keeps the index usable
+            conditions.append("q.id IN (SELECT quotation_id FROM quotation_items "
+                              "WHERE category = ? OR (category >= ? AND category < ?))")
+            params.extend([category, f"{category}/", f"{category}0"])  # '0' sorts right after '/'
+        if text:
+            conditions.append("EXISTS (SELECT 1 FROM quotation_items t WHERE t.quotation_id = q.id AND t.description LIKE ?)")
+            params.append(f"%{text}%")
+        if since is not None:
+            conditions.append("q.created_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("q.created_at < ?")
+            params.append(until)
+        if ai_provider is not None:
+            conditions.append("q.ai_provider = ?")
+            params.append(ai_provider)
+
+        query = "SELECT q.* FROM quotations q"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY q.created_at DESC LIMIT ?"
+        params.append(limit)
+        return self._with_items([dict(row) for row in self._connection().execute(query, params)])
+
+    def _with_items(self, quotations: List[Dict]) -> List[Dict]:
+        if not quotations:
+            return quotations
+        by_id = {quotation["id"]: quotation for quotation in quotations}
+        for quotation in quotations:
+            quotation["cache_hit"] = bool(quotation["cache_hit"])
+            quotation["items"] = []
+        placeholders = ",".join("?" * len(by_id))
+        rows = self._connection().execute(
+            f"SELECT quotation_id, description, quantity, rate, amount, inventory_id, category FROM quotation_items "
+            f"WHERE quotation_id IN ({placeholders}) ORDER BY quotation_id, position", list(by_id))
+        for row in rows:
+            item = dict(row)
+            by_id[item.pop("quotation_id")]["items"].append(item)
+        return quotations
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
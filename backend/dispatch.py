@@ -0,0 +1,174 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Tuple
+
+from app_logging import get_logger
+
+logger = get_logger("dispatch")
+
+
+class ProviderUnavailable(Exception):
+    """Raised instead of calling a provider whose circuit breaker is open"""
+
+
+def is_quota_or_timeout_error(error: Exception) -> bool:
+    """True for errors that mean 'stop calling this provider for a while' (rate limits, quota, timeouts)"""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    if getattr(error, "status_code", None) == 429:
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in ("quota", "rate limit", "rate_limit", "resource_exhausted", "429", "timed out", "timeout"))
+
+
+class CircuitBreaker:
+    """
+    Skips a provider after repeated quota/timeout errors.
+
+    After failure_threshold consecutive such errors the breaker opens and
+    allow() returns False for cooldown seconds. After the cool-down one trial
+    call is let through; success closes the breaker, another failure opens it
+    again for a new cool-down window.
+    """
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.failures < self.failure_threshold:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self._trial_running = False
+
+    def release_trial(self):
+        """Give up a half-open trial slot without recording an outcome (call was cancelled)"""
+        self._trial_running = False
+
+    def record_failure(self, error: Exception):
+        self._trial_running = False
+        if not is_quota_or_timeout_error(error):
+            return
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+async def call_with_breaker(breaker: CircuitBreaker, timeout: float,
+                            call: Callable[[], Awaitable[Any]], name: str = "provider") -> Any:
+    """Run call() with a timeout, skipping it while the breaker is open and recording the outcome"""
+    if not breaker.allow():
+        raise ProviderUnavailable(f"{name} skipped (circuit open after repeated quota/timeout errors)")
+    try:
+        try:
+            result = await asyncio.wait_for(call(), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise asyncio.TimeoutError(f"{name} timed out after {timeout:g}s")
+    except asyncio.CancelledError:
+        breaker.release_trial()
+        raise
+    except Exception as e:
+        breaker.record_failure(e)
+        raise
+    breaker.record_success()
+    return result
+
+
+async def stream_with_breaker(breaker: CircuitBreaker, timeout: float,
+                              stream: Callable[[], AsyncIterator[Any]], name: str = "provider") -> AsyncIterator[Any]:
+    """
+    Yield the chunks of stream() under the same rules as call_with_breaker:
+    skipped while the breaker is open, the whole stream limited to timeout
+    seconds, the outcome recorded when it ends. Closing the generator early
+    records nothing.
+    """
+    if not breaker.allow():
+        raise ProviderUnavailable(f"{name} skipped (circuit open after repeated quota/timeout errors)")
+    deadline = time.monotonic() + timeout
+    chunks = stream().__aiter__()
+    try:
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=max(0.0, deadline - time.monotonic()))
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                raise asyncio.TimeoutError(f"{name} timed out after {timeout:g}s")
+            yield chunk
+    except (asyncio.CancelledError, GeneratorExit):
+        breaker.release_trial()
+        raise
+    except Exception as e:
+        breaker.record_failure(e)
+        raise
+    finally:
+        close = getattr(chunks, "aclose", None)
+        if close is not None:
+            await close()
+    breaker.record_success()
+
+
+async def hedged_race(attempts: List[Tuple[str, Callable[[], Awaitable[Any]]]], hedge_delay: float) -> Tuple[str, Any]:
+    """
+    Race providers with hedging and return (name, result) of the first success.
+
+    The first attempt starts immediately. Each further attempt starts when the
+    previous one has been running for hedge_delay seconds without an answer,
+    or right away when a running attempt fails. Attempts still running when one
+    succeeds are cancelled. Raises the last error if every attempt fails.
+    """
+    if not attempts:
+        raise ProviderUnavailable("No AI provider available")
+
+    pending = {}
+    remaining = list(attempts)
+    last_error: Exception = ProviderUnavailable("No AI provider available")
+
+    def start_next():
+        name, call = remaining.pop(0)
+        pending[asyncio.ensure_future(call())] = name
+
+    start_next()
+    try:
+        while pending:
+            timeout = hedge_delay if remaining else None
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            if not done:
+                # Slow answer: hedge with the next provider
+                start_next()
+                continue
+
+            for task in done:
+                name = pending.pop(task)
+                try:
+                    return name, task.result()
+                except Exception as e:
+                    last_error = e
+                    logger.warning("%s failed: %s", name, e)
+
+            # A provider failed: don't wait for the hedge delay to try the next one
+            if remaining:
+                start_next()
+        raise last_error
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,503 @@
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from rules_engine import RulesEngine, JobRequirements, QuoteLine, ROLE_MATCHERS
+
+# Words agents use for each kind of item. Item names and ids from the
+# inventory are added as aliases too, so "toshiba" or "wd purple" pick that
+# exact disk while "hdd" means "the right disk for the job".
+CONCEPT_ALIASES = {
+    "camera": ["camera", "cam", "cctv", "cctv camera", "ip camera", "ip cam", "camera ip", "cam ip",
+               "bullet", "bullet camera", "dome", "dome camera"],
+    "camera_360": ["360", "360 camera", "360 cam", "360 rotation", "360 degree", "ptz", "fisheye",
+                   "rotation", "rotation camera"],
+    "camera_analog": ["analog", "analog camera", "analogue", "analogue camera"],
+    "nvr": ["nvr", "recorder"],
+    "dvr": ["dvr"],
+    "hard_disk": ["hdd", "hard disk", "harddisk", "hard drive", "disk", "storage"],
+    "backup": ["backup", "back up"],
+    "poe_switch": ["poe", "poe switch", "switch", "network switch"],
+    "cabling": ["cable", "cabling", "utp", "wire", "wiring", "cat6", "cat 6"],
+    "patch_cord": ["patch cord", "patch cable", "patch"],
+    "jack_boots": ["jack", "boot", "jack boot", "jack and boot", "rj45", "connector"],
+    "co_box": ["co box", "cobox", "junction box"],
+    "hdmi": ["hdmi", "hdmi cable"],
+    "monitor": ["monitor", "display", "tv", "screen"],
+    "mouse": ["mouse"],
+    "surge_protector": ["surge", "surge protector", "pdu", "spike guard", "spike buster"],
+    "electrical_materials": ["electrical", "electrical material"],
+    "adaptor": ["adaptor", "adapter", "power supply", "smps"],
+    "installation": ["installation", "install", "fitting", "configuration"],
+    "floor": ["floor", "storey", "story", "storie"],
+}
+
+UNITS = {
+    "count": {"no", "nos", "pc", "pcs", "piece", "qty", "unit", "set", "number", "x"},
+    "length": {"m", "mtr", "mtrs", "meter", "metre", "mt"},
+    "storage": {"tb"},
+    "channels": {"ch", "channel"},
+    "ports": {"port"},
+    "days": {"day"},
+    "weeks": {"week"},
+    "months": {"month"},
+    "years": {"year", "yr"},
+    "floors": {"floor", "storey", "story", "storie"},
+    "spec": {"mp", "k", "gb", "mm", "inch"},  # "4mp", "4k": part of a description, not a quantity
+}
+_UNIT_KIND = {unit: kind for kind, units in UNITS.items() for unit in units}
+_DAYS_PER = {"days": 1, "weeks": 7, "months": 30, "years": 365}
+
+# Words that take something out of the job ("no nvr needed"); the parser cannot quote them.
+# "no" after a number is the unit ("5 no").
+NEGATION_WORDS = {"no", "not", "without", "except", "excluding", "exclude", "dont", "don", "remove"}
+
+# "2 cameras per floor", "4000 each": a quantity or price per something, which the parser does not multiply out
+PER_WORDS = {"per", "each", "every"}
+
+# Camera aliases that name a body type; the camera picked for them must be of that type
+CAMERA_TYPE_WORDS = {"bullet", "dome"}
+
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+                "nine": 9, "ten": 10, "single": 1, "double": 2, "a": 1, "an": 1}
+
+# Words that carry no item meaning (they still count as understood)
+FILLER_WORDS = {"and", "with", "for", "the", "of", "to", "in", "on", "at", "need", "needed", "required",
+                "want", "new", "site", "total", "approx", "around", "about", "quality", "good", "all", "plus", "also", "customer", "building", "house", "shop", "office", "ground", "first",
+                "second", "top", "ai", "color", "colour", "full", "hd", "type", "model", "brand", "a", "an"}
+
+# Concepts that name a rules engine role directly
+_ENGINE_ROLES = {"patch_cord", "jack_boots", "co_box", "hdmi", "monitor", "mouse", "surge_protector",
+                 "electrical_materials", "adaptor"}
+
+# Sized roles and the unit of their size ("8ch nvr", "2tb hdd", "16 port switch")
+_SIZE_UNITS = {"nvr": "channels", "dvr": "channels", "hard_disk": "storage", "poe_switch": "ports"}
+
+# Concepts whose matches take a count ("5 cameras", "2 hdmi"); floors, backup, cabling and installation do not
+_COUNTED_CONCEPTS = {"camera", "camera_360", "camera_analog"} | _ENGINE_ROLES | set(_SIZE_UNITS)
+
+_TOKEN_PATTERN = re.compile(r'\d+(?:\.\d+)?|[a-z]+')
+_SEGMENT_PATTERN = re.compile(r'[,;]')
+
+
+def _normalize(word: str) -> str:
+    """Lowercase singular form ("cameras" -> "camera", "boots" -> "boot")"""
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Words and numbers; "200m" -> ["200", "m"], "2tb" -> ["2", "tb"]"""
+    return [_normalize(token) for token in _TOKEN_PATTERN.findall(text.lower().replace('°', ''))]
+
+
+def keywords(tokens: List[str]) -> set:
+    """Words that tell items apart: no fillers or bare numbers, sizes kept whole ("4mp", "2tb")"""
+    words = set()
+    for position, token in enumerate(tokens):
+        if token[0].isdigit():
+            if position + 1 < len(tokens) and tokens[position + 1] in _UNIT_KIND:
+                words.add(token + tokens[position + 1])
+        elif token not in FILLER_WORDS and token not in _UNIT_KIND and token not in NUMBER_WORDS:
+            words.add(token)
+    return words
+
+
+class AliasTrie:
+    """Token trie mapping alias word sequences to targets; finds the longest alias starting at a position"""
+
+    def __init__(self):
+        self._root: Dict = {}
+
+    def add(self, words: List[str], target: Tuple[str, Optional[str]]):
+        if not words:
+            return
+        node = self._root
+        for word in words:
+            node = node.setdefault(word, {})
+        node.setdefault(None, target)  # First alias registered for a word sequence wins
+
+    def longest(self, tokens: List[str], start: int) -> Tuple[int, Optional[Tuple[str, Optional[str]]]]:
+        """(length, target) of the longest alias at tokens[start:], or (0, None)"""
+        node, best = self._root, (0, None)
+        for position in range(start, len(tokens)):
+            node = node.get(tokens[position])
+            if node is None:
+                break
+            if None in node:
+                best = (position - start + 1, node[None])
+        return best
+
+
+@dataclass
+class Match:
+    concept: str
+    item_id: Optional[str]  # Set when an alias names one inventory item
+    start: int
+    end: int
+    line: int
+    ambiguous: bool = False
+
+
+@dataclass
+class ParsedNote:
+    """What the parser understood of a note, plus how sure it is"""
+    job: JobRequirements
+    matches: List[Match]
+    words: int  # Tokens in the note
+    understood: int  # Tokens that were part of an alias, a quantity, a unit or a filler word
+    unknown: List[str] = field(default_factory=list)
+    uncovered: List[str] = field(default_factory=list)  # What the parser saw but cannot quote faithfully
+
+    @property
+    def coverage(self) -> float:
+        return self.understood / self.words if self.words else 0.0
+
+    @property
+    def ambiguous(self) -> int:
+        return sum(1 for match in self.matches if match.ambiguous)
+
+    @property
+    def confidence(self) -> float:
+        """
+        0..1: share of the note's words that were understood, halved for the
+        share of matches that fit several items equally well. 0 when nothing
+        quotable was found, or when part of the note cannot be quoted as
+        written: a negation, a "per"/"each" quantity, a number bound to no
+        item, a missing, zero or fractional count, or a spec or camera type
+        ("4mp", "dome") that the picked item does not have.
+        """
+        if self.uncovered:
+            return 0.0
+        if not self.job.cameras and not self.job.extra_items and not self.job.cable_m:
+            return 0.0
+        matched = sum(1 for match in self.matches if match.item_id) or 1
+        return self.coverage * (1 - 0.5 * min(1.0, self.ambiguous / matched))
+
+
+class FastParser:
+    """
+    Offline parser for agent site notes.
+
+    At construction it compiles an alias trie from CONCEPT_ALIASES and every
+    inventory item's name and id. parse() walks each line once, matches
+    aliases (longest first), picks up quantities and units ("5 nos",
+    "200m", "2tb", "1 month", "2 floors") and resolves items to real
+    inventory ids; quote() then prices the result with the rules engine
+    (dependent items, cabling, installation). Build a new parser when the
+    inventory changes.
+    """
+
+    def __init__(self, engine: RulesEngine):
+        self.engine = engine
+        self.items = engine.items
+        self._trie = AliasTrie()
+
+        # Item names / ids first so "cat6 cable" or "nvr 8 channel" beat the generic words
+        for item in self.items.values():
+            self._trie.add(tokenize(item.name), ("item", item.id))
+            self._trie.add(tokenize(item.id.replace('_', ' ')), ("item", item.id))
+        concept_words = self._concept_words = set()
+        for concept, aliases in CONCEPT_ALIASES.items():
+            for alias in aliases:
+                self._trie.add(tokenize(alias), (concept, None))
+                concept_words.update(tokenize(alias))
+
+        # A word found in only one item's name ("toshiba", "gigabyte") hints at that item
+        self._item_words = {item.id: keywords(tokenize(f"{item.name} {item.description or ''}"))
+                            for item in self.items.values()}
+        owners: Dict[str, List[str]] = {}
+        for item in self.items.values():
+            for word in keywords(tokenize(item.name)):
+                owners.setdefault(word, []).append(item.id)
+        for word, item_ids in owners.items():
+            if len(item_ids) == 1 and word.isalpha() and len(word) > 2 and word not in concept_words:
+                self._trie.add([word], ("hint", item_ids[0]))
+
+        self._ip_cameras = engine.cameras(analog=False)
+        self._analog_cameras = engine.cameras(analog=True)
+        self._360_cameras = [item for item in self._ip_cameras if "360" in tokenize(item.name)]
+
+    # Item resolution
+
+    def _best(self, candidates: List, line_words: set, default=None):
+        """Candidate sharing the most words with the line; (item, ambiguous)"""
+        if not candidates:
+            return None, False
+        scored = sorted(((len(self._item_words[item.id] & line_words), position, item)
+                         for position, item in enumerate(candidates)), key=lambda entry: (-entry[0], entry[1]))
+        best_score = scored[0][0]
+        ties = [item for score, _, item in scored if score == best_score]
+        if len(ties) == 1 or default in ties:
+            return (ties[0] if len(ties) == 1 else default), False
+        # No distinguishing words means the usual pick (what the rules engine would choose);
+        # words that fit several items equally are ambiguous
+        return ties[0], best_score > 0
+
+    def _resolve_camera(self, concept: str, line_words: set):
+        if concept == "camera_360" and self._360_cameras:
+            return self._best(self._360_cameras, line_words)
+        if concept == "camera_analog" and self._analog_cameras:
+            return self._best(self._analog_cameras, line_words)
+        standard = [item for item in self._ip_cameras if item not in self._360_cameras] or self._ip_cameras
+        # "5 cameras" means the standard IP camera (first in the catalogue) unless the note says more
+        return self._best(standard + self._analog_cameras, line_words, default=standard[0] if standard else None)
+
+    def _covers(self, match: Match, item) -> bool:
+        """Whether a generic match already stands for the item a hint word points at"""
+        if match.concept in ("camera", "camera_360", "camera_analog"):
+            return item.category.startswith("cameras/")
+        if match.concept in ("item", "hint"):
+            return match.concept == "item" and self.items[match.item_id].category == item.category
+        return match.concept in ROLE_MATCHERS and item in self.engine.candidates(match.concept)
+
+    # Parsing
+
+    def _numbers(self, tokens: List[str]) -> List[Tuple[int, float, str]]:
+        """(position, value, unit kind) of every number; kind is "count" when no unit follows"""
+        numbers = []
+        for position, token in enumerate(tokens):
+            value = float(token) if token[0].isdigit() else NUMBER_WORDS.get(token)
+            if value is None:
+                continue
+            next_token = tokens[position + 1] if position + 1 < len(tokens) else None
+            kind = _UNIT_KIND.get(next_token, "count")
+            if token in ("a", "an") and kind == "count":
+                continue  # Only a number before a unit ("a month")
+            numbers.append((position, value, kind))
+        return numbers
+
+    def _aliases(self, tokens: List[str], line: int) -> List[Match]:
+        matches, position = [], 0
+        while position < len(tokens):
+            length, target = self._trie.longest(tokens, position)
+            if length:
+                matches.append(Match(target[0], target[1], position, position + length, line))
+                position += length
+            else:
+                position += 1
+        return matches
+
+    def parse(self, raw_text: str) -> ParsedNote:
+        cameras: Dict[str, int] = {}
+        extra: Dict[str, int] = {}
+        unsized_disks: Dict[str, int] = {}  # "1 hdd": sized for the cameras once the whole note is read
+        floors, backup_days, cable_m, storage_tb, monitor = 1, None, None, None, False
+        matches: List[Match] = []
+        words = understood = 0
+        unknown: List[str] = []
+        uncovered: List[str] = []
+
+        def check_whole(item, quantity):
+            if quantity and quantity != int(quantity):
+                uncovered.append(f"fractional quantity {quantity:g} of {item.id}")
+
+        def add_extra(item, quantity, target=extra):
+            if quantity == 0:
+                uncovered.append(f"zero quantity of {item.id}")
+            check_whole(item, quantity)
+            target[item.id] = target.get(item.id, 0) + int(quantity or 1)
+
+        def add_camera(item, quantity):
+            if not quantity:
+                uncovered.append(f"{'zero' if quantity == 0 else 'no'} quantity of {item.id}")
+            check_whole(item, quantity)
+            cameras[item.id] = cameras.get(item.id, 0) + int(quantity or 1)
+
+        # Each comma / semicolon separated part of a line is one segment: "Camera ip - 5 nos, Cable - 200m"
+        for line_number, line in enumerate(raw_text.splitlines()):
+            for segment in _SEGMENT_PATTERN.split(line):
+                tokens = tokenize(segment)
+                if not tokens:
+                    continue
+                words += len(tokens)
+                segment_words = keywords(tokens) - self._concept_words  # Only words that tell items apart
+                segment_matches = self._aliases(tokens, line_number)
+                used = [False] * len(tokens)
+                for match in segment_matches:
+                    used[match.start:match.end] = [True] * (match.end - match.start)
+                # "toshiba hdd" is one disk: drop hints that another match in the segment covers
+                segment_matches = [match for match in segment_matches if match.concept != "hint" or not any(
+                    other.concept != "hint" and self._covers(other, self.items[match.item_id]) for other in segment_matches)]
+
+                # A number inside an alias ("360 camera", "4tb toshiba") is not a quantity. A number
+                # only counts as understood once it is bound to an item, a length, a size, ...
+                numbers = [number for number in self._numbers(tokens) if not used[number[0]]]
+                bound = set()
+
+                # Quantities come before the items ("5 cameras, 1 nvr", "2 floors 6 cameras") or after them
+                # ("camera - 5 nos")
+                counts_first = bool(segment_matches) and any(
+                    position < segment_matches[0].start for position, _, kind in numbers if kind != "spec")
+
+                def bind(candidates: List[Tuple[int, float, str]]) -> Optional[float]:
+                    if not candidates:
+                        return None
+                    position, value, _ = candidates[0]
+                    bound.add(position)
+                    return value
+
+                def quantity(index: int, kinds=("count",)) -> Optional[float]:
+                    """The number of the given kinds that belongs to segment_matches[index]"""
+                    match = segment_matches[index]
+                    if counts_first:
+                        low = segment_matches[index - 1].end if index else 0
+                        return bind([number for number in reversed(numbers)
+                                     if low <= number[0] < match.start and number[2] in kinds])
+                    high = segment_matches[index + 1].start if index + 1 < len(segment_matches) else len(tokens)
+                    return bind([number for number in numbers if match.end <= number[0] < high and number[2] in kinds])
+
+                def value_of(kinds) -> Optional[float]:
+                    return bind([number for number in numbers if number[2] in kinds])
+
+                for index, match in enumerate(segment_matches):
+                    concept = match.concept
+                    item = self.items.get(match.item_id) if match.item_id else None
+                    uses_count = item is not None or concept in _COUNTED_CONCEPTS
+                    count = quantity(index) if uses_count else None
+
+                    if item is not None:
+                        if item.category.startswith("cameras/"):
+                            add_camera(item, count)
+                        elif item.unit == "meter":
+                            add_extra(item, quantity(index, ("length", "count")))
+                        else:
+                            add_extra(item, count)
+                    elif concept in ("camera", "camera_360", "camera_analog"):
+                        item, match.ambiguous = self._resolve_camera(concept, segment_words)
+                        if item is not None:
+                            add_camera(item, count)
+                            # "6 bullet cameras and 2 dome cameras": no dome in stock, not 8 bullets
+                            for word in CAMERA_TYPE_WORDS.intersection(tokens[match.start:match.end]):
+                                if word not in self._item_words[item.id]:
+                                    uncovered.append(f"no camera matches '{word}'")
+                    elif concept == "floor":
+                        floors = int(quantity(index, ("count", "floors")) or value_of(("floors",)) or floors)
+                    elif concept == "backup":
+                        days = value_of(tuple(_DAYS_PER))
+                        if days:
+                            kind = next(kind for position, _, kind in numbers if position in bound and kind in _DAYS_PER)
+                            backup_days = int(days * _DAYS_PER[kind])
+                        storage_tb = value_of(("storage",)) or storage_tb
+                    elif concept == "cabling":
+                        meters = quantity(index, ("length",)) or value_of(("length",)) or quantity(index)
+                        if meters:
+                            cable_m = int(meters) + (cable_m or 0)
+                    elif concept in _SIZE_UNITS:
+                        role = concept if concept != "dvr" or self.engine.sized("dvr") else "nvr"
+                        size = value_of((_SIZE_UNITS[concept],))
+                        if concept == "hard_disk" and size:
+                            storage_tb = size
+                        per_item = 1
+                        if size and self.engine.sized(role):
+                            # "16 channel nvr" with 8 channel NVRs in stock is two of them
+                            item, per_item = self.engine.pick_size(role, size)
+                        elif count or concept != "hard_disk":
+                            # Without a size the rules engine sizes NVRs and disks for the cameras;
+                            # only an explicit count ("2 nvr") or a job without cameras needs a pick here
+                            item, match.ambiguous = self._best(self.engine.candidates(role), segment_words)
+                        if item is not None and concept == "hard_disk" and not size:
+                            add_extra(item, count, unsized_disks)
+                        elif item is not None and (count or size or not cameras):
+                            add_extra(item, (count or 1) * per_item)
+                    elif concept == "installation":
+                        pass  # The rules add installation to every job with cameras
+                    elif concept in _ENGINE_ROLES:
+                        item, match.ambiguous = self._best(self.engine.candidates(concept), segment_words)
+                        if item is not None:
+                            monitor = monitor or concept == "monitor"
+                            add_extra(item, count)
+                    if item is not None:
+                        match.item_id = item.id
+
+                if storage_tb is None:
+                    storage_tb = value_of(("storage",))  # "4 cameras 2tb"
+
+                # "5 cameras 4mp": a spec outside any alias must be one of the picked items'
+                picked = [match.item_id for match in segment_matches if match.item_id]
+                for position, value, kind in numbers:
+                    if kind == "spec":
+                        spec = tokens[position] + tokens[position + 1]
+                        if any(spec in self._item_words[item_id] for item_id in picked):
+                            bound.add(position)
+                        else:
+                            uncovered.append(f"no item matches '{spec}'")
+                    elif position not in bound:
+                        uncovered.append(f"number {value:g} not assigned to anything")
+                    if position in bound:
+                        used[position] = True
+                        if kind != "count":
+                            used[position + 1] = True
+
+                matches.extend(segment_matches)
+                for position, token in enumerate(tokens):
+                    previous = tokens[position - 1] if position else ""
+                    is_unit = token == "no" and (previous[:1].isdigit() or previous in NUMBER_WORDS)
+                    if token in NEGATION_WORDS and not used[position] and not is_unit:
+                        uncovered.append(f"negation '{token}'")
+                        unknown.append(token)
+                    elif token in PER_WORDS and not used[position]:
+                        uncovered.append(f"per-unit quantity '{token}'")
+                        unknown.append(token)
+                    elif used[position] or token in FILLER_WORDS or token in _UNIT_KIND:
+                        understood += 1
+                    else:
+                        unknown.append(token)
+
+        disk_ids = {item.id for _, item in self.engine.sized("hard_disk")}
+        if disk_ids.isdisjoint(extra):
+            # A stated size ("2tb backup"), else what the cameras need, split over the disks asked for
+            camera_count = sum(cameras.values())
+            needed = storage_tb or (unsized_disks and camera_count and self.engine.storage_needed(camera_count, backup_days))
+            if needed:
+                disks = sum(unsized_disks.values()) or 1
+                disk, per_disk = self.engine.pick_size("hard_disk", needed / disks)
+                if disk is not None:
+                    unsized_disks = {disk.id: disks * per_disk}
+        for item_id, quantity in unsized_disks.items():
+            extra[item_id] = extra.get(item_id, 0) + quantity
+
+        job = JobRequirements(cameras=cameras, floors=floors, backup_days=backup_days, cable_m=cable_m,
+                              monitor=monitor, extra_items=extra)
+        return ParsedNote(job=job, matches=matches, words=words, understood=understood, unknown=unknown,
+                          uncovered=uncovered)
+
+    def quote(self, raw_text: str) -> Tuple[List[QuoteLine], ParsedNote]:
+        """Parse a note and price it: dependent items come from the rules engine when cameras are present"""
+        note = self.parse(raw_text)
+        job = note.job
+        if not job.cameras and job.cable_m:
+            # No cameras to derive the cable from: quote the length as noted
+            cabling = self.engine.candidates("cabling")
+            if cabling:
+                job = JobRequirements(cameras={}, extra_items={**job.extra_items, cabling[0].id: job.cable_m})
+        return self.engine.expand(job), note
+
+
+class EscalationStats:
+    """Counts the notes the local parser quoted and the ones it passed on to the AI"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.local = 0
+        self.escalated = 0
+        self._confidence_sum = 0.0
+
+    def record(self, escalated: bool, confidence: float):
+        with self._lock:
+            if escalated:
+                self.escalated += 1
+            else:
+                self.local += 1
+            self._confidence_sum += confidence
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.local + self.escalated
+        return {
+            "local": self.local,
+            "escalated": self.escalated,
+            "escape_rate": round(self.escalated / total, 4) if total else 0.0,
+            "mean_confidence": round(self._confidence_sum / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,92 @@
+import asyncio
+import os
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+from app_logging import get_logger
+
+logger = get_logger("watcher")
+
+try:
+    # inotify/FSEvents based watching; installed with uvicorn[standard]
+    from watchfiles import awatch
+except ImportError:
+    awatch = None
+
+
+class FileWatcher:
+    """
+    Watches a few files and calls on_change(changed paths) in a worker
+    thread when any of them is modified, created or replaced.
+
+    Uses watchfiles (inotify on Linux) when it is installed and falls back
+    to polling the files' mtime/size/inode every poll_interval seconds.
+    Changes arriving in a burst (an editor writing a temp file and renaming
+    it) are reported once.
+    """
+
+    def __init__(self, paths: Iterable[str], on_change: Callable[[Set[str]], None],
+                 poll_interval: float = 2.0, use_native: bool = True):
+        self.paths = {os.path.abspath(path) for path in paths}
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self.use_native = use_native and awatch is not None
+        self._task: Optional[asyncio.Task] = None
+        self._stop: Optional[asyncio.Event] = None
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self.use_native else "polling"
+
+    def start(self):
+        """Start watching in a background task of the running event loop"""
+        if self._task is None:
+            self._stop = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+            logger.info("Watching %s (%s)", ", ".join(sorted(os.path.basename(p) for p in self.paths)), self.mode)
+
+    async def stop(self):
+        if self._task is None:
+            return
+        # Let the watch loop end by itself: cancelling would leave the native watcher thread running
+        self._stop.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=5)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            pass
+        self._task = None
+
+    async def _run(self):
+        watch = self._watch_native if self.use_native else self._watch_polling
+        async for changed in watch():
+            try:
+                await asyncio.to_thread(self.on_change, changed)
+            except Exception as e:
+                logger.exception("Reload failed: %s", e)
+
+    async def _watch_native(self):
+        # Watch the directories: editors and atomic writers replace the file, which drops a file watch
+        directories = {os.path.dirname(path) for path in self.paths}
+        async for changes in awatch(*directories, stop_event=self._stop, debounce=300, recursive=False):
+            changed = {os.path.abspath(path) for _, path in changes} & self.paths
+            if changed:
+                yield changed
+
+    def _signature(self, path: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    async def _watch_polling(self):
+        signatures: Dict[str, Optional[Tuple[int, int, int]]] = {path: self._signature(path) for path in self.paths}
+        while not self._stop.is_set():
+            await asyncio.sleep(self.poll_interval)
+            changed = set()
+            for path in self.paths:
+                signature = self._signature(path)
+                if signature != signatures[path]:
+                    signatures[path] = signature
+                    changed.add(path)
+            if changed:
+                yield changed
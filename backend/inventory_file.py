@@ -0,0 +1,161 @@
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Sections of inventory.json that are not item categories
+NON_ITEM_SECTIONS = ("rules",)
+
+# Subcategory used for items whose category has no "category/subcategory" form
+DEFAULT_SUBCATEGORY = "items"
+
+
+def split_category(category: str) -> Tuple[str, str]:
+    """"cameras/ip_cameras" -> ("cameras", "ip_cameras"); "other" -> ("other", "items")"""
+    if '/' in category:
+        section, subcategory = category.split('/', 1)
+        return section, subcategory
+    return category, DEFAULT_SUBCATEGORY
+
+
+def join_category(section: str, subcategory: str) -> str:
+    """Inverse of split_category"""
+    if subcategory == DEFAULT_SUBCATEGORY:
+        return section
+    return f"{section}/{subcategory}"
+
+
+def is_item_category(category: str) -> bool:
+    """False for categories that would land in a non-item section ("rules", "rules/x")"""
+    return split_category(category)[0] not in NON_ITEM_SECTIONS
+
+
+def _number(value: float):
+    return int(value) if value == int(value) else value
+
+
+def _raw_item(item: Dict, raw: Dict) -> Dict:
+    """
+    Write an item's fields back into its raw inventory.json entry.
+
+    Fields the API does not know about (warranty, channels, ports, ...) are
+    kept, as are fields that still hold the default load_inventory filled in.
+    """
+    entry = dict(raw)
+    entry["id"] = item["id"]
+    entry["name"] = item["name"]
+    if item.get("description") != item["name"] or "description" in raw:
+        entry["description"] = item.get("description") or ""
+    if raw.get("rate") != item["price"]:
+        entry["rate"] = _number(item["price"])
+    if item.get("unit") != "piece" or "unit" in raw:
+        entry["unit"] = item["unit"]
+    return entry
+
+
+def nest_inventory(document: Any, items: Iterable[Dict]) -> Dict:
+    """
+    Merge a list of item dicts (InventoryItem.model_dump()) into the nested
+    inventory.json document.
+
+    Sections, subcategories and items keep their order, `rules` and other
+    non-item sections are copied unchanged, deleted items are dropped and new
+    ones are appended to their subcategory. An item moved to another category
+    takes its raw entry (channels, capacity, ...) along.
+    """
+    if not isinstance(document, dict):
+        document = {}  # Old flat-list file: nothing to preserve
+    items = {item["id"]: item for item in items}
+
+    nested: Dict[str, Any] = {}
+    written = set()
+    moved: Dict[str, Dict] = {}  # Item id -> raw entry left behind in its old category
+    for section, section_data in document.items():
+        if section in NON_ITEM_SECTIONS or not isinstance(section_data, dict):
+            nested[section] = section_data
+            continue
+        nested[section] = {}
+        for subcategory, raw_items in section_data.items():
+            if not isinstance(raw_items, list):
+                nested[section][subcategory] = raw_items
+                continue
+            category = join_category(section, subcategory)
+            kept = []
+            for raw in raw_items:
+                # Same fallback id load_inventory gives entries without one
+                item = items.get(raw.get("id", f"{section}_{subcategory}_{raw.get('name', 'unknown')}"))
+                if item is None or item["id"] in written:
+                    continue  # Deleted, or a duplicate entry
+                if item["category"] != category:
+                    moved.setdefault(item["id"], raw)
+                    continue
+                kept.append(_raw_item(item, raw))
+                written.add(item["id"])
+            nested[section][subcategory] = kept
+
+    for item in items.values():
+        if item["id"] in written:
+            continue
+        section, subcategory = split_category(item["category"])
+        target = nested.setdefault(section, {})
+        if not isinstance(target, dict):
+            continue  # Category clashes with a non-item section (the API rejects these, see is_item_category)
+        target.setdefault(subcategory, []).append(_raw_item(item, moved.get(item["id"], {})))
+
+    # Keep the rules at the end of the file, where they were
+    for section in NON_ITEM_SECTIONS:
+        if section in nested:
+            nested[section] = nested.pop(section)
+    return nested
+
+
+def atomic_write_json(path: str, data: Any):
+    """Write JSON to a temp file next to path, fsync it and rename it over path"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    # Make the rename itself durable
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class InventoryFile:
+    """
+    Writer for the nested inventory.json.
+
+    save() re-reads the current file, merges the items into it (see
+    nest_inventory) and replaces it atomically. Writers are serialized, so
+    concurrent saves never interleave and a crash leaves either the old or
+    the new file, never a partial one.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def read(self) -> Any:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save(self, items: List[Dict]):
+        with self._lock:
+            atomic_write_json(self.path, nest_inventory(self.read(), items))
@@ -0,0 +1,204 @@
+import json
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+# Words agents use in site notes -> words used in inventory names/categories
+SYNONYMS = {
+    "cctv": ["camera"],
+    "cam": ["camera"],
+    "bullet": ["camera"],
+    "dome": ["camera"],
+    "ptz": ["360"],
+    "rotation": ["360"],
+    "dvr": ["nvr"],
+    "recorder": ["nvr"],
+    "backup": ["hard", "disk"],
+    "recording": ["hard", "disk"],
+    "storage": ["hard", "disk"],
+    "hdd": ["hard", "disk"],
+    "tb": ["hard", "disk"],
+    "utp": ["cable", "cabling"],
+    "cat6": ["cable"],
+    "wire": ["cable"],
+    "wiring": ["cable", "cabling"],
+    "poe": ["switch"],
+    "display": ["monitor"],
+    "tv": ["monitor"],
+}
+
+# Tokens that carry no meaning for matching
+STOPWORDS = {"a", "an", "and", "the", "for", "with", "of", "to", "in", "on", "at", "nos", "no", "pcs",
+             "piece", "m", "mtr", "meter", "qty", "including", "charge", "year", "warranty"}
+
+# Categories always offered to the model (installation and cabling charges apply to every job)
+ALWAYS_INCLUDE = ("services",)
+
+_TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with simple plural stripping ("cameras" -> "camera")"""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        if token not in STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+def _normalize_label(text: str) -> str:
+    return ' '.join(text.lower().split())
+
+
+class InventoryIndex:
+    """
+    Inverted index over inventory items used to pick the part of the
+    catalogue that is relevant to a site note.
+
+    Items are matched by the words in their name, description and category.
+    Matching a camera (or NVR) also pulls in the items its rules in
+    inventory.json depend on, so the model still sees switches, cables,
+    hard disks etc. when the note only mentions cameras.
+    """
+
+    def __init__(self, items: Iterable, rules: Optional[Dict] = None,
+                 max_items: int = 60, max_per_category: int = 12):
+        self.items = list(items)
+        self.rules = rules or {}
+        self.max_items = max_items
+        self.max_per_category = max_per_category
+
+        self._by_id = {item.id: item for item in self.items}
+        self._by_category: Dict[str, List] = defaultdict(list)
+        self._token_index: Dict[str, Set[str]] = defaultdict(set)
+        self._order = {item.id: position for position, item in enumerate(self.items)}
+        self._by_text: Dict[str, object] = {}
+
+        for item in self.items:
+            self._by_category[item.category].append(item)
+            text = f"{item.name} {item.description or ''} {item.category.replace('_', ' ')}"
+            for token in set(tokenize(text)):
+                self._token_index[token].add(item.id)
+            for label in (item.description, item.name):
+                if label:
+                    self._by_text.setdefault(_normalize_label(label), item)
+
+        self._camera_requirements = self._collect_requirements(self.rules.get("camera_dependencies", {}))
+        self._nvr_requirements = self._collect_requirements({"nvr": self.rules.get("nvr_dependencies", {})})
+        self._standard_additions = list(self.rules.get("standard_additions", {}).keys())
+
+    @staticmethod
+    def _collect_requirements(dependencies: Dict) -> List[str]:
+        requirements = []
+        for rule in dependencies.values():
+            for requirement in rule.get("requires", []):
+                if requirement not in requirements:
+                    requirements.append(requirement)
+        return requirements
+
+    def _match_tokens(self, tokens: Iterable[str]) -> Dict[str, int]:
+        """Item id -> number of matching tokens"""
+        scores: Dict[str, int] = defaultdict(int)
+        for token in tokens:
+            for item_id in self._token_index.get(token, ()):
+                scores[item_id] += 1
+        return scores
+
+    def _resolve_requirement(self, requirement: str) -> List:
+        """Items that satisfy a rule requirement such as "hard_disk" or "poe_switch_or_adaptor\""""
+        items = []
+        for option in requirement.replace("_optional", "").split("_or_"):
+            # A requirement can name a subcategory directly (e.g. "nvr", "mounting")
+            subcategory = [item for category, members in self._by_category.items()
+                           if tokenize(category.split('/')[-1].replace('_', ' ')) == tokenize(option.replace('_', ' '))
+                           for item in members]
+            if subcategory:
+                items.extend(subcategory)
+                continue
+
+            # Otherwise match item names: all words, falling back to the first word
+            tokens = tokenize(option.replace('_', ' '))
+            if not tokens:
+                continue
+            matches = set.intersection(*(self._token_index.get(token, set()) for token in tokens))
+            if not matches:
+                matches = self._token_index.get(tokens[0], set())
+            items.extend(self._by_id[item_id] for item_id in matches)
+        return items
+
+    def match(self, description: str) -> Optional[object]:
+        """Item whose description or name is exactly a quotation line's description (ignoring case and spacing)"""
+        return self._by_text.get(_normalize_label(description))
+
+    def select(self, raw_text: str) -> List:
+        """Inventory items relevant to a site note (the first max_items of the catalogue if nothing matches)"""
+        return self.in_catalogue_order(self.rank(raw_text))
+
+    def in_catalogue_order(self, items: Iterable) -> List:
+        return sorted(items, key=lambda item: self._order[item.id])
+
+    def rank(self, raw_text: str) -> List:
+        """
+        The items select() returns, best matches first (for trimming the
+        prompt to a token budget); catalogue order when nothing matches
+        """
+        tokens = tokenize(raw_text)
+        expanded = list(tokens)
+        for token in tokens:
+            expanded.extend(SYNONYMS.get(token, []))
+
+        scores = self._match_tokens(expanded)
+        if not scores:
+            return self.items[:self.max_items]
+
+        categories = {self._by_id[item_id].category for item_id in scores}
+        selected = {item_id: score for item_id, score in scores.items()}
+
+        # Pull in dependent items from the rules section
+        requirements = list(self._standard_additions)
+        if any(category.startswith("cameras/") for category in categories):
+            requirements.extend(self._camera_requirements)
+        if any(category.startswith("nvr_dvr/") for category in categories) or "nvr" in requirements:
+            requirements.extend(self._nvr_requirements)
+        for requirement in requirements:
+            for item in self._resolve_requirement(requirement):
+                selected.setdefault(item.id, 0)
+
+        for category, members in self._by_category.items():
+            if category.split('/')[0] in ALWAYS_INCLUDE:
+                for item in members:
+                    selected.setdefault(item.id, 0)
+
+        # Best matches first, then catalogue order; cap per category and overall
+        ranked = sorted(selected, key=lambda item_id: (-selected[item_id], self._order[item_id]))
+        per_category: Dict[str, int] = defaultdict(int)
+        result = []
+        for item_id in ranked:
+            item = self._by_id[item_id]
+            if per_category[item.category] >= self.max_per_category:
+                continue
+            per_category[item.category] += 1
+            result.append(item)
+            if len(result) >= self.max_items:
+                break
+        return result
+
+
+# Legend for the compact encoding, used in the prompt header
+COMPACT_INVENTORY_LEGEND = "id, n=name/description, c=category, r=rate, u=unit"
+
+
+def _number(value: float):
+    return int(value) if value == int(value) else value
+
+
+def compact_inventory_json(items: Iterable) -> str:
+    """Inventory as minified JSON with short keys (far fewer tokens than indented model dumps)"""
+    return json.dumps(
+        [{"id": item.id, "n": item.description or item.name, "c": item.category, "r": _number(item.price), "u": item.unit}
+         for item in items],
+        separators=(',', ':'),
+        ensure_ascii=False,
+    )
@@ -0,0 +1,317 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app_logging import get_logger
+
+logger = get_logger("inventory")
+
+
+class DuplicateItemError(Exception):
+    """Raised when adding an item whose id already exists"""
+
+
+class InventoryStore:
+    """
+    In-memory inventory indexed by item id and by category.
+
+    Lookups, adds, updates and deletes are O(1). Every change is appended to a
+    change log (one JSON line per change) instead of rewriting the inventory
+    file. A full snapshot is written through save_snapshot by a background
+    thread, and a new log started, once no change has arrived for
+    flush_delay seconds (so a burst of edits costs one save) or once the log
+    has grown past compact_after entries.
+
+    Every change bumps `version`. Versions start from the current time in
+    milliseconds, so they keep increasing across restarts and a client can
+    ask for the changes since the version it last saw (changes_since).
+
+    Items are any objects with `id` and `category` attributes and a
+    `model_dump()` method (pydantic models); item_factory turns a logged dict
+    back into an item.
+    """
+
+    # Deleted ids remembered for changes_since(); older deletes force a full reload
+    max_tombstones = 1000
+
+    def __init__(self, items: List[Any] = (), log_path: Optional[str] = None,
+                 item_factory: Optional[Callable[[Dict], Any]] = None,
+                 save_snapshot: Optional[Callable[[List[Any]], None]] = None,
+                 compact_after: int = 200, flush_delay: Optional[float] = None):
+        self.log_path = log_path
+        self.item_factory = item_factory
+        self.save_snapshot = save_snapshot
+        self.compact_after = compact_after
+        self.flush_delay = flush_delay
+
+        self._lock = threading.RLock()
+        self._items: Dict[str, Any] = {}
+        self._by_category: Dict[str, Dict[str, Any]] = {}
+        self._log_entries = 0
+        self._compacting = False
+        self._flush_timer: Optional[threading.Timer] = None
+        self.version = int(time.time() * 1000)
+        self._history_start = self.version  # changes_since() can answer for versions >= this
+        self._changed_at: Dict[str, int] = {}  # Item id -> version of its last change
+        self._sequence: Dict[str, int] = {}  # Item id -> insertion number (stable pagination order)
+        self._next_sequence = 0
+        self._order: List[int] = []  # Insertion numbers of the current items, ascending (page() bisects it)
+        self._by_sequence: Dict[int, str] = {}  # Insertion number -> item id
+        self._deleted: "OrderedDict[str, int]" = OrderedDict()  # Deleted id -> version of the delete
+
+        for item in items:
+            self._put(item)
+
+        if log_path:
+            # A compaction interrupted by a crash leaves its old log behind; replay it first
+            for path in (self._old_log_path, log_path):
+                self._log_entries += self._replay(path)
+
+    # Read access
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.list())
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._items
+
+    def get(self, item_id: str) -> Optional[Any]:
+        return self._items.get(item_id)
+
+    def list(self) -> List[Any]:
+        """All items in insertion order"""
+        with self._lock:
+            return list(self._items.values())
+
+    def by_category(self, category: str) -> List[Any]:
+        with self._lock:
+            return list(self._by_category.get(category, {}).values())
+
+    def categories(self) -> List[str]:
+        with self._lock:
+            return list(self._by_category)
+
+    def page(self, after: Optional[int] = None, limit: Optional[int] = None,
+             predicate: Optional[Callable[[Any], bool]] = None) -> Tuple[List[Any], Optional[int]]:
+        """
+        Items in insertion order starting after the cursor `after`, optionally
+        filtered by predicate. Returns (items, cursor of the next page or None).
+        Cursors are insertion numbers, so pages stay consistent while items are
+        added or deleted between requests. The cursor is found by bisection:
+        a page costs its own items (and the ones the predicate skips), not
+        the items before it.
+        """
+        with self._lock:
+            result = []
+            start = 0 if after is None else bisect_right(self._order, after)
+            for position in range(start, len(self._order)):
+                item = self._items[self._by_sequence[self._order[position]]]
+                if predicate is not None and not predicate(item):
+                    continue
+                if limit is not None and len(result) >= limit:
+                    return result, self._sequence[result[-1].id]
+                result.append(item)
+            return result, None
+
+    def changes_since(self, version: int) -> Optional[Tuple[List[Any], List[str]]]:
+        """
+        (items added or changed, ids deleted) after `version`, or None when
+        the store cannot tell (version from before this process started or
+        older than the remembered deletes) and the client needs a full reload.
+        """
+        with self._lock:
+            if version < self._history_start or version > self.version:
+                return None
+            changed = [item for item_id, item in self._items.items() if self._changed_at[item_id] > version]
+            deleted = [item_id for item_id, deleted_at in self._deleted.items() if deleted_at > version]
+            return changed, deleted
+
+    # Changes
+
+    def add(self, item: Any) -> Any:
+        with self._lock:
+            if item.id in self._items:
+                raise DuplicateItemError(f"Item '{item.id}' already exists")
+            self._put(item)
+            self._log({"op": "put", "item": item.model_dump()})
+            return item
+
+    def update(self, item: Any) -> Any:
+        """Replace an existing item (KeyError if it does not exist)"""
+        with self._lock:
+            if item.id not in self._items:
+                raise KeyError(item.id)
+            self._put(item)
+            self._log({"op": "put", "item": item.model_dump()})
+            return item
+
+    def delete(self, item_id: str) -> Any:
+        """Remove and return an item (KeyError if it does not exist)"""
+        with self._lock:
+            item = self._remove(item_id)
+            self._log({"op": "delete", "id": item_id})
+            return item
+
+    def reload(self, items: List[Any]) -> bool:
+        """
+        Replace the contents with items read from the inventory file (edited
+        outside the API). Changes in the log that are not saved yet are
+        applied again on top. Only items that actually differ count as
+        changes; returns True if anything changed.
+        """
+        with self._lock:
+            version = self.version
+            items = {item.id: item for item in items}
+            for item_id in [item_id for item_id in self._items if item_id not in items]:
+                self._remove(item_id)
+            for item in items.values():
+                if self._items.get(item.id) != item:
+                    self._put(item)
+            if self.log_path:
+                for path in (self._old_log_path, self.log_path):
+                    self._replay(path, only_changes=True)
+            return self.version != version
+
+    # Index maintenance (called with the lock held)
+
+    def _put(self, item: Any):
+        existing = self._items.get(item.id)
+        if existing is not None and existing.category != item.category:
+            self._by_category[existing.category].pop(item.id, None)
+            if not self._by_category[existing.category]:
+                del self._by_category[existing.category]
+        if item.id not in self._sequence:
+            self._sequence[item.id] = self._next_sequence
+            self._order.append(self._next_sequence)  # Always the largest so far: stays sorted
+            self._by_sequence[self._next_sequence] = item.id
+            self._next_sequence += 1
+        self._items[item.id] = item
+        self._by_category.setdefault(item.category, {})[item.id] = item
+        self.version += 1
+        self._changed_at[item.id] = self.version
+        self._deleted.pop(item.id, None)
+
+    def _remove(self, item_id: str) -> Any:
+        item = self._items.pop(item_id)
+        members = self._by_category.get(item.category, {})
+        members.pop(item_id, None)
+        if not members:
+            self._by_category.pop(item.category, None)
+        self.version += 1
+        del self._changed_at[item_id]
+        sequence = self._sequence.pop(item_id)
+        del self._order[bisect_left(self._order, sequence)]
+        del self._by_sequence[sequence]
+        self._deleted[item_id] = self.version
+        if len(self._deleted) > self.max_tombstones:
+            _, oldest = self._deleted.popitem(last=False)
+            self._history_start = oldest
+        return item
+
+    # Change log
+
+    @property
+    def _old_log_path(self) -> str:
+        return f"{self.log_path}.old"
+
+    def _replay(self, path: str, only_changes: bool = False) -> int:
+        """Apply the changes recorded in a log file; returns the number of entries"""
+        if not os.path.exists(path):
+            return 0
+        entries = 0
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    change = json.loads(line)
+                except ValueError:
+                    break  # Torn last line from a crash mid-append
+                if change.get("op") == "put" and self.item_factory:
+                    item = self.item_factory(change["item"])
+                    if not only_changes or self._items.get(item.id) != item:
+                        self._put(item)
+                elif change.get("op") == "delete" and change.get("id") in self._items:
+                    self._remove(change["id"])
+                entries += 1
+        return entries
+
+    def _log(self, change: Dict):
+        if not self.log_path:
+            return
+        with open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(change) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._log_entries += 1
+        if self._log_entries >= self.compact_after:
+            self._cancel_flush()
+            self.compact_in_background()
+        elif self.flush_delay is not None:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        """(Re)start the quiet-period timer; only the last change of a burst triggers a save"""
+        self._cancel_flush()
+        self._flush_timer = threading.Timer(self.flush_delay, self.compact_in_background)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def _cancel_flush(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+
+    def flush(self):
+        """Save pending changes now (e.g. on shutdown)"""
+        with self._lock:
+            self._cancel_flush()
+            if not self._log_entries or self._compacting or not self.save_snapshot:
+                return
+            self._compacting = True
+        self.compact()
+
+    def compact_in_background(self):
+        """Start a compaction thread unless one is already running"""
+        with self._lock:
+            if self._compacting or not self.save_snapshot:
+                return
+            self._compacting = True
+        threading.Thread(target=self.compact, name="inventory-compaction", daemon=True).start()
+
+    def compact(self):
+        """Write a full snapshot and drop the log entries it contains"""
+        if not self.log_path or not self.save_snapshot:
+            return
+        try:
+            with self._lock:
+                snapshot = list(self._items.values())
+                # Changes made while the snapshot is written go to a fresh log
+                if os.path.exists(self.log_path):
+                    if os.path.exists(self._old_log_path):
+                        # An earlier compaction failed; keep its entries too
+                        with open(self.log_path, 'r', encoding='utf-8') as src, \
+                                open(self._old_log_path, 'a', encoding='utf-8') as dst:
+                            dst.write(src.read())
+                        os.remove(self.log_path)
+                    else:
+                        os.replace(self.log_path, self._old_log_path)
+                self._log_entries = 0
+            self.save_snapshot(snapshot)
+            if os.path.exists(self._old_log_path):
+                os.remove(self._old_log_path)
+        except Exception as e:
+            logger.exception("Compaction failed: %s", e)
+        finally:
+            with self._lock:
+                self._compacting = False
+                # Changes made while the snapshot was written still need a save
+                if self._log_entries and self.flush_delay is not None:
+                    self._schedule_flush()
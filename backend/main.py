@@ -1,27 +1,257 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import AsyncIterator, Callable, Dict, List, Literal, Optional, Tuple
+from contextlib import aclosing, asynccontextmanager
+from dataclasses import dataclass
+import asyncio
+import hashlib
 import json
 import os
-from anthropic import Anthropic
+import re
+import threading
+import time
+import zipfile
+import anthropic
+from anthropic import AsyncAnthropic
 import google.generativeai as genai
-from groq import Groq
+import groq
+from groq import AsyncGroq
+import openai
 from datetime import datetime
 from dotenv import load_dotenv
-from pdf_generator import HDCQuotationPDF
+from pdf_pool import pdf_pool, PDFPoolBusy
+from cache import TieredCache, canonical_hash
+from inventory_index import InventoryIndex, compact_inventory_json
+from streaming_json import ItemStreamParser
+from dispatch import CircuitBreaker, ProviderUnavailable, call_with_breaker, hedged_race, stream_with_breaker
+from inventory_store import InventoryStore, DuplicateItemError
+from inventory_file import InventoryFile, is_item_category, join_category, NON_ITEM_SECTIONS
+from database import QuotationDatabase
+from file_watcher import FileWatcher
+from rules_engine import RulesEngine, JobRequirements, RuleError
+from fast_parser import FastParser, EscalationStats
+from provider_clients import ProviderClients
+from providers import ProviderRegistry, FunctionProvider, MockProvider
+from structured_output import (QUOTATION_SCHEMA, QUOTATION_TOOL_NAME, QUOTATION_TOOL_DESCRIPTION,
+                               decode_response, normalize_item, validate_items)
+from metrics import metrics
+from app_logging import configure_logging, get_logger, log_payload
+from prompt_builder import (ModelSpec, Prompt, PromptBuilder, UsageRecorder, count_tokens, fit_inventory,
+                            load_tokenizer, record_usage, recording_usage)
 
 # Load environment variables from .env file
 load_dotenv()
 
-app = FastAPI(title="CCTV Quotation API")
+reload_log = get_logger("reload")
+pdf_log = get_logger("pdf")
+pipeline_log = get_logger("pipeline")
+dispatch_log = get_logger("dispatch")
+provider_log = get_logger("providers")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background resources on startup and release them on shutdown"""
+    # Logs go through a queue to a background writer (LOG_LEVEL, LOG_FORMAT, LOG_PAYLOADS; see app_logging)
+    configure_logging()
+    if provider_registry.unknown():
+        provider_log.warning("Unknown providers in LLM_PROVIDERS ignored: %s", ", ".join(provider_registry.unknown()))
+    # The tokenizer may download its vocabulary: load it in the background, requests estimate until then
+    threading.Thread(target=load_tokenizer, name="tokenizer-load", daemon=True).start()
+    await asyncio.to_thread(load_app_state)
+    await asyncio.to_thread(pdf_pool.start)
+    provider_clients.warm_up({provider.name: provider.api_key() for provider in provider_registry})
+    watcher = None
+    if CONFIG_RELOAD:
+        watcher = FileWatcher([INVENTORY_FILE, SYSTEM_PROMPT_FILE], reload_changed_files,
+                              poll_interval=CONFIG_RELOAD_POLL_INTERVAL)
+        watcher.start()
+    yield
+    if watcher is not None:
+        await watcher.stop()
+    pdf_pool.shutdown()
+    await provider_clients.aclose()
+    await asyncio.to_thread(inventory_db.flush)  # Don't lose edits still waiting for the debounced save
+
+app = FastAPI(title="CCTV Quotation API", lifespan=lifespan)
 
 # File paths for persistent storage
 INVENTORY_FILE = "inventory.json"
-LATEST_RESPONSE_FILE = "latest_response.json"
+DATABASE_FILE = os.getenv("DATABASE_FILE", "quotations.db")  # Inventory mirror and quotation history
+INVENTORY_LOG_FILE = "inventory.changes.jsonl"  # Inventory edits since the last full save
+INVENTORY_COMPACT_AFTER = int(os.getenv("INVENTORY_COMPACT_AFTER", "200"))
+INVENTORY_FLUSH_DELAY = float(os.getenv("INVENTORY_FLUSH_DELAY", "2"))  # Seconds of quiet before edits are saved
 SYSTEM_PROMPT_FILE = "system_prompt.txt"
 
+# Reload inventory.json / system_prompt.txt when they are edited (0 = read them at startup only)
+CONFIG_RELOAD = os.getenv("CONFIG_RELOAD", "1") != "0"
+CONFIG_RELOAD_POLL_INTERVAL = float(os.getenv("CONFIG_RELOAD_POLL_INTERVAL", "2"))  # When watchfiles is not installed
+
+# Prompt inventory: only send items relevant to the note (set INVENTORY_PREFILTER=0 to send everything)
+INVENTORY_PREFILTER = os.getenv("INVENTORY_PREFILTER", "1") != "0"
+INVENTORY_PROMPT_MAX_ITEMS = int(os.getenv("INVENTORY_PROMPT_MAX_ITEMS", "60"))
+
+# Max in-flight requests per AI provider (calls beyond the limit wait for a free slot)
+PROVIDER_CONCURRENCY = {
+    "groq": int(os.getenv("GROQ_MAX_CONCURRENCY", "8")),
+    "gemini": int(os.getenv("GEMINI_MAX_CONCURRENCY", "4")),
+    "anthropic": int(os.getenv("ANTHROPIC_MAX_CONCURRENCY", "4")),
+    "openai": int(os.getenv("OPENAI_MAX_CONCURRENCY", "4")),
+    "mock": int(os.getenv("MOCK_MAX_CONCURRENCY", "64")),
+}
+provider_limits = {name: asyncio.Semaphore(limit) for name, limit in PROVIDER_CONCURRENCY.items()}
+
+# Per-provider request timeout in seconds
+PROVIDER_TIMEOUTS = {
+    "groq": float(os.getenv("GROQ_TIMEOUT", "30")),
+    "gemini": float(os.getenv("GEMINI_TIMEOUT", "45")),
+    "anthropic": float(os.getenv("ANTHROPIC_TIMEOUT", "60")),
+    "openai": float(os.getenv("OPENAI_TIMEOUT", "60")),
+    "mock": float(os.getenv("MOCK_TIMEOUT", "30")),
+}
+
+# Keep-alive connection pool per provider; SDK clients are built once and reused (HTTP/2 when h2 is installed)
+PROVIDER_POOL_SIZES = {
+    "groq": int(os.getenv("GROQ_POOL_SIZE", "16")),
+    "anthropic": int(os.getenv("ANTHROPIC_POOL_SIZE", "8")),
+    "openai": int(os.getenv("OPENAI_POOL_SIZE", "8")),
+}
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))  # Seconds an idle connection stays open
+HTTP2 = os.getenv("HTTP2", "1") != "0"
+
+# Model, context window, max output tokens and list prices (USD per million input / output tokens,
+# prompt cache reads / writes) of each provider; prices only feed the cost estimates
+PROVIDER_MODELS = {
+    "groq": ModelSpec("llama-3.3-70b-versatile", 131072, 4096, input_price=0.59, output_price=0.79),
+    "gemini": ModelSpec("gemini-2.0-flash-exp", 1048576, 4096, input_price=0.10, output_price=0.40,
+                        cached_input_price=0.025),
+    "anthropic": ModelSpec("claude-3-5-sonnet-20241022", 200000, 2048, input_price=3.0, output_price=15.0,
+                           cached_input_price=0.30, cache_write_price=3.75),
+    "openai": ModelSpec("gpt-4", 8192, 2048, input_price=30.0, output_price=60.0),
+    "mock": ModelSpec("mock", 131072, 4096),
+}
+
+# Prompt size limit in tokens (system prompt + inventory + note). 0 = the smallest input window
+# (context window - max output tokens) of the available providers. The inventory is trimmed to fit.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "0"))
+PROMPT_RESERVED_TOKENS = 400  # Section headers, tool / JSON schema and chat formatting
+prompt_builder = PromptBuilder()
+
+def create_gemini_model(api_key: str, http_client):
+    # Try experimental model (often has separate/higher quota); genai keeps its own connection
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(PROVIDER_MODELS["gemini"].model)
+
+provider_clients = ProviderClients(PROVIDER_POOL_SIZES, PROVIDER_TIMEOUTS, connect_timeout=HTTP_CONNECT_TIMEOUT,
+                                   keepalive_expiry=HTTP_KEEPALIVE_EXPIRY, http2=HTTP2)
+provider_clients.register("groq", lambda api_key, http_client: AsyncGroq(api_key=api_key, http_client=http_client), sdk=groq)
+provider_clients.register("gemini", create_gemini_model)
+provider_clients.register("anthropic", lambda api_key, http_client: AsyncAnthropic(api_key=api_key, http_client=http_client),
+                          sdk=anthropic)
+provider_clients.register("openai", lambda api_key, http_client: openai.AsyncOpenAI(api_key=api_key, http_client=http_client),
+                          sdk=openai)
+
+# Skip a provider for a cool-down window after repeated quota/timeout errors
+provider_breakers = {
+    name: CircuitBreaker(
+        failure_threshold=int(os.getenv("PROVIDER_BREAKER_THRESHOLD", "3")),
+        cooldown=float(os.getenv("PROVIDER_BREAKER_COOLDOWN", "60")),
+    )
+    for name in PROVIDER_CONCURRENCY
+}
+
+# "sequential": try providers one after another (default)
+# "hedged": start the next provider if the current one has not answered after LLM_HEDGE_DELAY seconds
+#           (set it to about the p95 latency of the primary) and use whichever answers first
+LLM_DISPATCH_MODE = os.getenv("LLM_DISPATCH_MODE", "sequential")
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "4"))
+
+# AI providers to use, in priority order (groq, gemini, anthropic, openai, mock); ones without an API key are skipped
+LLM_PROVIDERS = [name.strip() for name in os.getenv("LLM_PROVIDERS", "groq,gemini,anthropic,openai").split(",") if name.strip()]
+
+# Offline mock provider for load tests ("mock" in LLM_PROVIDERS): replays the answers recorded in
+# MOCK_RESPONSES_FILE after MOCK_LATENCY +/- MOCK_LATENCY_JITTER seconds and fails MOCK_ERROR_RATE of the calls.
+# With MOCK_RECORD=1 the answers of the real providers are appended to the file.
+MOCK_RESPONSES_FILE = os.getenv("MOCK_RESPONSES_FILE", "mock_responses.jsonl")
+MOCK_LATENCY = float(os.getenv("MOCK_LATENCY", "0.8"))
+MOCK_LATENCY_JITTER = float(os.getenv("MOCK_LATENCY_JITTER", "0.2"))
+MOCK_ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))
+MOCK_SEED = int(os.getenv("MOCK_SEED", "0"))
+MOCK_RECORD = os.getenv("MOCK_RECORD", "0") == "1"
+
+# Tiered processing: notes the local parser understands with at least this confidence (0-1) are
+# quoted without an AI call; the rest go to the providers. Above 1 sends every note to the AI.
+LOCAL_PARSER_THRESHOLD = float(os.getenv("LOCAL_PARSER_THRESHOLD", "0.9"))
+LOCAL_PARSER_LABEL = "local parser"
+escalation_stats = EscalationStats()
+
+# Notes of one /api/process/batch request processed at the same time
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+def _source_hash(*names: str) -> str:
+    """Hash of backend source files (next to this module)"""
+    digest = hashlib.sha256()
+    for name in names:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+# Part of every PDF cache key: a changed template or layout never serves PDFs rendered by the old one
+PDF_RENDERER_VERSION = _source_hash("pdf_generator.py")
+
+# Generated PDFs keyed by a hash of their content and the renderer version (memory LRU + disk tier)
+pdf_cache = TieredCache(
+    "pdf",
+    max_entries=int(os.getenv("PDF_CACHE_MAX_ENTRIES", "256")),
+    max_bytes=int(os.getenv("PDF_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+    ttl=float(os.getenv("PDF_CACHE_TTL", str(7 * 24 * 3600))),
+    disk_dir=os.getenv("PDF_CACHE_DIR", "cache/pdf") or None,
+    max_disk_bytes=int(os.getenv("PDF_CACHE_MAX_DISK_BYTES", str(512 * 1024 * 1024))),
+)
+
+# AI quotation results keyed by normalized input + inventory/prompt version
+process_cache = TieredCache(
+    "process",
+    max_entries=int(os.getenv("PROCESS_CACHE_MAX_ENTRIES", "1024")),
+    max_bytes=int(os.getenv("PROCESS_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+    ttl=float(os.getenv("PROCESS_CACHE_TTL", str(24 * 3600))),
+    disk_dir=os.getenv("PROCESS_CACHE_DIR", "cache/process") or None,
+    max_disk_bytes=int(os.getenv("PROCESS_CACHE_MAX_DISK_BYTES", str(64 * 1024 * 1024))),
+)
+
+# Prometheus metrics served at GET /metrics (METRICS_ENABLED=0 turns them into no-ops).
+# Stage timings go to stage_duration_seconds{stage} through metrics.span().
+provider_requests_total = metrics.counter(
+    "provider_requests_total", "AI provider calls by outcome (ok, error, skipped, cancelled)", ["provider", "outcome"])
+provider_request_seconds = metrics.histogram(
+    "provider_request_duration_seconds", "AI provider call latency (skipped calls excluded)", ["provider"])
+provider_fallbacks_total = metrics.counter(
+    "provider_fallbacks_total", "Requests that moved on from a failed provider", ["provider"])
+quotations_total = metrics.counter(
+    "quotations_total", "Quotations generated, by source (local, ai, fallback)", ["source", "cache_hit"])
+
+def collect_runtime_metrics():
+    """Values the caches, local parser, breakers and PDF pool already keep, read when /metrics is scraped"""
+    caches = {"pdf": pdf_cache.stats(), "process": process_cache.stats()}
+    for key, kind, help in (("hits", "counter", "Cache hits (memory or disk tier)"),
+                            ("disk_hits", "counter", "Cache hits served from the disk tier"),
+                            ("misses", "counter", "Cache misses"),
+                            ("hit_ratio", "gauge", "Cache hits / lookups"),
+                            ("entries", "gauge", "Entries in the memory tier"),
+                            ("bytes", "gauge", "Bytes in the memory tier")):
+        yield f"cache_{key}" if kind == "gauge" else f"cache_{key}_total", kind, help, \
+            [({"cache": name}, stats[key]) for name, stats in caches.items()]
+    pipeline = escalation_stats.stats()
+    yield "local_parser_notes_total", "counter", "Notes quoted by the local parser vs escalated to the AI", \
+        [({"outcome": "local"}, pipeline["local"]), ({"outcome": "escalated"}, pipeline["escalated"])]
+    yield "provider_circuit_open", "gauge", "1 while the provider's circuit breaker is open", \
+        [({"provider": name}, 1 if breaker.state == "open" else 0) for name, breaker in provider_breakers.items()]
+    yield "pdf_render_pending", "gauge", "PDF renders queued or in progress", [({}, pdf_pool.pending)]
+
+metrics.collector(collect_runtime_metrics)
+
 # CORS middleware to allow frontend to connect
 app.add_middleware(
     CORSMiddleware,
@@ -29,6 +259,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 # Models
@@ -40,6 +271,19 @@ class InventoryItem(BaseModel):
     unit: str
     description: Optional[str] = None
 
+# Raw inventory.json item fields that map onto InventoryItem (everything else is kept as extra data)
+INVENTORY_ITEM_FIELDS = ("id", "name", "rate", "unit", "description")
+
+INVENTORY_ITEM_REQUIRED_FIELDS = ("name", "category", "price", "unit")
+
+class InventoryItemUpdate(BaseModel):
+    """Fields to change on an existing inventory item (omitted fields are kept; only description can be null)"""
+    name: Optional[str] = None
+    category: Optional[str] = None
+    price: Optional[float] = None
+    unit: Optional[str] = None
+    description: Optional[str] = None
+
 class QuotationItem(BaseModel):
     description: str
     quantity: int
@@ -49,66 +293,156 @@ class QuotationItem(BaseModel):
 class ProcessRequest(BaseModel):
     raw_text: str
 
+class ProviderUsage(BaseModel):
+    provider: str
+    model: str
+    input_tokens: int  # Including cached_input_tokens and cache_write_tokens
+    output_tokens: int
+    cached_input_tokens: int = 0
+    cache_write_tokens: int = 0
+    cost_usd: float
+    estimated: bool = False  # Counted locally (the provider did not report usage)
+
+class TokenUsage(BaseModel):
+    input_tokens: int
+    output_tokens: int
+    cached_input_tokens: int
+    estimated_cost_usd: float
+    calls: List[ProviderUsage]  # Every AI call made for the request, failed and hedged ones included
+
 class ProcessResponse(BaseModel):
     items: List[QuotationItem]
     success: bool
     message: str
+    usage: Optional[TokenUsage] = None  # AI tokens and estimated cost; None when no AI call was made
+
+class BatchProcessRequest(BaseModel):
+    requests: List[ProcessRequest]
+
+class BatchProcessResult(ProcessResponse):
+    index: int  # Position of the note in the batch request
 
 class PDFRequest(BaseModel):
     items: List[QuotationItem]
     customer_name: Optional[str] = None
     customer_location: Optional[str] = None
+    quotation_date: Optional[str] = None  # Defaults to today (dd/mm/yyyy)
+    reference_no: Optional[str] = None  # Defaults to a number derived from the content
+
+class RulesQuoteRequest(BaseModel):
+    """Core of a job for the rules engine; dependent items are added by the rules"""
+    cameras: Dict[str, int]  # Camera inventory id -> quantity, e.g. {"cam_3mp_bullet": 5, "cam_4mp_360": 1}
+    floors: int = 1
+    backup_days: Optional[int] = None
+    cable_m: Optional[int] = None  # Cable the agent noted (used if longer than the computed length)
+    monitor: bool = False
+    extra_items: Dict[str, int] = {}  # Other inventory items to quote as-is
+
+class BatchPDFRequest(BaseModel):
+    quotations: List[PDFRequest]
+    format: Literal["zip", "merged"] = "zip"  # ZIP of separate PDFs, or one PDF with a section per quotation
 
 # Helper functions for JSON file operations
-def load_inventory() -> List[InventoryItem]:
-    """Load inventory from JSON file (handles nested structure)"""
-    try:
-        with open(INVENTORY_FILE, 'r') as f:
-            data = json.load(f)
-
-            # Handle nested inventory structure
-            inventory_items = []
-
-            # Skip 'rules' section as it's not actual inventory
-            sections_to_skip = ['rules']
-
-            for category_key, category_data in data.items():
-                if category_key in sections_to_skip or not isinstance(category_data, dict):
-                    continue
-
-                # Each category has subcategories (e.g., cameras->ip_cameras, networking->switches)
-                for subcategory_key, subcategory_items in category_data.items():
-                    if not isinstance(subcategory_items, list):
-                        continue
-
-                    # Now iterate through actual items
-                    for item in subcategory_items:
-                        # Map the nested structure to InventoryItem model
-                        inventory_item = InventoryItem(
-                            id=item.get('id', f"{category_key}_{subcategory_key}_{item.get('name', 'unknown')}"),
-                            name=item.get('name', 'Unknown Item'),
-                            category=f"{category_key}/{subcategory_key}",
-                            price=item.get('rate', 0),
-                            unit=item.get('unit', 'piece'),
-                            description=item.get('description', item.get('name', ''))
-                        )
-                        inventory_items.append(inventory_item)
-
-            return inventory_items
+def parse_inventory(data) -> Tuple[List[dict], Optional[dict]]:
+    """Items (InventoryItem fields plus the other raw fields as `extra`) and rules of an inventory.json document"""
+    # Flat list of InventoryItem dicts (as written by older versions of save_inventory)
+    if isinstance(data, list):
+        return [InventoryItem(**item).model_dump() for item in data], None
+
+    # Handle nested inventory structure
+    inventory_items = []
+
+    # Skip 'rules' section as it's not actual inventory
+    for category_key, category_data in data.items():
+        if category_key in NON_ITEM_SECTIONS or not isinstance(category_data, dict):
+            continue
 
+        # Each category has subcategories (e.g., cameras->ip_cameras, networking->switches)
+        for subcategory_key, subcategory_items in category_data.items():
+            if not isinstance(subcategory_items, list):
+                continue
+
+            # Now iterate through actual items
+            for item in subcategory_items:
+                # Map the nested structure to InventoryItem model
+                inventory_item = InventoryItem(
+                    id=item.get('id', f"{category_key}_{subcategory_key}_{item.get('name', 'unknown')}"),
+                    name=item.get('name', 'Unknown Item'),
+                    category=join_category(category_key, subcategory_key),
+                    price=item.get('rate', 0),
+                    unit=item.get('unit', 'piece'),
+                    description=item.get('description', item.get('name', ''))
+                )
+                extra = {key: value for key, value in item.items() if key not in INVENTORY_ITEM_FIELDS}
+                inventory_items.append({**inventory_item.model_dump(), "extra": extra})
+
+    return inventory_items, data.get('rules', {})
+
+def read_inventory_file() -> Optional[Tuple[str, List[dict], Optional[dict]]]:
+    """
+    (hash, items, rules) of inventory.json if it changed since the last import
+    into the database, else None. Raises ValueError/ValidationError for an
+    invalid file.
+    """
+    try:
+        with open(INVENTORY_FILE, 'rb') as f:
+            content = f.read()
     except FileNotFoundError:
-        # Return empty list if file doesn't exist
-        return []
+        return None  # Keep what the database has
+
+    file_hash = hashlib.sha256(content).hexdigest()
+    if database.get_meta("inventory_file_hash") == file_hash:
+        return None
+    items, rules = parse_inventory(json.loads(content))
+    return file_hash, items, rules
+
+def import_inventory_file(file_hash: str, items: List[dict], rules: Optional[dict]):
+    """Write what read_inventory_file returned into the database"""
+    database.replace_inventory(items, rules)
+    database.set_meta("inventory_file_hash", file_hash)
+
+def sync_inventory_file() -> bool:
+    """
+    Import inventory.json into the database if it changed since the last import
+    (e.g. edited by hand); returns True if it did. Raises ValueError/ValidationError
+    for an invalid file, leaving the database unchanged.
+    """
+    staged = read_inventory_file()
+    if staged is None:
+        return False
+    import_inventory_file(*staged)
+    return True
+
+def load_inventory() -> List[InventoryItem]:
+    """Load inventory from the database (after importing inventory.json if it changed)"""
+    sync_inventory_file()
+    return [InventoryItem(**item) for item in database.inventory_items()]
+
+def load_inventory_rules() -> dict:
+    """Load the dependency rules section of the inventory"""
+    return database.inventory_rules()
+
+inventory_file = InventoryFile(INVENTORY_FILE)
 
 def save_inventory(inventory: List[InventoryItem]):
-    """Save inventory to JSON file"""
-    with open(INVENTORY_FILE, 'w') as f:
-        json.dump([item.model_dump() for item in inventory], f, indent=2)
+    """Save inventory to JSON file (atomically, keeping the nested layout and the rules section) and the database"""
+    inventory_file.save([item.model_dump() for item in inventory])
+    sync_inventory_file()
 
 def save_ai_response(response_data: dict):
-    """Save latest AI response to JSON file (overwrites previous)"""
-    with open(LATEST_RESPONSE_FILE, 'w') as f:
-        json.dump(response_data, f, indent=2)
+    """Add a processed quotation to the quotation history"""
+    with metrics.span("save_ai_response"):
+        items = []
+        for item in response_data["items"]:
+            match = knowledge.index.match(item["description"])
+            items.append({**item, "inventory_id": match.id if match else None, "category": match.category if match else None})
+        database.save_quotation(
+            response_data["raw_input"],
+            response_data["ai_provider"],
+            items,
+            cache_hit=response_data.get("cache_hit", False),
+            duration_ms=response_data.get("duration_ms"),
+        )
 
 def load_system_prompt() -> str:
     """Load system prompt from text file"""
@@ -119,384 +453,1180 @@ def load_system_prompt() -> str:
         # Fallback to a basic prompt if file doesn't exist
         return "You are a CCTV quotation assistant. Convert raw input into structured quotation JSON."
 
-# Load data from files on startup
-inventory_db: List[InventoryItem] = load_inventory()
-SYSTEM_PROMPT = load_system_prompt()
+@dataclass(frozen=True)
+class KnowledgeSnapshot:
+    """
+    Everything an AI answer depends on besides the input. Never modified: a
+    reload or an inventory edit publishes a new snapshot, and a request uses
+    the one it started with, so it never mixes an old prompt with new prices.
+    """
+    items: Tuple[InventoryItem, ...]
+    rules: dict
+    system_prompt: str
+    index: InventoryIndex
+    rules_engine: RulesEngine
+    parser: FastParser  # Offline note parser compiled from this inventory
+    version: str  # Hash of everything above that shapes a quotation; cached results are keyed on it
+
+def build_knowledge(items: List[InventoryItem], rules: dict, system_prompt: str,
+                    specs: Optional[Dict[str, Dict]] = None) -> KnowledgeSnapshot:
+    """Raises RuleError for malformed rules; specs default to the extra fields in the database"""
+    if specs is None:
+        specs = database.inventory_specs()
+    rules_engine = RulesEngine(items, rules, specs)
+    return KnowledgeSnapshot(
+        items=tuple(items),
+        rules=rules,
+        system_prompt=system_prompt,
+        index=InventoryIndex(items, rules, max_items=INVENTORY_PROMPT_MAX_ITEMS),
+        rules_engine=rules_engine,
+        parser=FastParser(rules_engine),
+        version=canonical_hash({
+            "inventory": [item.model_dump() for item in items],
+            "specs": specs,  # Channels, capacity, ports, ... (local parser sizing)
+            "rules": rules,  # Local parser dependencies
+            "system_prompt": system_prompt,
+        }),
+    )
+
+_publish_lock = threading.Lock()
+
+def publish_knowledge(rules: Optional[dict] = None, system_prompt: Optional[str] = None):
+    """Swap in a new snapshot built from inventory_db (and new rules / system prompt, if given)"""
+    global knowledge
+    with _publish_lock:
+        current = knowledge
+        knowledge = build_knowledge(
+            inventory_db.list(),
+            current.rules if rules is None else rules,
+            current.system_prompt if system_prompt is None else system_prompt,
+        )
+
+def inventory_changed():
+    """Refresh everything derived from inventory_db after an add/update/delete"""
+    publish_knowledge()
+
+def build_inventory_prompt(raw_text: str, snapshot: KnowledgeSnapshot) -> str:
+    """Compact JSON of the inventory items relevant to raw_text"""
+    with metrics.span("prompt_build"):
+        items = snapshot.index.select(raw_text) if INVENTORY_PREFILTER else snapshot.items
+        inventory_json = compact_inventory_json(items)
+        budget = prompt_token_budget()
+        if not budget:
+            return inventory_json
+        available = budget - PROMPT_RESERVED_TOKENS - count_tokens(snapshot.system_prompt) - count_tokens(raw_text)
+        if count_tokens(inventory_json) <= available:
+            return inventory_json
+        kept = fit_inventory(snapshot.index.rank(raw_text), available, compact_inventory_json)
+        pipeline_log.warning("Inventory trimmed to fit the prompt token budget",
+                             extra={"budget": budget, "items": len(items), "kept": len(kept)})
+        return compact_inventory_json(snapshot.index.in_catalogue_order(kept))
+
+def prompt_token_budget() -> int:
+    """PROMPT_TOKEN_BUDGET, or the smallest input window of the available providers (0 = no limit)"""
+    if PROMPT_TOKEN_BUDGET > 0:
+        return PROMPT_TOKEN_BUDGET
+    budgets = [PROVIDER_MODELS[provider.name].input_budget for provider, _ in provider_registry.available()
+               if provider.name in PROVIDER_MODELS]
+    return min(budgets, default=0)
+
+def reload_changed_files(changed: set):
+    """
+    File watcher callback: reparse inventory.json / system_prompt.txt after an
+    outside edit and publish a new snapshot. Everything is parsed and a
+    snapshot is built before anything is swapped in, so an invalid file
+    (items or rules) is reported and ignored, and the running version stays
+    in place.
+    """
+    current = knowledge
+    system_prompt = None
+    if os.path.abspath(SYSTEM_PROMPT_FILE) in changed and os.path.exists(SYSTEM_PROMPT_FILE):
+        new_prompt = load_system_prompt()
+        if not new_prompt.strip():
+            reload_log.warning("Ignoring empty %s", SYSTEM_PROMPT_FILE)
+        elif new_prompt != current.system_prompt:
+            system_prompt = new_prompt
+
+    staged = None
+    rules = None
+    if os.path.abspath(INVENTORY_FILE) in changed:
+        try:
+            staged = read_inventory_file()
+            if staged is not None:
+                _, items, rules = staged
+                rules = current.rules if rules is None else rules
+                # Trial build: checks the items and the rules before anything is replaced
+                build_knowledge([InventoryItem(**item) for item in items], rules,
+                                current.system_prompt if system_prompt is None else system_prompt,
+                                specs={item["id"]: item["extra"] for item in items if item.get("extra")})
+        except (ValueError, TypeError, ValidationError) as e:
+            reload_log.warning("Ignoring invalid %s: %s", INVENTORY_FILE, e)
+            staged = rules = None
+
+    if staged is not None:
+        import_inventory_file(*staged)
+        inventory_db.reload([InventoryItem(**item) for item in database.inventory_items()])
+        reload_log.info("%s reloaded (%d items)", INVENTORY_FILE, len(inventory_db))
+    if system_prompt is not None:
+        reload_log.info("%s reloaded", SYSTEM_PROMPT_FILE)
+    if rules is not None or system_prompt is not None:
+        publish_knowledge(rules=rules, system_prompt=system_prompt)
+
+_NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+
+def _normalize_number(match: re.Match) -> str:
+    value = float(match.group(0))
+    return str(int(value)) if value == int(value) else str(value)
+
+def normalize_raw_text(raw_text: str) -> str:
+    """
+    Canonical form of agent input for cache lookups: lowercase, single spaces,
+    no blank lines, numbers without leading zeros or trailing '.0', and no
+    space between a number and its unit ("200 m" -> "200m").
+    """
+    lines = []
+    for line in raw_text.lower().splitlines():
+        line = _NUMBER_PATTERN.sub(_normalize_number, line)
+        line = re.sub(r'\s*([-:,=*])\s*', r' \1 ', line)
+        line = re.sub(r'(\d)\s+([a-z])', r'\1\2', line)
+        line = ' '.join(line.split())
+        if line:
+            lines.append(line)
+    return '\n'.join(lines)
+
+# Loaded on startup (lifespan), not at import: PDF workers started by the spawn method (Windows,
+# macOS) import the __main__ module again, and must not open the database or replay the change log
+database: Optional[QuotationDatabase] = None
+inventory_db: Optional[InventoryStore] = None
+knowledge: Optional[KnowledgeSnapshot] = None
+
+def load_app_state():
+    """Open the database and load the inventory, rules and system prompt"""
+    global database, inventory_db, knowledge
+    database = QuotationDatabase(DATABASE_FILE)
+    inventory_db = InventoryStore(
+        load_inventory(),
+        log_path=INVENTORY_LOG_FILE,
+        item_factory=lambda data: InventoryItem(**data),
+        save_snapshot=save_inventory,
+        compact_after=INVENTORY_COMPACT_AFTER,
+        flush_delay=INVENTORY_FLUSH_DELAY,
+    )
+    knowledge = build_knowledge(inventory_db.list(), load_inventory_rules(), load_system_prompt())
 
 # Routes
 @app.get("/")
 def read_root():
     return {"message": "CCTV Quotation API is running"}
 
+INVENTORY_FIELDS = set(InventoryItem.model_fields)
+
+def _inventory_filter(category: Optional[str], q: Optional[str]):
+    """Predicate for the category (exact, or a whole section such as "cameras") and text filters"""
+    if category is None and not q:
+        return None
+    terms = q.lower().split() if q else []
+
+    def matches(item: InventoryItem) -> bool:
+        if category is not None and item.category != category and not item.category.startswith(f"{category}/"):
+            return False
+        text = f"{item.id} {item.name} {item.description or ''}".lower()
+        return all(term in text for term in terms)
+    return matches
+
+def _project(items: List[InventoryItem], fields: Optional[set]) -> List[dict]:
+    return [item.model_dump(include=fields) for item in items]
+
 @app.get("/api/inventory")
-def get_inventory():
-    """Get all inventory items"""
-    return inventory_db
+def get_inventory(category: Optional[str] = None, q: Optional[str] = None, fields: Optional[str] = None,
+                  limit: Optional[int] = None, cursor: Optional[int] = None, since: Optional[int] = None,
+                  if_none_match: Optional[str] = Header(default=None)):
+    """
+    Get inventory items.
+
+    Without parameters this is the plain list of all items. Optional:
+    category (exact, or a section such as "cameras") and q (words that must
+    appear in the id, name or description) filter the list; fields
+    (comma-separated, e.g. "id,name,price") limits the fields returned.
+
+    limit/cursor page through the list: the response is then
+    {"items", "next_cursor", "version"}; pass next_cursor back to get the
+    next page. since=<version> returns only what changed after that version:
+    {"items" (added or changed), "deleted" (ids), "version", "reset"}, where
+    reset=true means the version was too old and items is the full list.
+
+    Every response carries an ETag derived from the inventory version;
+    If-None-Match with an unchanged ETag returns 304.
+    """
+    field_set = None
+    if fields:
+        field_set = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = field_set - INVENTORY_FIELDS
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+        field_set.add("id")
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+
+    # Same version + same query = same body
+    version = inventory_db.version
+    query = {"category": category, "q": q, "fields": sorted(field_set) if field_set else None,
+             "limit": limit, "cursor": cursor, "since": since}
+    etag = f'"inv-{version}-{canonical_hash(query)[:12]}"'
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    predicate = _inventory_filter(category, q)
+    if since is not None:
+        changes = inventory_db.changes_since(since)
+        if changes is None:
+            items, _ = inventory_db.page(predicate=predicate)
+            body = {"items": _project(items, field_set), "deleted": [], "version": version, "reset": True}
+        else:
+            changed, deleted = changes
+            if predicate is not None:
+                # An item edited out of the filter is gone as far as this client is concerned
+                deleted += [item.id for item in changed if not predicate(item)]
+                changed = [item for item in changed if predicate(item)]
+            body = {"items": _project(changed, field_set), "deleted": deleted, "version": version, "reset": False}
+    elif limit is not None or cursor is not None:
+        items, next_cursor = inventory_db.page(after=cursor, limit=limit, predicate=predicate)
+        body = {"items": _project(items, field_set), "next_cursor": next_cursor, "version": version}
+    else:
+        items, _ = inventory_db.page(predicate=predicate)
+        body = _project(items, field_set)
+
+    return Response(
+        content=json.dumps(body, ensure_ascii=False, separators=(',', ':')),
+        media_type="application/json",
+        headers={"ETag": etag},
+    )
+
+def _check_item_category(category: str):
+    if not is_item_category(category):
+        raise HTTPException(status_code=422, detail=f"Category '{category}' is reserved for a non-item section of inventory.json")
 
 @app.post("/api/inventory")
 def add_inventory_item(item: InventoryItem):
     """Add new inventory item"""
-    inventory_db.append(item)
-    save_inventory(inventory_db)  # Save to JSON file
+    _check_item_category(item.category)
+    try:
+        inventory_db.add(item)  # Logged to the inventory change log
+    except DuplicateItemError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    inventory_changed()
     return {"success": True, "item": item}
 
+@app.put("/api/inventory/{item_id}")
+def update_inventory_item(item_id: str, changes: InventoryItemUpdate):
+    """Update fields (e.g. the price) of an inventory item"""
+    item = inventory_db.get(item_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail=f"Item '{item_id}' not found")
+    fields = changes.model_dump(exclude_unset=True)
+    cleared = [name for name, value in fields.items() if value is None and name in INVENTORY_ITEM_REQUIRED_FIELDS]
+    if cleared:
+        raise HTTPException(status_code=422, detail=f"Fields cannot be null: {', '.join(cleared)}")
+    try:
+        # Validated like a new item, so nothing invalid reaches the store, the change log or inventory.json
+        updated = InventoryItem(**{**item.model_dump(), **fields})
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    _check_item_category(updated.category)
+    inventory_db.update(updated)
+    inventory_changed()
+    return {"success": True, "item": updated}
+
 @app.delete("/api/inventory/{item_id}")
 def delete_inventory_item(item_id: str):
     """Delete inventory item"""
-    global inventory_db
-    inventory_db = [item for item in inventory_db if item.id != item_id]
-    save_inventory(inventory_db)  # Save to JSON file
+    try:
+        inventory_db.delete(item_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Item '{item_id}' not found")
+    inventory_changed()
     return {"success": True, "message": "Item deleted"}
 
+def _parse_timestamp(value: Optional[str], name: str) -> Optional[float]:
+    """ISO date or date-time query parameter -> Unix time"""
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} '{value}' (expected an ISO date such as 2025-01-31)")
+
+@app.get("/api/quotations")
+def list_quotations(item_id: Optional[str] = None, category: Optional[str] = None, q: Optional[str] = None,
+                    since: Optional[str] = None, until: Optional[str] = None, provider: Optional[str] = None,
+                    limit: int = 50):
+    """
+    Quotation history, newest first.
+
+    Filter by inventory item (item_id=cam_4mp_360), category (category=cameras
+    or cameras/ip_cameras), text in the item descriptions (q=360), AI provider
+    and time range (since/until as ISO dates), e.g. all quotes containing 360
+    cameras last month: ?item_id=cam_4mp_360&since=2025-01-01&until=2025-02-01
+    """
+    return database.find_quotations(
+        inventory_id=item_id,
+        category=category,
+        text=q,
+        since=_parse_timestamp(since, "since"),
+        until=_parse_timestamp(until, "until"),
+        ai_provider=provider,
+        limit=max(1, min(limit, 500)),
+    )
+
+@app.get("/api/quotations/{quotation_id}")
+def get_quotation(quotation_id: int):
+    quotation = database.get_quotation(quotation_id)
+    if quotation is None:
+        raise HTTPException(status_code=404, detail=f"Quotation {quotation_id} not found")
+    return quotation
+
+def resolve_pdf_fields(request: PDFRequest) -> dict:
+    """
+    Fill in the date and reference number of a PDF request and compute its cache key
+    (which also covers PDF_RENDERER_VERSION and the fonts the render workers resolved).
+
+    A missing reference number is derived from the quotation content, so the same
+    request always renders the same PDF and can be served from the cache.
+    """
+    fields = {
+        "items": [item.model_dump() for item in request.items],
+        "customer_name": request.customer_name,
+        "customer_location": request.customer_location,
+        "quotation_date": request.quotation_date or datetime.now().strftime('%d/%m/%Y'),
+        "reference_no": request.reference_no,
+    }
+    if not fields["reference_no"]:
+        fields["reference_no"] = str(int(canonical_hash(fields)[:8], 16) % 10000).zfill(4)
+    fields["cache_key"] = canonical_hash({**fields, "renderer": PDF_RENDERER_VERSION, "fonts": pdf_pool.fonts})
+    return fields
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header value against an ETag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+@app.get("/api/cache/stats")
+def get_cache_stats():
+    """Hit/miss counters and sizes of the server-side caches"""
+    return {"pdf": pdf_cache.stats(), "process": process_cache.stats()}
+
+@app.get("/api/pipeline/stats")
+def get_pipeline_stats():
+    """Notes quoted by the local parser vs escalated to the AI (escape_rate = escalated share)"""
+    return {"threshold": LOCAL_PARSER_THRESHOLD, **escalation_stats.stats()}
+
+@app.get("/api/pdf/stats")
+def get_pdf_stats():
+    """Render pool size and load, and the fonts its workers resolved (null: fallback font, text may show as boxes)"""
+    return {"workers": pdf_pool.workers, "pending": pdf_pool.pending, "queue_depth": pdf_pool.queue_depth,
+            "fonts": pdf_pool.fonts}
+
+@app.get("/metrics")
+def get_metrics():
+    """Provider, cache, pipeline and PDF metrics in the Prometheus text format"""
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (METRICS_ENABLED=0)")
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/api/generate-pdf")
-async def generate_quotation_pdf(request: PDFRequest):
+async def generate_quotation_pdf(request: PDFRequest, if_none_match: Optional[str] = Header(default=None)):
     """Generate PDF quotation from items"""
     try:
-        print(f"[PDF] Received request with {len(request.items)} items")
-        print(f"[PDF] Customer: {request.customer_name}, Location: {request.customer_location}")
+        pdf_log.debug("Received request", extra={"item_count": len(request.items)})
+
+        fields = resolve_pdf_fields(request)
+        cache_key = fields["cache_key"]
+        etag = f'"{cache_key}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": "private, no-cache",
+            "Content-Disposition": f"attachment; filename=HDC_Quotation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        }
 
-        # Convert Pydantic models to dicts
-        items_data = [item.model_dump() for item in request.items]
+        # Client already has this exact quotation
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
 
-        print(f"[PDF] Items data: {items_data}")
+        log_payload(pdf_log, "PDF request", customer_name=request.customer_name,
+                    customer_location=request.customer_location, items=fields['items'])
 
-        # Generate PDF using HDC template
-        pdf_gen = HDCQuotationPDF()
-        pdf_buffer = pdf_gen.generate_quotation(
-            items=items_data,
-            customer_name=request.customer_name,
-            customer_location=request.customer_location,
-            include_info_page=True  # Include the marketing page
-        )
+        # Generate PDF using HDC template (from the cache or the worker pool)
+        pdf_bytes = await render_cached_pdf(fields)
 
-        print("[PDF] PDF generated successfully with HDC template")
+        pdf_log.info("PDF generated", extra={"item_count": len(fields['items']), "bytes": len(pdf_bytes)})
 
-        # Return PDF as streaming response
-        return StreamingResponse(
-            pdf_buffer,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename=HDC_Quotation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-            }
-        )
+        return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+    except PDFPoolBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="PDF generation timed out")
     except Exception as e:
-        print(f"[PDF] Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        pdf_log.exception("PDF generation failed: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/process", response_model=ProcessResponse)
-async def process_raw_text(request: ProcessRequest):
-    """Process raw agent input and generate quotation items using AI"""
-
+def quote_locally(raw_text: str, snapshot: KnowledgeSnapshot) -> Optional[List[QuotationItem]]:
+    """Items from the local parser when it is confident about the note, else None (escalate to the AI)"""
+    with metrics.span("local_parse"):
+        lines, note = snapshot.parser.quote(raw_text)
+    escalate = note.confidence < LOCAL_PARSER_THRESHOLD
+    escalation_stats.record(escalate, note.confidence)
+    if escalate:
+        pipeline_log.debug("Escalating to AI", extra={"confidence": round(note.confidence, 2),
+                                                      "unknown": " ".join(note.unknown[:10]),
+                                                      "uncovered": "; ".join(note.uncovered[:5])})
+        return None
+    return [QuotationItem(description=line.description, quantity=line.quantity, rate=line.rate, amount=line.amount)
+            for line in lines]
+
+async def generate_quotation_items(raw_text: str, snapshot: KnowledgeSnapshot,
+                                   inventory_json: Optional[str] = None) -> Tuple[List[QuotationItem], str]:
+    """
+    Quote a note with the local parser, or when it is not confident enough
+    run the AI provider chain (with simple parsing fallback); returns (items, provider label)
+    """
+    items = quote_locally(raw_text, snapshot)
+    if items is not None:
+        return items, LOCAL_PARSER_LABEL
+
+    # Prepare inventory data for AI (only the items relevant to this note, unless given)
+    if inventory_json is None:
+        inventory_json = build_inventory_prompt(raw_text, snapshot)
+    system_prompt = snapshot.system_prompt
+
+    if LLM_DISPATCH_MODE == "hedged":
+        return await generate_items_hedged(raw_text, inventory_json, snapshot)
+
+    # Try the providers in LLM_PROVIDERS order; simple parsing if none is configured or all fail
+    providers = provider_registry.available()
+    for provider, api_key in providers:
+        try:
+            items = await call_provider(provider.name, raw_text, inventory_json, api_key, system_prompt)
+            return items, provider.label
+        except Exception as e:
+            dispatch_log.warning("%s error: %s", provider.label, e)
+            provider_fallbacks_total.inc(provider.name)
+
+    if providers:
+        return simple_parse(raw_text, snapshot), "basic parsing (AI failed)"
+    return simple_parse(raw_text, snapshot), "basic parsing (no AI API key found)"
+
+async def call_provider(name: str, raw_text: str, inventory_json: str, api_key: str, system_prompt: str) -> List[QuotationItem]:
+    """Call one AI provider with its timeout and circuit breaker"""
+    provider = provider_registry.get(name)
+    outcome = "error"
+    started = time.perf_counter()
     try:
-        # Prepare inventory data for AI
-        inventory_json = json.dumps([item.model_dump() for item in inventory_db], indent=2)
-
-        # Get API key from environment variable
-        gemini_key = os.getenv("GEMINI_API_KEY")
-        anthropic_key = os.getenv("ANTHROPIC_API_KEY")
-        openai_key = os.getenv("OPENAI_API_KEY")
-
-        # Priority: Groq (FREE) > Gemini > Anthropic > OpenAI > Simple parsing
-        groq_key = os.getenv("GROQ_API_KEY")
-
-        if groq_key:
-            try:
-                items = await process_with_groq(request.raw_text, inventory_json, groq_key)
-                ai_provider = "Groq AI (FREE)"
-            except Exception as groq_error:
-                print(f"[Groq] Error: {groq_error}")
-                # Fallback to Gemini if Groq fails
-                if gemini_key:
-                    try:
-                        items = await process_with_gemini(request.raw_text, inventory_json, gemini_key)
-                        ai_provider = "Gemini AI"
-                    except Exception as gemini_error:
-                        print(f"[Gemini] Error: {gemini_error}")
-                        items = simple_parse(request.raw_text)
-                        ai_provider = "basic parsing (AI failed)"
-                else:
-                    items = simple_parse(request.raw_text)
-                    ai_provider = "basic parsing (Groq failed)"
-        elif gemini_key:
-            try:
-                items = await process_with_gemini(request.raw_text, inventory_json, gemini_key)
-                ai_provider = "Gemini AI"
-            except Exception as gemini_error:
-                print(f"[Gemini] Error: {gemini_error}")
-                # Fallback to simple parsing if Gemini fails (quota exceeded, etc.)
-                items = simple_parse(request.raw_text)
-                ai_provider = "basic parsing (Gemini quota exceeded)"
-        elif anthropic_key:
-            items = await process_with_claude(request.raw_text, inventory_json)
-            ai_provider = "Claude AI"
-        elif openai_key:
-            items = await process_with_openai(request.raw_text, inventory_json)
-            ai_provider = "OpenAI"
-        else:
-            # Fallback to simple parsing if no API key
-            items = simple_parse(request.raw_text)
-            ai_provider = "basic parsing (no AI API key found)"
-
-        # Save AI response to JSON file (overwrites previous)
-        response_data = {
-            "raw_input": request.raw_text,
-            "ai_provider": ai_provider,
-            "items": [item.model_dump() for item in items],
-            "item_count": len(items)
-        }
-        save_ai_response(response_data)
-
-        return ProcessResponse(
-            items=items,
-            success=True,
-            message=f"Generated {len(items)} items using {ai_provider}"
+        items = await call_with_breaker(
+            provider_breakers[name],
+            PROVIDER_TIMEOUTS[name],
+            lambda: provider.process(raw_text, inventory_json, api_key, system_prompt),
+            name=name,
         )
+        outcome = "ok"
+    except ProviderUnavailable:
+        outcome = "skipped"
+        raise
+    except asyncio.CancelledError:
+        outcome = "cancelled"  # Lost a hedged race
+        raise
+    finally:
+        provider_requests_total.inc(name, outcome)
+        if outcome != "skipped":
+            provider_request_seconds.observe(time.perf_counter() - started, name)
+    if MOCK_RECORD and not isinstance(provider, MockProvider):
+        await asyncio.to_thread(record_mock_response, raw_text, items)
+    return items
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-async def process_with_groq(raw_text: str, inventory_json: str, api_key: str) -> List[QuotationItem]:
-    """Process using Groq AI (FREE and FAST)"""
-    print(f"\n{'='*50}")
-    print(f"[Groq] Starting process...")
-    print(f"[Groq] API Key (first 10 chars): {api_key[:10]}...")
-    print(f"[Groq] Raw text input: {raw_text}")
-
-    client = Groq(api_key=api_key)
+def record_mock_response(raw_text: str, items: List[QuotationItem]):
+    """Append a real provider's answer to MOCK_RESPONSES_FILE for the mock provider to replay"""
+    record = {"raw_text": raw_text, "response": {"items": [item.model_dump() for item in items]}}
+    with open(MOCK_RESPONSES_FILE, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
 
-    full_prompt = f"""{SYSTEM_PROMPT}
+async def generate_items_hedged(raw_text: str, inventory_json: str, snapshot: KnowledgeSnapshot) -> Tuple[List[QuotationItem], str]:
+    """Race the configured providers in priority order (see LLM_DISPATCH_MODE)"""
+    system_prompt = snapshot.system_prompt
+    attempts = []
+    for provider, api_key in provider_registry.available():
+        if provider_breakers[provider.name].state != "open":
+            attempts.append((provider.label, lambda name=provider.name, api_key=api_key:
+                             call_provider(name, raw_text, inventory_json, api_key, system_prompt)))
 
-Inventory List:
-{inventory_json}
+    if not attempts:
+        return simple_parse(raw_text, snapshot), "basic parsing (no AI provider available)"
 
-Agent Input:
-{raw_text}"""
+    try:
+        ai_provider, items = await hedged_race(attempts, LLM_HEDGE_DELAY)
+    except Exception as e:
+        dispatch_log.warning("All providers failed: %s", e)
+        return simple_parse(raw_text, snapshot), "basic parsing (AI failed)"
+    return items, ai_provider
+
+def is_ai_result(ai_provider: str) -> bool:
+    """False when the items came from the simple parsing fallback"""
+    return not ai_provider.startswith("basic parsing")
+
+def process_cache_key(raw_text: str, snapshot: KnowledgeSnapshot) -> str:
+    """Identical notes (after normalization) against the same inventory and prompt share a key"""
+    return canonical_hash({"text": normalize_raw_text(raw_text), "version": snapshot.version})
+
+async def get_cached_items(cache_key: str) -> Optional[Tuple[List[QuotationItem], str]]:
+    """Previously generated (items, provider label) for a cache key, if any"""
+    cached = await process_cache.aget(cache_key)
+    if cached is None:
+        return None
+    cached_data = json.loads(cached)
+    return [QuotationItem(**item) for item in cached_data["items"]], cached_data["ai_provider"]
+
+async def cache_items(cache_key: str, items: List[QuotationItem], ai_provider: str):
+    """Remember an AI result (fallback results are not cached so the next request retries the AI)"""
+    if is_ai_result(ai_provider):
+        await process_cache.aset(cache_key, json.dumps({
+            "ai_provider": ai_provider,
+            "items": [item.model_dump() for item in items],
+        }).encode("utf-8"))
+
+async def finish_processing(raw_text: str, items: List[QuotationItem], ai_provider: str, cache_hit: bool,
+                            started: float, usage: Optional[UsageRecorder] = None) -> ProcessResponse:
+    """
+    Record the quotation in the history and build the API response
+    (started: time.perf_counter() at the start, usage: the AI calls made for it)
+    """
+    response_data = {
+        "raw_input": raw_text,
+        "ai_provider": ai_provider,
+        "items": [item.model_dump() for item in items],
+        "item_count": len(items),
+        "cache_hit": cache_hit,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    await asyncio.to_thread(save_ai_response, response_data)
+    source = "local" if ai_provider == LOCAL_PARSER_LABEL else "ai" if is_ai_result(ai_provider) else "fallback"
+    quotations_total.inc(source, "true" if cache_hit else "false")
+
+    usage_summary = usage.summary() if usage is not None else None
+    return ProcessResponse(
+        items=items,
+        success=True,
+        message=f"Generated {len(items)} items using {ai_provider}" + (" (cache hit)" if cache_hit else ""),
+        usage=TokenUsage(**usage_summary) if usage_summary else None,
+    )
 
-    print(f"[Groq] Prompt length: {len(full_prompt)} chars")
-    print(f"[Groq] Sending request to Groq API...")
+class _ZipChunkSink:
+    """Write-only file object that collects what zipfile writes so it can be streamed out"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+class _ClosingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that calls on_close however the response ends. A
+    client that disconnects before the body starts never runs the body
+    generator, so its finally block cannot be relied on for cleanup.
+    """
+
+    def __init__(self, content, on_close: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self._on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._on_close()
+
+async def render_cached_pdf(fields: dict, reserved: bool = False) -> bytes:
+    """PDF for resolved request fields (see resolve_pdf_fields), from the cache or the render pool"""
+    pdf_bytes = await pdf_cache.aget(fields["cache_key"])
+    if pdf_bytes is None:
+        pdf_bytes = await pdf_pool.render(
+            fields["items"],
+            reserved=reserved,
+            customer_name=fields["customer_name"],
+            customer_location=fields["customer_location"],
+            quotation_date=fields["quotation_date"],
+            reference_no=fields["reference_no"],
+            include_info_page=True
+        )
+        await pdf_cache.aset(fields["cache_key"], pdf_bytes)
+    return pdf_bytes
+
+@app.post("/api/generate-pdf/batch")
+async def generate_quotation_pdf_batch(request: BatchPDFRequest):
+    """
+    Generate PDFs for many quotations in one request.
+
+    format=zip streams a ZIP archive with one PDF per quotation; PDFs are rendered
+    in parallel and each is written to the archive as soon as it is ready, so
+    the whole archive is never held in memory. Queue slots for the renders are
+    reserved up front, so a busy pool is a 503 rather than a cut-off archive; a
+    PDF that fails after the response has started becomes a .error.txt entry.
+    format=merged returns a single PDF with the information page once followed
+    by one section per quotation.
+    """
+    if not request.quotations:
+        raise HTTPException(status_code=400, detail="No quotations given")
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    all_fields = [resolve_pdf_fields(quotation) for quotation in request.quotations]
+
+    if request.format == "merged":
+        merged_key = canonical_hash([fields["cache_key"] for fields in all_fields])
+        try:
+            pdf_bytes = await pdf_cache.aget(merged_key)
+            if pdf_bytes is None:
+                pdf_bytes = await pdf_pool.render_merged(
+                    [{key: value for key, value in fields.items() if key != "cache_key"} for fields in all_fields],
+                    include_info_page=True
+                )
+                await pdf_cache.aset(merged_key, pdf_bytes)
+        except PDFPoolBusy as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="PDF generation timed out")
+        return Response(
+            content=pdf_bytes,
+            media_type="application/pdf",
+            headers={"Content-Disposition": f"attachment; filename=HDC_Quotations_{timestamp}.pdf"}
+        )
 
-    response = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
-        messages=[
-            {"role": "user", "content": full_prompt}
-        ],
-        temperature=0.2,
-        max_tokens=4096,
+    # Render a few at a time, in queue slots held for the whole batch: once the
+    # response has started, a full queue could only cut the archive short
+    slots = max(1, min(pdf_pool.workers * 2, pdf_pool.queue_depth, len(all_fields)))
+    try:
+        pdf_pool.reserve(slots)
+    except PDFPoolBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    limit = asyncio.Semaphore(slots)
+
+    async def render_one(fields: dict) -> bytes:
+        async with limit:
+            return await render_cached_pdf(fields, reserved=True)
+
+    tasks = {asyncio.ensure_future(render_one(fields)): (index, fields) for index, fields in enumerate(all_fields, 1)}
+    released = False
+
+    def finish():
+        """Stop the renders still running and give the slots back (once)"""
+        nonlocal released
+        for task in tasks:
+            task.cancel()
+        if not released:
+            released = True
+            pdf_pool.release(slots)
+
+    # The first PDF is rendered before the status line is sent, so a stuck pool still gets a 504
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    except BaseException:
+        finish()
+        raise
+    first_error = next(iter(done)).exception()
+    if first_error is not None:
+        finish()
+        if isinstance(first_error, asyncio.TimeoutError):
+            raise HTTPException(status_code=504, detail="PDF generation timed out")
+        raise first_error
+
+    async def stream_zip() -> AsyncIterator[bytes]:
+        sink = _ZipChunkSink()
+        pending = set(tasks)
+        try:
+            with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        index, fields = tasks[task]
+                        name = f"HDC_Quotation_{index:03d}_{fields['reference_no']}"
+                        try:
+                            archive.writestr(f"{name}.pdf", task.result())
+                        except Exception as e:
+                            # Too late for an error status: note the failure in the archive and go on
+                            pdf_log.warning("Batch PDF %d failed: %r", index, e)
+                            archive.writestr(f"{name}.error.txt", f"PDF generation failed: {e!r}\n")
+                        yield sink.take()
+            yield sink.take()  # Central directory
+        finally:
+            finish()
+
+    return _ClosingStreamingResponse(
+        stream_zip(),
+        on_close=finish,
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=HDC_Quotations_{timestamp}.zip"}
     )
 
-    # Parse AI response
-    response_text = response.choices[0].message.content.strip()
-    print(f"[Groq] Response received!")
-    print(f"[Groq] Response length: {len(response_text)} chars")
-    print(f"[Groq] Response preview: {response_text[:500]}...")
-
-    # Extract JSON from response (in case there's markdown)
-    if "```json" in response_text:
-        response_text = response_text.split("```json")[1].split("```")[0].strip()
-    elif "```" in response_text:
-        response_text = response_text.split("```")[1].split("```")[0].strip()
-
-    print(f"[Groq] Extracted JSON: {response_text[:300]}...")
-    parsed_response = json.loads(response_text)
-
-    # Handle both formats: direct array or object with "items" field
-    if isinstance(parsed_response, list):
-        items_data = parsed_response
-    elif isinstance(parsed_response, dict) and "items" in parsed_response:
-        items_data = parsed_response["items"]
-    else:
-        raise ValueError("Invalid response format from AI")
+@app.post("/api/process", response_model=ProcessResponse)
+async def process_raw_text(request: ProcessRequest):
+    """Process raw agent input and generate quotation items using AI"""
 
-    return [QuotationItem(**item) for item in items_data]
+    started = time.perf_counter()
+    snapshot = knowledge
+    try:
+        cache_key = process_cache_key(request.raw_text, snapshot)
+        cached = await get_cached_items(cache_key)
 
-async def process_with_gemini(raw_text: str, inventory_json: str, api_key: str) -> List[QuotationItem]:
-    """Process using Google Gemini AI"""
-    print(f"\n{'='*50}")
-    print(f"[Gemini] Starting process...")
-    print(f"[Gemini] API Key (first 10 chars): {api_key[:10]}...")
-    print(f"[Gemini] Raw text input: {raw_text}")
+        with recording_usage() as usage:
+            if cached is not None:
+                items, ai_provider = cached
+            else:
+                items, ai_provider = await generate_quotation_items(request.raw_text, snapshot)
+                await cache_items(cache_key, items, ai_provider)
 
-    genai.configure(api_key=api_key)
+        return await finish_processing(request.raw_text, items, ai_provider, cache_hit=cached is not None,
+                                       started=started, usage=usage)
 
-    # Try experimental model (often has separate/higher quota)
-    model_name = 'gemini-2.0-flash-exp'
-    print(f"[Gemini] Using model: {model_name}")
-    model = genai.GenerativeModel(model_name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-    full_prompt = f"""{SYSTEM_PROMPT}
+async def process_batch_note(index: int, raw_text: str, snapshot: KnowledgeSnapshot, inventory_json: str,
+                             limit: asyncio.Semaphore) -> BatchProcessResult:
+    """Process one note of a batch; any failure falls back to simple parsing for that note only"""
+    async with limit:
+        started = time.perf_counter()
+        cache_key = process_cache_key(raw_text, snapshot)
+        cached = await get_cached_items(cache_key)
+        with recording_usage() as usage:
+            if cached is not None:
+                items, ai_provider = cached
+            else:
+                try:
+                    items, ai_provider = await generate_quotation_items(raw_text, snapshot, inventory_json)
+                    await cache_items(cache_key, items, ai_provider)
+                except Exception as e:
+                    dispatch_log.warning("Batch note %d failed: %s", index, e)
+                    items, ai_provider = simple_parse(raw_text, snapshot), "basic parsing (AI failed)"
+
+        response = await finish_processing(raw_text, items, ai_provider, cache_hit=cached is not None,
+                                           started=started, usage=usage)
+        return BatchProcessResult(index=index, **response.model_dump())
+
+@app.post("/api/process/rules", response_model=ProcessResponse)
+async def process_with_rules(request: RulesQuoteRequest):
+    """
+    Quote a job from its core items without an AI call: the rules engine adds
+    the NVR, hard disk, switch, cabling, accessories and installation charges
+    from the inventory rules and rates.
+    """
+    started = time.perf_counter()
+    job = JobRequirements(**request.model_dump())
+    try:
+        lines = knowledge.rules_engine.expand(job)
+    except RuleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    items = [QuotationItem(description=line.description, quantity=line.quantity, rate=line.rate, amount=line.amount)
+             for line in lines]
+    return await finish_processing(request.model_dump_json(), items, "rules engine", cache_hit=False, started=started)
+
+def batch_failure(index: int, error: BaseException) -> BatchProcessResult:
+    """Result for a note whose processing failed, so the rest of the batch is still returned"""
+    dispatch_log.warning("Batch note %d failed: %r", index, error)
+    return BatchProcessResult(index=index, items=[], success=False, message=f"Processing failed: {error}")
+
+@app.post("/api/process/batch")
+async def process_batch(request: BatchProcessRequest, stream: bool = False):
+    """
+    Process many site notes at once (BATCH_CONCURRENCY at a time).
+
+    All notes share one inventory prompt (selected for the whole batch), so every
+    AI call starts with the same system prompt + inventory prefix and providers
+    can reuse their prompt cache. Returns results in request order, or with
+    ?stream=true one NDJSON line per note as soon as it completes; a note that
+    fails gets a result with success=false.
+    """
+    raw_texts = [note.raw_text for note in request.requests]
+    snapshot = knowledge  # The whole batch uses one inventory / prompt version
+    inventory_json = build_inventory_prompt("\n".join(raw_texts), snapshot)
+    limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+    tasks = [
+        asyncio.ensure_future(process_batch_note(index, raw_text, snapshot, inventory_json, limit))
+        for index, raw_text in enumerate(raw_texts)
+    ]
+
+    if not stream:
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return [batch_failure(index, result) if isinstance(result, BaseException) else result
+                for index, result in enumerate(results)]
+
+    async def stream_results() -> AsyncIterator[str]:
+        indexes = {task: index for index, task in enumerate(tasks)}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    error = task.exception()
+                    result = batch_failure(indexes[task], error) if error is not None else task.result()
+                    yield _event(result.model_dump())
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.post("/api/process/stream")
+async def process_raw_text_stream(request: ProcessRequest):
+    """
+    Streaming variant of /api/process (NDJSON, one event per line).
+
+    Events: {"type": "item", "item": {...}} for every item as soon as the AI has
+    written it, {"type": "reset"} if a provider failed mid-answer and the items
+    sent so far should be discarded, and finally {"type": "done", ...} carrying
+    the same fields as the /api/process response (or {"type": "error", "detail": ...}).
+    """
+    return StreamingResponse(stream_quotation_events(request.raw_text), media_type="application/x-ndjson")
+
+def _event(data: dict) -> str:
+    return json.dumps(data) + "\n"
+
+async def stream_quotation_events(raw_text: str) -> AsyncIterator[str]:
+    """Generate the NDJSON events of /api/process/stream"""
+    started = time.perf_counter()
+    snapshot = knowledge
+    stream_usage = UsageRecorder()
+    try:
+        cache_key = process_cache_key(raw_text, snapshot)
+        cached = await get_cached_items(cache_key)
+        local_items = quote_locally(raw_text, snapshot) if cached is None else None
+
+        if cached is not None:
+            items, ai_provider = cached
+            for item in items:
+                yield _event({"type": "item", "item": item.model_dump()})
+        elif local_items is not None:
+            items, ai_provider = local_items, LOCAL_PARSER_LABEL
+            for item in items:
+                yield _event({"type": "item", "item": item.model_dump()})
+            await cache_items(cache_key, items, ai_provider)
+        else:
+            inventory_json = build_inventory_prompt(raw_text, snapshot)
+            items, ai_provider = [], None
+
+            providers = provider_registry.available(streaming=True)
+            for provider, api_key in providers:
+                label = provider.label
+                parser = ItemStreamParser()
+                provider_items = []
+                chunks = []
+                outcome = "error"
+                call_started = time.perf_counter()
+                # Same timeout and circuit breaker as call_provider
+                stream = stream_with_breaker(
+                    provider_breakers[provider.name],
+                    PROVIDER_TIMEOUTS[provider.name],
+                    lambda: provider.stream(raw_text, inventory_json, api_key, snapshot.system_prompt),
+                    name=provider.name,
+                )
+                try:
+                    async with aclosing(stream):
+                        async for chunk in stream:
+                            chunks.append(chunk)
+                            for item_data in parser.feed(chunk):
+                                item_data = normalize_item(item_data)
+                                if item_data is None:
+                                    continue
+                                item = QuotationItem(**item_data)
+                                provider_items.append(item)
+                                yield _event({"type": "item", "item": item.model_dump()})
+                    if not provider_items:
+                        raise ValueError("Invalid response format from AI")
+                    outcome = "ok"
+                    items, ai_provider = provider_items, label
+                    break
+                except ProviderUnavailable as skipped:
+                    outcome = "skipped"
+                    dispatch_log.info("%s", skipped)
+                except (asyncio.CancelledError, GeneratorExit):
+                    outcome = "cancelled"  # Client went away
+                    raise
+                except Exception as stream_error:
+                    dispatch_log.warning("%s stream error: %s", label, stream_error)
+                    if provider_items:
+                        yield _event({"type": "reset"})
+                finally:
+                    provider_requests_total.inc(provider.name, outcome)
+                    if outcome != "skipped":
+                        provider_request_seconds.observe(time.perf_counter() - call_started, provider.name)
+                    # Streams do not report usage: count the prompt and the text received locally
+                    if chunks and provider.name in PROVIDER_MODELS:
+                        input_tokens = (count_tokens(snapshot.system_prompt) + count_tokens(inventory_json)
+                                        + count_tokens(raw_text))
+                        record_usage(provider.name, PROVIDER_MODELS[provider.name], input_tokens,
+                                     count_tokens("".join(chunks)), estimated=True, recorder=stream_usage)
+
+            if ai_provider is None:
+                items = simple_parse(raw_text, snapshot)
+                ai_provider = "basic parsing (AI failed)" if providers else "basic parsing (no AI API key found)"
+                for item in items:
+                    yield _event({"type": "item", "item": item.model_dump()})
+            await cache_items(cache_key, items, ai_provider)
+
+        response = await finish_processing(raw_text, items, ai_provider, cache_hit=cached is not None,
+                                           started=started, usage=stream_usage)
+        yield _event({"type": "done", **response.model_dump()})
 
-Inventory List:
-{inventory_json}
+    except Exception as e:
+        yield _event({"type": "error", "detail": str(e)})
+
+def build_prompt(raw_text: str, inventory_json: str, system_prompt: str) -> Prompt:
+    """The provider prompt: system prompt, inventory, then the note (stable parts first for prompt caching)"""
+    return prompt_builder.build(raw_text, inventory_json, system_prompt)
+
+def record_call_usage(name: str, prompt: Prompt, response_text: str, input_tokens: Optional[int] = None,
+                      output_tokens: Optional[int] = None, cached_input_tokens: int = 0, cache_write_tokens: int = 0):
+    """Report a provider call's tokens; counted locally when the provider did not return them"""
+    estimated = input_tokens is None or output_tokens is None
+    record_usage(
+        name,
+        PROVIDER_MODELS[name],
+        prompt.input_tokens if input_tokens is None else input_tokens,
+        count_tokens(response_text) if output_tokens is None else output_tokens,
+        cached_input_tokens=cached_input_tokens or 0,
+        cache_write_tokens=cache_write_tokens or 0,
+        estimated=estimated,
+    )
 
-Agent Input:
-{raw_text}"""
+def cached_prompt_tokens(usage) -> int:
+    """Prompt tokens served from the provider's prefix cache (OpenAI style usage.prompt_tokens_details)"""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", 0) or 0
 
-    print(f"[Gemini] Prompt length: {len(full_prompt)} chars")
-    print(f"[Gemini] Sending request to Gemini API...")
+def quotation_items(response) -> List[QuotationItem]:
+    """Validated items from an AI answer (JSON text or decoded tool input), see structured_output"""
+    with metrics.span("json_extraction"):
+        raw_items, recovery = decode_response(response)
+    with metrics.span("item_validation"):
+        return [QuotationItem(**item) for item in validate_items(raw_items, recovery)]
 
-    response = model.generate_content(
-        full_prompt,
-        generation_config=genai.types.GenerationConfig(
+async def process_with_groq(raw_text: str, inventory_json: str, api_key: str, system_prompt: str) -> List[QuotationItem]:
+    """Process using Groq AI (FREE and FAST)"""
+    client = provider_clients.get("groq", api_key)
+    spec = PROVIDER_MODELS["groq"]
+
+    prompt = build_prompt(raw_text, inventory_json, system_prompt)
+    log_payload(provider_log, "Groq prompt", provider="groq", prompt=prompt.text)
+
+    async with provider_limits["groq"]:
+        response = await client.chat.completions.create(
+            model=spec.model,
+            messages=[
+                {"role": "user", "content": prompt.text}
+            ],
             temperature=0.2,
-            max_output_tokens=4096,
+            max_tokens=spec.max_output_tokens,
+            response_format={"type": "json_object"},  # JSON mode: the answer is a single JSON object
         )
-    )
 
     # Parse AI response
-    response_text = response.text.strip()
-    print(f"[Gemini] Response received!")
-    print(f"[Gemini] Response length: {len(response_text)} chars")
-    print(f"[Gemini] Response preview: {response_text[:500]}...")
-
-    # Extract JSON from response (in case there's markdown)
-    if "```json" in response_text:
-        response_text = response_text.split("```json")[1].split("```")[0].strip()
-    elif "```" in response_text:
-        response_text = response_text.split("```")[1].split("```")[0].strip()
-
-    print(f"[Gemini] Extracted JSON: {response_text[:300]}...")
-    parsed_response = json.loads(response_text)
-
-    # Handle both formats: direct array or object with "items" field
-    if isinstance(parsed_response, list):
-        items_data = parsed_response
-    elif isinstance(parsed_response, dict) and "items" in parsed_response:
-        items_data = parsed_response["items"]
-    else:
-        raise ValueError("Invalid response format from AI")
-
-    return [QuotationItem(**item) for item in items_data]
-
-async def process_with_claude(raw_text: str, inventory_json: str) -> List[QuotationItem]:
-    """Process using Claude AI"""
-    client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-
-    full_prompt = f"""{SYSTEM_PROMPT}
-
-Inventory List:
-{inventory_json}
+    response_text = response.choices[0].message.content
+    usage = response.usage
+    record_call_usage("groq", prompt, response_text, getattr(usage, "prompt_tokens", None),
+                      getattr(usage, "completion_tokens", None), cached_prompt_tokens(usage))
+    provider_log.debug("Groq response received",
+                       extra={"provider": "groq", "prompt_tokens": prompt.input_tokens, "response_chars": len(response_text)})
+    log_payload(provider_log, "Groq response", provider="groq", response=response_text)
 
-Agent Input:
-{raw_text}"""
+    return quotation_items(response_text)
 
-    message = client.messages.create(
-        model="claude-3-5-sonnet-20241022",
-        max_tokens=2048,
-        messages=[
-            {"role": "user", "content": full_prompt}
-        ]
-    )
+async def process_with_gemini(raw_text: str, inventory_json: str, api_key: str, system_prompt: str) -> List[QuotationItem]:
+    """Process using Google Gemini AI"""
+    model = provider_clients.get("gemini", api_key)
+    spec = PROVIDER_MODELS["gemini"]
+
+    prompt = build_prompt(raw_text, inventory_json, system_prompt)
+    log_payload(provider_log, "Gemini prompt", provider="gemini", model=model.model_name, prompt=prompt.text)
+
+    async with provider_limits["gemini"]:
+        response = await model.generate_content_async(
+            prompt.text,
+            generation_config=genai.types.GenerationConfig(
+                temperature=0.2,
+                max_output_tokens=spec.max_output_tokens,
+                response_mime_type="application/json",
+                response_schema=QUOTATION_SCHEMA,
+            )
+        )
 
     # Parse AI response
-    response_text = message.content[0].text
-
-    # Extract JSON from response (in case there's markdown)
-    if "```json" in response_text:
-        response_text = response_text.split("```json")[1].split("```")[0].strip()
-    elif "```" in response_text:
-        response_text = response_text.split("```")[1].split("```")[0].strip()
+    response_text = response.text
+    usage = getattr(response, "usage_metadata", None)
+    record_call_usage("gemini", prompt, response_text, getattr(usage, "prompt_token_count", None),
+                      getattr(usage, "candidates_token_count", None), getattr(usage, "cached_content_token_count", 0))
+    provider_log.debug("Gemini response received",
+                       extra={"provider": "gemini", "prompt_tokens": prompt.input_tokens, "response_chars": len(response_text)})
+    log_payload(provider_log, "Gemini response", provider="gemini", response=response_text)
 
-    parsed_response = json.loads(response_text)
+    return quotation_items(response_text)
 
-    # Handle both formats: direct array or object with "items" field
-    if isinstance(parsed_response, list):
-        items_data = parsed_response
-    elif isinstance(parsed_response, dict) and "items" in parsed_response:
-        items_data = parsed_response["items"]
-    else:
-        raise ValueError("Invalid response format from AI")
-
-    return [QuotationItem(**item) for item in items_data]
+async def process_with_claude(raw_text: str, inventory_json: str, api_key: str, system_prompt: str) -> List[QuotationItem]:
+    """Process using Claude AI"""
+    client = provider_clients.get("anthropic", api_key)
+    spec = PROVIDER_MODELS["anthropic"]
+    prompt = build_prompt(raw_text, inventory_json, system_prompt)
+
+    async with provider_limits["anthropic"]:
+        message = await client.messages.create(
+            model=spec.model,
+            max_tokens=spec.max_output_tokens,
+            # System prompt and (when reused) inventory are cache breakpoints; the note comes last
+            system=prompt.anthropic_system(),
+            messages=[
+                {"role": "user", "content": prompt.anthropic_content()}
+            ],
+            # The items come back as the input of a forced tool call, shaped by QUOTATION_SCHEMA
+            tools=[{"name": QUOTATION_TOOL_NAME, "description": QUOTATION_TOOL_DESCRIPTION, "input_schema": QUOTATION_SCHEMA}],
+            tool_choice={"type": "tool", "name": QUOTATION_TOOL_NAME},
+        )
 
-async def process_with_openai(raw_text: str, inventory_json: str) -> List[QuotationItem]:
+    tool_input = next((block.input for block in message.content if block.type == "tool_use"), None)
+    response_text = "".join(block.text for block in message.content if block.type == "text")
+    record_anthropic_usage(message, prompt, json.dumps(tool_input) if tool_input is not None else response_text)
+
+    if tool_input is not None:
+        return quotation_items(tool_input)
+    return quotation_items(response_text)
+
+def record_anthropic_usage(message, prompt: Prompt, response_text: str):
+    """Claude reports uncached, cache read and cache write input tokens separately"""
+    usage = getattr(message, "usage", None)
+    if usage is None:
+        record_call_usage("anthropic", prompt, response_text)
+        return
+    cache_read = getattr(usage, "cache_read_input_tokens", 0) or 0
+    cache_write = getattr(usage, "cache_creation_input_tokens", 0) or 0
+    record_call_usage("anthropic", prompt, response_text, usage.input_tokens + cache_read + cache_write,
+                      usage.output_tokens, cache_read, cache_write)
+
+async def process_with_openai(raw_text: str, inventory_json: str, api_key: str, system_prompt: str) -> List[QuotationItem]:
     """Process using OpenAI"""
-    # TODO: Implement OpenAI integration if needed
-    import openai
-
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-
-    full_prompt = f"""{SYSTEM_PROMPT}
-
-Inventory List:
-{inventory_json}
-
-Agent Input:
-{raw_text}"""
-
-    response = openai.ChatCompletion.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": "You are a CCTV quotation assistant."},
-            {"role": "user", "content": full_prompt}
-        ]
-    )
-
-    response_text = response.choices[0].message.content
-
-    # Extract JSON from response
-    if "```json" in response_text:
-        response_text = response_text.split("```json")[1].split("```")[0].strip()
-    elif "```" in response_text:
-        response_text = response_text.split("```")[1].split("```")[0].strip()
-
-    parsed_response = json.loads(response_text)
-
-    # Handle both formats: direct array or object with "items" field
-    if isinstance(parsed_response, list):
-        items_data = parsed_response
-    elif isinstance(parsed_response, dict) and "items" in parsed_response:
-        items_data = parsed_response["items"]
-    else:
-        raise ValueError("Invalid response format from AI")
-
-    return [QuotationItem(**item) for item in items_data]
-
-def simple_parse(raw_text: str) -> List[QuotationItem]:
-    """Simple parsing fallback when no AI API key is available"""
-    items = []
-    lines = raw_text.lower().split('\n')
-
-    for line in lines:
-        if not line.strip():
-            continue
-
-        # Parse patterns like "3 cctv low quality", "700mtr cable", etc.
-        import re
-        number_match = re.search(r'(\d+)\s*(?:x|pcs|piece|pieces|mtr|meter|meters)?', line)
-        quantity = int(number_match.group(1)) if number_match else 1
-
-        if 'cctv' in line or 'camera' in line:
-            if 'low' in line:
-                items.append(QuotationItem(description='CCTV Camera - Low Quality', quantity=quantity, rate=2500, amount=quantity * 2500))
-            elif 'medium' in line:
-                items.append(QuotationItem(description='CCTV Camera - Medium Quality', quantity=quantity, rate=3500, amount=quantity * 3500))
-            elif 'high' in line:
-                items.append(QuotationItem(description='CCTV Camera - High Quality', quantity=quantity, rate=5000, amount=quantity * 5000))
-            else:
-                items.append(QuotationItem(description='CCTV Camera - Medium Quality', quantity=quantity, rate=3500, amount=quantity * 3500))
-
-        if 'adaptor' in line:
-            items.append(QuotationItem(description='Adaptor', quantity=quantity, rate=300, amount=quantity * 300))
-
-        if 'cable' in line:
-            rate = 20 if 'coax' in line else 25
-            desc = 'Coaxial Cable' if 'coax' in line else 'Cat6 Cable'
-            items.append(QuotationItem(description=desc, quantity=quantity, rate=rate, amount=quantity * rate))
-
-        if 'nvr' in line or 'dvr' in line:
-            if '4' in line:
-                items.append(QuotationItem(description='4 Channel NVR', quantity=1, rate=8000, amount=8000))
-            elif '8' in line:
-                items.append(QuotationItem(description='8 Channel NVR', quantity=1, rate=12000, amount=12000))
-            elif '16' in line:
-                items.append(QuotationItem(description='16 Channel NVR', quantity=1, rate=18000, amount=18000))
-
-        if 'install' in line:
-            items.append(QuotationItem(description='Installation Basic', quantity=1, rate=5000, amount=5000))
+    client = provider_clients.get("openai", api_key)
+    spec = PROVIDER_MODELS["openai"]
+    prompt = build_prompt(raw_text, inventory_json, system_prompt)
+
+    async with provider_limits["openai"]:
+        response = await client.chat.completions.create(
+            model=spec.model,
+            max_tokens=spec.max_output_tokens,
+            messages=[
+                {"role": "system", "content": "You are a CCTV quotation assistant."},
+                {"role": "user", "content": prompt.text}
+            ],
+            # Forced function call: the arguments are JSON shaped by QUOTATION_SCHEMA
+            tools=[{"type": "function", "function": {
+                "name": QUOTATION_TOOL_NAME, "description": QUOTATION_TOOL_DESCRIPTION, "parameters": QUOTATION_SCHEMA}}],
+            tool_choice={"type": "function", "function": {"name": QUOTATION_TOOL_NAME}},
+        )
 
-    return items
+    message = response.choices[0].message
+    response_text = message.tool_calls[0].function.arguments if message.tool_calls else (message.content or "")
+    usage = response.usage
+    record_call_usage("openai", prompt, response_text, getattr(usage, "prompt_tokens", None),
+                      getattr(usage, "completion_tokens", None), cached_prompt_tokens(usage))
+    return quotation_items(response_text)
+
+async def stream_with_groq(raw_text: str, inventory_json: str, api_key: str, system_prompt: str) -> AsyncIterator[str]:
+    """Stream response text from Groq"""
+    client = provider_clients.get("groq", api_key)
+    spec = PROVIDER_MODELS["groq"]
+    async with provider_limits["groq"]:
+        stream = await client.chat.completions.create(
+            model=spec.model,
+            messages=[
+                {"role": "user", "content": build_prompt(raw_text, inventory_json, system_prompt).text}
+            ],
+            temperature=0.2,
+            max_tokens=spec.max_output_tokens,
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+async def stream_with_gemini(raw_text: str, inventory_json: str, api_key: str, system_prompt: str) -> AsyncIterator[str]:
+    """Stream response text from Google Gemini"""
+    model = provider_clients.get("gemini", api_key)
+    async with provider_limits["gemini"]:
+        response = await model.generate_content_async(
+            build_prompt(raw_text, inventory_json, system_prompt).text,
+            generation_config=genai.types.GenerationConfig(
+                temperature=0.2,
+                max_output_tokens=PROVIDER_MODELS["gemini"].max_output_tokens,
+            ),
+            stream=True,
+        )
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+async def stream_with_claude(raw_text: str, inventory_json: str, api_key: str, system_prompt: str) -> AsyncIterator[str]:
+    """Stream response text from Claude"""
+    client = provider_clients.get("anthropic", api_key)
+    spec = PROVIDER_MODELS["anthropic"]
+    prompt = build_prompt(raw_text, inventory_json, system_prompt)
+    async with provider_limits["anthropic"]:
+        async with client.messages.stream(
+            model=spec.model,
+            max_tokens=spec.max_output_tokens,
+            system=prompt.anthropic_system(),
+            messages=[
+                {"role": "user", "content": prompt.anthropic_content()}
+            ]
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+
+async def stream_with_openai(raw_text: str, inventory_json: str, api_key: str, system_prompt: str) -> AsyncIterator[str]:
+    """Stream response text from OpenAI"""
+    client = provider_clients.get("openai", api_key)
+    spec = PROVIDER_MODELS["openai"]
+    async with provider_limits["openai"]:
+        stream = await client.chat.completions.create(
+            model=spec.model,
+            max_tokens=spec.max_output_tokens,
+            messages=[
+                {"role": "system", "content": "You are a CCTV quotation assistant."},
+                {"role": "user", "content": build_prompt(raw_text, inventory_json, system_prompt).text}
+            ],
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+# AI providers; LLM_PROVIDERS picks the ones to use and their order
+provider_registry = ProviderRegistry(LLM_PROVIDERS)
+provider_registry.register(FunctionProvider("groq", "Groq AI (FREE)", "GROQ_API_KEY", process_with_groq, stream_with_groq))
+provider_registry.register(FunctionProvider("gemini", "Gemini AI", "GEMINI_API_KEY", process_with_gemini, stream_with_gemini))
+provider_registry.register(FunctionProvider("anthropic", "Claude AI", "ANTHROPIC_API_KEY", process_with_claude, stream_with_claude))
+provider_registry.register(FunctionProvider("openai", "OpenAI", "OPENAI_API_KEY", process_with_openai, stream_with_openai))
+provider_registry.register(MockProvider(MOCK_RESPONSES_FILE, quotation_items, latency=MOCK_LATENCY, jitter=MOCK_LATENCY_JITTER,
+                                        error_rate=MOCK_ERROR_RATE, seed=MOCK_SEED, limit=provider_limits["mock"],
+                                        spec=PROVIDER_MODELS["mock"]))
+
+def simple_parse(raw_text: str, snapshot: KnowledgeSnapshot) -> List[QuotationItem]:
+    """Offline fallback: parse the note against the inventory and let the rules engine fill in the rest"""
+    lines, _ = snapshot.parser.quote(raw_text)
+    return [QuotationItem(description=line.description, quantity=line.quantity, rate=line.rate, amount=line.amount)
+            for line in lines]
 
 if __name__ == "__main__":
     import uvicorn
@@ -8,9 +8,304 @@ from reportlab.pdfgen import canvas
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from datetime import datetime
+from types import MappingProxyType
 from typing import List, Dict, Optional
+import copy
 import io
 import os
+import threading
+import time
+
+from app_logging import get_logger
+
+logger = get_logger("pdf")
+
+
+# Font paths in order of preference (local font first)
+MALAYALAM_FONT_NAME = 'MalayalamFont'
+MALAYALAM_FONT_PATHS = [
+    "fonts/NotoSansMalayalam.ttf",  # Downloaded font in project
+    os.path.join(os.path.dirname(__file__), "fonts", "NotoSansMalayalam.ttf"),
+    "C:/Windows/Fonts/NotoSans-Regular.ttf",
+    "C:/Windows/Fonts/NotoSansMalayalam-Regular.ttf",
+    "C:/Windows/Fonts/seguiemj.ttf",  # Segoe UI Emoji (has some Unicode support)
+    "C:/Windows/Fonts/ArialUni.ttf",
+    "C:/Windows/Fonts/arial.ttf",
+]
+
+# Process-wide font registry: font name -> (font to use, file it was loaded from)
+_font_registry: Dict[str, tuple] = {}
+_font_registry_lock = threading.Lock()
+
+
+def register_font(font_name: str, font_paths: List[str], fallback: str = 'Helvetica') -> str:
+    """
+    Register the first loadable TTF from font_paths under font_name.
+
+    The font file is parsed only on the first call in each process; later calls
+    return the cached result. ReportLab embeds only the glyphs each document uses.
+
+    Returns:
+        The font name to use in styles (font_name, or fallback if nothing loaded)
+    """
+    resolved = _font_registry.get(font_name)
+    if resolved is not None:
+        return resolved[0]
+
+    with _font_registry_lock:
+        resolved = _font_registry.get(font_name)
+        if resolved is not None:
+            return resolved[0]
+
+        resolved = (fallback, None)
+        for font_path in font_paths:
+            if not os.path.exists(font_path):
+                continue
+            try:
+                pdfmetrics.registerFont(TTFont(font_name, font_path))
+                resolved = (font_name, font_path)
+                logger.info("Registered %s: %s", font_name, font_path)
+                break
+            except Exception as e:
+                logger.debug("Failed to register %s: %s", font_path, e)
+
+        if resolved[1] is None:
+            logger.warning("No font found for %s, using %s (text may show as boxes)", font_name, fallback)
+
+        _font_registry[font_name] = resolved
+        return resolved[0]
+
+
+def get_malayalam_font() -> str:
+    """Font name to use for Malayalam text (registered on first use)"""
+    return register_font(MALAYALAM_FONT_NAME, MALAYALAM_FONT_PATHS)
+
+
+def get_resolved_fonts() -> Dict[str, Optional[str]]:
+    """Registered fonts and the file each was loaded from (None means fallback font)"""
+    return {name: path for name, (_, path) in _font_registry.items()}
+
+
+class QuotationTemplate:
+    """
+    Request-independent parts of the quotation layout: paragraph styles,
+    table styles and the static info page.
+
+    Built once per process (see get_quotation_template) and read-only after
+    construction. Flowables are handed out as shallow copies because ReportLab
+    stores layout state on a flowable while wrapping it; the parsed paragraph
+    text is shared.
+    """
+
+    def __init__(self, malayalam_font: str):
+        base_styles = getSampleStyleSheet()
+        styles = {}
+
+        # Title style with red color
+        styles['RedTitle'] = ParagraphStyle(
+            'RedTitle',
+            parent=base_styles['Heading1'],
+            fontSize=18,
+            textColor=colors.red,
+            spaceAfter=20,
+            alignment=TA_LEFT,
+            fontName='Helvetica-Bold',
+            leftIndent=0
+        )
+
+        # Bullet point style
+        styles['BulletPoint'] = ParagraphStyle(
+            'BulletPoint',
+            parent=base_styles['Normal'],
+            fontSize=11,
+            textColor=colors.black,
+            spaceAfter=12,
+            alignment=TA_LEFT,
+            fontName='Helvetica',
+            leftIndent=20,
+            bulletIndent=0
+        )
+
+        # Point 6 style with Malayalam font support
+        styles['Point6'] = ParagraphStyle(
+            'Point6',
+            parent=base_styles['Normal'],
+            fontSize=10,
+            textColor=colors.black,  # Base color (overridden by font color tag)
+            spaceAfter=12,
+            alignment=TA_LEFT,
+            fontName=malayalam_font,
+            leftIndent=20
+        )
+
+        styles['QuotationTitle'] = ParagraphStyle(
+            'QuotationTitle',
+            parent=base_styles['Heading1'],
+            fontSize=24,
+            textColor=colors.black,
+            spaceAfter=30,
+            spaceBefore=10,
+            alignment=TA_CENTER,
+            fontName='Helvetica-Bold'
+        )
+
+        # Date validity warning style
+        styles['RedWarning'] = ParagraphStyle(
+            'RedWarning',
+            parent=base_styles['Normal'],
+            fontSize=10,
+            textColor=colors.red,
+            fontName='Helvetica',
+            alignment=TA_LEFT
+        )
+
+        styles['CustomerInfo'] = ParagraphStyle(
+            'CustomerInfo',
+            parent=base_styles['Normal'],
+            fontSize=11,
+            fontName='Helvetica-Bold',
+            spaceAfter=8
+        )
+
+        # Description column style (enables word wrapping)
+        styles['DescriptionStyle'] = ParagraphStyle(
+            'DescriptionStyle',
+            parent=base_styles['Normal'],
+            fontSize=10,
+            fontName='Helvetica',
+            alignment=TA_LEFT,
+            leading=12  # Line spacing
+        )
+
+        self.malayalam_font = malayalam_font
+        self.styles = MappingProxyType(styles)
+
+        self.date_table_style = TableStyle([
+            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+            ('FONTSIZE', (1, 0), (1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ])
+
+        # Items table styling - EXACT MATCH TO ORIGINAL
+        # (negative indices keep it independent of the number of rows)
+        self.item_table_style = TableStyle([
+            # Grid for all cells
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('BOX', (0, 0), (-1, -1), 1.5, colors.black),
+
+            # Header row - LIGHT GREY BACKGROUND
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#D0D0D0')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 11),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('TOPPADDING', (0, 0), (-1, 0), 12),
+
+            # Data rows alignment - EXACT AS ORIGINAL
+            ('ALIGN', (0, 1), (0, -1), 'CENTER'),     # Sl column - CENTER
+            ('ALIGN', (1, 1), (1, -1), 'LEFT'),       # Description - LEFT
+            ('ALIGN', (2, 1), (-1, -1), 'RIGHT'),     # Rate, Qty, Amount - RIGHT
+
+            # Vertical alignment for all data rows (keeps content at top when wrapped)
+            ('VALIGN', (0, 1), (-1, -1), 'TOP'),
+
+            # Data rows font
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), 10),
+            ('TOPPADDING', (0, 1), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+
+            # Total row - NO BACKGROUND, just bold text
+            ('FONTNAME', (-2, -1), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (-2, -1), (-1, -1), 12),
+            ('ALIGN', (-2, -1), (-2, -1), 'CENTER'),  # TOTAL text centered
+            ('ALIGN', (-1, -1), (-1, -1), 'RIGHT'),   # Amount right aligned
+        ])
+
+        self._info_page = tuple(self._build_info_page())
+        self._estimate_heading = (
+            Paragraph("ESTIMATE", styles['QuotationTitle']),
+            Spacer(1, 0.3*inch),
+        )
+        self._validity_note = Paragraph("Date valid only 5 days", styles['RedWarning'])
+
+    def _build_info_page(self) -> List:
+        """Build the flowables of the company information page"""
+        styles = self.styles
+        bullet_style = styles['BulletPoint']
+        elements = []
+
+        # Add title with bullet point
+        elements.append(Paragraph("• How is hdc cctv hub different from the others ?", styles['RedTitle']))
+        elements.append(Spacer(1, 0.3*inch))
+
+        # Information points
+        info_points = [
+            "1) First ai controlled self service office in kerala",
+            "2) Fast and proper service",
+            "3) 10 year + experienced technicians",
+            "4) Mainly deals with banking sector (federalbank,sib amc)",
+            "5) 24*7 customer support",
+        ]
+
+        for point in info_points:
+            elements.append(Paragraph(point, bullet_style))
+
+        # Point 6 with Malayalam text (special formatting) - RED COLOR
+        point6_text = """<font color="red">6) hdc ചെയ്ത വർക്കിൽ എചെങ്കില ും COMPLAINT വന്നാൽ പകരും കയാമറ അചെങ്കിൽ dvr ചവച്ച്തന്നതിന്ശേഷും മാത്തും COMPLAINT ആയ Materials സർവീസിന ചകാണ്ട ശപാക കയ ള്ളൂ . ( company SERVICE late ആവ ന്ന ണ്ട്, അത ചകാണ്ടാണ്hdc ഈ സർവീസ്ചകാട ക്ക ന്നത്, ഈസർവീസ്മചറാര കമ്പനിയ ും നൽക ന്നിെ)</font>"""
+
+        elements.append(Paragraph(point6_text, styles['Point6']))
+
+        # Remaining points
+        remaining_points = [
+            "7) deals with quality products",
+            "8) more details please visit our Instagram hdc_cctv_hub",
+            "9) 1 YEAR FREE SERVICE (ONLY FOR COMPLAINTS T&C APPLIED)"
+        ]
+
+        for point in remaining_points:
+            if "T&C APPLIED" in point:
+                # Special formatting for point 9
+                text = point.replace("(ONLY FOR COMPLAINTS T&C APPLIED)",
+                                    '<font color="red">(ONLY FOR COMPLAINTS T&C APPLIED)</font>')
+                elements.append(Paragraph(text, bullet_style))
+            else:
+                elements.append(Paragraph(point, bullet_style))
+
+        return elements
+
+    def info_page(self) -> List:
+        """Fresh copies of the info page flowables for one document"""
+        return [copy.copy(flowable) for flowable in self._info_page]
+
+    def estimate_heading(self) -> List:
+        """Fresh copies of the ESTIMATE title and the spacer below it"""
+        return [copy.copy(flowable) for flowable in self._estimate_heading]
+
+    def validity_note(self) -> Paragraph:
+        """Fresh copy of the red 'Date valid only 5 days' note"""
+        return copy.copy(self._validity_note)
+
+
+# Templates are keyed by the Malayalam font they were built with
+_templates: Dict[str, QuotationTemplate] = {}
+_templates_lock = threading.Lock()
+
+
+def get_quotation_template(malayalam_font: Optional[str] = None) -> QuotationTemplate:
+    """Shared QuotationTemplate for this process (built on first use)"""
+    font = malayalam_font or get_malayalam_font()
+    template = _templates.get(font)
+    if template is None:
+        with _templates_lock:
+            template = _templates.get(font)
+            if template is None:
+                template = QuotationTemplate(font)
+                _templates[font] = template
+    return template
 
 
 class HDCQuotationPDF:
@@ -24,42 +319,9 @@ class HDCQuotationPDF:
         self.email = "hdc3078@gmail.com"
         self.phone_number = "6235153938"
 
-        # Register Malayalam font if available
-        self._register_malayalam_font()
-
-    def _register_malayalam_font(self):
-        """Register a Unicode font that supports Malayalam characters"""
-        try:
-            # Font paths in order of preference (local font first)
-            font_paths = [
-                "fonts/NotoSansMalayalam.ttf",  # Downloaded font in project
-                os.path.join(os.path.dirname(__file__), "fonts", "NotoSansMalayalam.ttf"),
-                "C:/Windows/Fonts/NotoSans-Regular.ttf",
-                "C:/Windows/Fonts/NotoSansMalayalam-Regular.ttf",
-                "C:/Windows/Fonts/seguiemj.ttf",  # Segoe UI Emoji (has some Unicode support)
-                "C:/Windows/Fonts/ArialUni.ttf",
-                "C:/Windows/Fonts/arial.ttf",
-            ]
-
-            font_registered = False
-            for font_path in font_paths:
-                if os.path.exists(font_path):
-                    try:
-                        pdfmetrics.registerFont(TTFont('MalayalamFont', font_path))
-                        self.malayalam_font = 'MalayalamFont'
-                        font_registered = True
-                        print(f"[INFO] Registered Malayalam font: {font_path}")
-                        break
-                    except Exception as e:
-                        print(f"[DEBUG] Failed to register {font_path}: {str(e)}")
-                        continue
-
-            if not font_registered:
-                print("[WARNING] No Malayalam font found. Using Helvetica (Malayalam text will show as boxes)")
-                self.malayalam_font = 'Helvetica'
-        except Exception as e:
-            print(f"[ERROR] Error registering font: {str(e)}")
-            self.malayalam_font = 'Helvetica'
+        # Malayalam font and layout template are built once per process and shared by all instances
+        self.malayalam_font = get_malayalam_font()
+        self.template = get_quotation_template(self.malayalam_font)
 
     def draw_header(self, canvas, doc):
         """Draw the professional black header with company branding"""
@@ -120,96 +382,7 @@ class HDCQuotationPDF:
         
     def generate_info_page(self) -> List:
         """Generate the first page with company information"""
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Title style with red color
-        title_style = ParagraphStyle(
-            'RedTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            textColor=colors.red,
-            spaceAfter=20,
-            alignment=TA_LEFT,
-            fontName='Helvetica-Bold',
-            leftIndent=0
-        )
-        
-        # Bullet point style
-        bullet_style = ParagraphStyle(
-            'BulletPoint',
-            parent=styles['Normal'],
-            fontSize=11,
-            textColor=colors.black,
-            spaceAfter=12,
-            alignment=TA_LEFT,
-            fontName='Helvetica',
-            leftIndent=20,
-            bulletIndent=0
-        )
-        
-        # Malayalam text style
-        malayalam_style = ParagraphStyle(
-            'Malayalam',
-            parent=styles['Normal'],
-            fontSize=10,
-            textColor=colors.black,
-            spaceAfter=8,
-            alignment=TA_LEFT,
-            fontName='Helvetica',
-            leftIndent=40
-        )
-        
-        # Add title with bullet point
-        elements.append(Paragraph("• How is hdc cctv hub different from the others ?", title_style))
-        elements.append(Spacer(1, 0.3*inch))
-        
-        # Information points
-        info_points = [
-            "1) First ai controlled self service office in kerala",
-            "2) Fast and proper service",
-            "3) 10 year + experienced technicians",
-            "4) Mainly deals with banking sector (federalbank,sib amc)",
-            "5) 24*7 customer support",
-        ]
-        
-        for point in info_points:
-            elements.append(Paragraph(point, bullet_style))
-        
-        # Point 6 with Malayalam text (special formatting) - RED COLOR
-        point6_text = """<font color="red">6) hdc ചെയ്ത വർക്കിൽ എചെങ്കില ും COMPLAINT വന്നാൽ പകരും കയാമറ അചെങ്കിൽ dvr ചവച്ച്തന്നതിന്ശേഷും മാത്തും COMPLAINT ആയ Materials സർവീസിന ചകാണ്ട ശപാക കയ ള്ളൂ . ( company SERVICE late ആവ ന്ന ണ്ട്, അത ചകാണ്ടാണ്hdc ഈ സർവീസ്ചകാട ക്ക ന്നത്, ഈസർവീസ്മചറാര കമ്പനിയ ും നൽക ന്നിെ)</font>"""
-
-        # Create special style for point 6 with Malayalam font support
-        point6_style = ParagraphStyle(
-            'Point6',
-            parent=styles['Normal'],
-            fontSize=10,
-            textColor=colors.black,  # Base color (overridden by font color tag)
-            spaceAfter=12,
-            alignment=TA_LEFT,
-            fontName=self.malayalam_font,
-            leftIndent=20
-        )
-
-        elements.append(Paragraph(point6_text, point6_style))
-        
-        # Remaining points
-        remaining_points = [
-            "7) deals with quality products",
-            "8) more details please visit our Instagram hdc_cctv_hub",
-            "9) 1 YEAR FREE SERVICE (ONLY FOR COMPLAINTS T&C APPLIED)"
-        ]
-        
-        for point in remaining_points:
-            if "T&C APPLIED" in point:
-                # Special formatting for point 9
-                text = point.replace("(ONLY FOR COMPLAINTS T&C APPLIED)", 
-                                    '<font color="red">(ONLY FOR COMPLAINTS T&C APPLIED)</font>')
-                elements.append(Paragraph(text, bullet_style))
-            else:
-                elements.append(Paragraph(point, bullet_style))
-        
-        return elements
+        return self.template.info_page()
         
     def generate_quotation(self, 
                           items: List[Dict],
@@ -218,7 +391,8 @@ class HDCQuotationPDF:
                           quotation_date: Optional[str] = None,
                           reference_no: Optional[str] = None,
                           output_path: Optional[str] = None,
-                          include_info_page: bool = True) -> io.BytesIO:
+                          include_info_page: bool = True,
+                          timings: Optional[Dict[str, float]] = None) -> io.BytesIO:
         """
         Generate PDF quotation with items - matching exact original format
         
@@ -230,24 +404,10 @@ class HDCQuotationPDF:
             reference_no: Optional reference number (defaults to generated)
             output_path: Optional file path to save PDF
             include_info_page: Whether to include the information page
+            timings: Optional dict receiving the seconds spent building the
+                flowables ("flowables") and laying out the pages ("build")
         """
-        
-        # Create PDF buffer
-        if output_path:
-            pdf_buffer = output_path
-        else:
-            pdf_buffer = io.BytesIO()
-            
-        # Create document
-        doc = SimpleDocTemplate(
-            pdf_buffer,
-            pagesize=A4,
-            rightMargin=0.5*inch,
-            leftMargin=0.5*inch,
-            topMargin=1.5*inch,
-            bottomMargin=1*inch
-        )
-        
+        started = time.perf_counter()
         elements = []
         
         # Add info page if requested
@@ -255,66 +415,89 @@ class HDCQuotationPDF:
             elements.extend(self.generate_info_page())
             elements.append(PageBreak())
         
-        # Quotation page styles
-        styles = getSampleStyleSheet()
+        elements.extend(self.build_quotation_elements(
+            items, customer_name, customer_location, quotation_date, reference_no))
+        if timings is not None:
+            timings["flowables"] = time.perf_counter() - started
         
-        title_style = ParagraphStyle(
-            'QuotationTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            textColor=colors.black,
-            spaceAfter=30,
-            spaceBefore=10,
-            alignment=TA_CENTER,
-            fontName='Helvetica-Bold'
-        )
+        return self._build_document(elements, output_path, timings)
+
+    def generate_merged_quotation(self,
+                                  quotations: List[Dict],
+                                  output_path: Optional[str] = None,
+                                  include_info_page: bool = True,
+                                  timings: Optional[Dict[str, float]] = None) -> io.BytesIO:
+        """
+        Generate one PDF containing several quotations, each starting on a new page.
+
+        The information page is included once at the front.
+
+        Args:
+            quotations: List of dictionaries with the keyword arguments of
+                generate_quotation (items, customer_name, customer_location,
+                quotation_date, reference_no)
+            output_path: Optional file path to save PDF
+            include_info_page: Whether to include the information page
+            timings: Optional dict receiving stage timings (see generate_quotation)
+        """
+        started = time.perf_counter()
+        elements = []
+
+        if include_info_page:
+            elements.extend(self.generate_info_page())
+
+        for quotation in quotations:
+            if elements:
+                elements.append(PageBreak())
+            elements.extend(self.build_quotation_elements(
+                quotation['items'],
+                quotation.get('customer_name'),
+                quotation.get('customer_location'),
+                quotation.get('quotation_date'),
+                quotation.get('reference_no'),
+            ))
+        if timings is not None:
+            timings["flowables"] = time.perf_counter() - started
+
+        return self._build_document(elements, output_path, timings)
+
+    def build_quotation_elements(self,
+                                 items: List[Dict],
+                                 customer_name: Optional[str] = None,
+                                 customer_location: Optional[str] = None,
+                                 quotation_date: Optional[str] = None,
+                                 reference_no: Optional[str] = None) -> List:
+        """Flowables of one ESTIMATE section (title, date/ref, customer and items table)"""
+        elements = []
+        
+        # Styles, table styles and static flowables come from the shared template;
+        # only the date/ref, customer fields and item rows are built per request
+        template = self.template
+        styles = template.styles
         
         # Add ESTIMATE title
-        elements.append(Paragraph("ESTIMATE", title_style))
-        elements.append(Spacer(1, 0.3*inch))
+        elements.extend(template.estimate_heading())
         
         # Date and reference section
         date_str = quotation_date or datetime.now().strftime('%d/%m/%Y')
         ref_str = reference_no or datetime.now().strftime('%M%S')
         
-        # Create date validity warning style
-        red_warning_style = ParagraphStyle(
-            'RedWarning',
-            parent=styles['Normal'],
-            fontSize=10,
-            textColor=colors.red,
-            fontName='Helvetica',
-            alignment=TA_LEFT
-        )
-        
         # Date and reference table - EXACT FORMAT from original
         date_ref_data = [
-            [Paragraph("Date valid only 5 days", red_warning_style), 
+            [template.validity_note(), 
              f"DATE :{date_str}"],
             ["", f"REF  : {ref_str}"]
         ]
         
         date_table = Table(date_ref_data, colWidths=[3.5*inch, 3*inch])
-        date_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-            ('FONTSIZE', (1, 0), (1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ]))
+        date_table.setStyle(template.date_table_style)
         
         elements.append(date_table)
         elements.append(Spacer(1, 0.3*inch))
         
         # Customer details if provided
         if customer_name or customer_location:
-            customer_style = ParagraphStyle(
-                'CustomerInfo',
-                parent=styles['Normal'],
-                fontSize=11,
-                fontName='Helvetica-Bold',
-                spaceAfter=8
-            )
+            customer_style = styles['CustomerInfo']
             if customer_name:
                 elements.append(Paragraph(f"Customer: {customer_name}", customer_style))
             if customer_location:
@@ -324,15 +507,8 @@ class HDCQuotationPDF:
         # Create items table - EXACT FORMAT
         table_data = [['Sl', 'DESCRIPTION', 'RATE', 'QTY', 'AMOUNT']]
 
-        # Create paragraph style for description column (enables word wrapping)
-        desc_style = ParagraphStyle(
-            'DescriptionStyle',
-            parent=styles['Normal'],
-            fontSize=10,
-            fontName='Helvetica',
-            alignment=TA_LEFT,
-            leading=12  # Line spacing
-        )
+        # Paragraph style for description column (enables word wrapping)
+        desc_style = styles['DescriptionStyle']
 
         total = 0
         for idx, item in enumerate(items, 1):
@@ -373,50 +549,37 @@ class HDCQuotationPDF:
         
         # Create table
         item_table = Table(table_data, colWidths=col_widths, repeatRows=1)
+        item_table.setStyle(template.item_table_style)
+        elements.append(item_table)
         
-        # Apply table styling - EXACT MATCH TO ORIGINAL
-        table_style = TableStyle([
-            # Grid for all cells
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BOX', (0, 0), (-1, -1), 1.5, colors.black),
-
-            # Header row - LIGHT GREY BACKGROUND
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#D0D0D0')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('TOPPADDING', (0, 0), (-1, 0), 12),
-
-            # Data rows alignment - EXACT AS ORIGINAL
-            ('ALIGN', (0, 1), (0, -1), 'CENTER'),     # Sl column - CENTER
-            ('ALIGN', (1, 1), (1, -1), 'LEFT'),       # Description - LEFT
-            ('ALIGN', (2, 1), (-1, -1), 'RIGHT'),     # Rate, Qty, Amount - RIGHT
-
-            # Vertical alignment for all data rows (keeps content at top when wrapped)
-            ('VALIGN', (0, 1), (-1, -1), 'TOP'),
-
-            # Data rows font
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 10),
-            ('TOPPADDING', (0, 1), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+        return elements
 
-            # Total row - NO BACKGROUND, just bold text
-            ('FONTNAME', (-2, -1), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (-2, -1), (-1, -1), 12),
-            ('ALIGN', (-2, -1), (-2, -1), 'CENTER'),  # TOTAL text centered
-            ('ALIGN', (-1, -1), (-1, -1), 'RIGHT'),   # Amount right aligned
-        ])
-        
-        item_table.setStyle(table_style)
-        elements.append(item_table)
+    def _build_document(self, elements: List, output_path: Optional[str] = None,
+                        timings: Optional[Dict[str, float]] = None) -> io.BytesIO:
+        """Lay out the flowables on A4 pages with the HDC header and footer"""
+        # Create PDF buffer
+        if output_path:
+            pdf_buffer = output_path
+        else:
+            pdf_buffer = io.BytesIO()
+            
+        # Create document
+        doc = SimpleDocTemplate(
+            pdf_buffer,
+            pagesize=A4,
+            rightMargin=0.5*inch,
+            leftMargin=0.5*inch,
+            topMargin=1.5*inch,
+            bottomMargin=1*inch
+        )
         
         # Build PDF
+        started = time.perf_counter()
         doc.build(elements, 
                  onFirstPage=self.draw_header_footer,
                  onLaterPages=self.draw_header_footer)
+        if timings is not None:
+            timings["build"] = time.perf_counter() - started
         
         if output_path:
             return output_path
@@ -557,8 +720,18 @@ def create_hdc_quotation(items, **kwargs):
     Returns:
         BytesIO object or file path
     """
-    pdf_gen = HDCQuotationPDF()
-    return pdf_gen.generate_quotation(items, **kwargs)
+    return _default_generator().generate_quotation(items, **kwargs)
+
+
+_shared_generator: Optional[HDCQuotationPDF] = None
+
+
+def _default_generator() -> HDCQuotationPDF:
+    """Generator shared by create_hdc_quotation calls"""
+    global _shared_generator
+    if _shared_generator is None:
+        _shared_generator = HDCQuotationPDF()
+    return _shared_generator
 
 
 if __name__ == "__main__":
@@ -0,0 +1,194 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from metrics import metrics, size_bucket
+from app_logging import get_logger
+
+logger = get_logger("pdf")
+
+# Pool settings (override via environment variables)
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 2)))
+PDF_QUEUE_DEPTH = int(os.getenv("PDF_QUEUE_DEPTH", "32"))
+PDF_JOB_TIMEOUT = float(os.getenv("PDF_JOB_TIMEOUT", "30"))
+
+
+pdf_render_seconds = metrics.histogram(
+    "pdf_render_duration_seconds", "PDF render time including queueing, by item count", ["items"])
+pdf_stage_seconds = metrics.histogram(
+    "pdf_stage_duration_seconds", "PDF flowable construction and page layout time, by item count", ["stage", "items"])
+pdf_busy_total = metrics.counter("pdf_rejected_total", "PDF renders rejected because the queue was full")
+
+
+class PDFPoolBusy(Exception):
+    """Raised when the render queue is full"""
+
+
+# Generator owned by the current worker process (created once by _init_worker)
+_worker_pdf_gen = None
+
+
+def _init_worker():
+    """Warm up a worker: register fonts and build the generator once per process"""
+    global _worker_pdf_gen
+    from pdf_generator import HDCQuotationPDF
+    _worker_pdf_gen = HDCQuotationPDF()
+
+
+def _worker_fonts() -> Dict[str, Optional[str]]:
+    """Fonts a warm worker resolved (see get_resolved_fonts); also used to force workers to start"""
+    from pdf_generator import get_resolved_fonts
+    return get_resolved_fonts()
+
+
+def _terminate_after(processes: List, grace: float):
+    """Stop the workers of a retired pool that are still busy after grace seconds (a stuck render)"""
+    deadline = time.monotonic() + grace
+    for process in processes:
+        process.join(max(0.0, deadline - time.monotonic()))
+        if process.is_alive():
+            process.terminate()
+
+
+def _render(items: List[Dict], options: Dict) -> Tuple[bytes, Dict[str, float]]:
+    """Render a quotation inside a worker process; returns the PDF bytes and stage timings"""
+    if _worker_pdf_gen is None:
+        _init_worker()
+    timings: Dict[str, float] = {}
+    pdf_buffer = _worker_pdf_gen.generate_quotation(items, timings=timings, **options)
+    return pdf_buffer.getvalue(), timings
+
+
+def _render_merged(quotations: List[Dict], options: Dict) -> Tuple[bytes, Dict[str, float]]:
+    """Render several quotations into one PDF inside a worker process"""
+    if _worker_pdf_gen is None:
+        _init_worker()
+    timings: Dict[str, float] = {}
+    pdf_buffer = _worker_pdf_gen.generate_merged_quotation(quotations, timings=timings, **options)
+    return pdf_buffer.getvalue(), timings
+
+
+class PDFRenderPool:
+    """Pool of pre-initialized worker processes that render quotation PDFs"""
+
+    def __init__(self, workers: int = PDF_WORKERS, queue_depth: int = PDF_QUEUE_DEPTH,
+                 job_timeout: float = PDF_JOB_TIMEOUT):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.job_timeout = job_timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._replace_lock = threading.Lock()
+        self.fonts: Dict[str, Optional[str]] = {}  # Font name -> file the workers loaded it from (None: fallback)
+
+    def start(self):
+        """Start worker processes and wait until each one is warm"""
+        if self._executor is not None:
+            return
+        if self.workers <= 0:
+            _init_worker()  # Renders run in threads of this process
+            self.fonts = _worker_fonts()
+            return
+        self._executor = self._new_executor()
+        logger.info("Render pool started with %d workers", self.workers, extra={"fonts": self.fonts})
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        # Submitting one job per worker spawns every process up front,
+        # so the first real request does not pay font/style setup
+        for future in [executor.submit(_worker_fonts) for _ in range(self.workers)]:
+            self.fonts = future.result()
+        return executor
+
+    def _replace(self, old: ProcessPoolExecutor):
+        """
+        Swap in a fresh, warm pool for `old` (blocking: run it off the event
+        loop). Jobs already running on the old pool finish there; workers
+        still busy job_timeout later are stuck and get terminated.
+        """
+        with self._replace_lock:
+            if self._executor is not old:
+                return  # Another failed job already replaced it
+            self._executor = self._new_executor()
+        # No public API stops a busy worker before Python 3.14 (terminate_workers)
+        processes = list((getattr(old, "_processes", None) or {}).values())
+        old.shutdown(wait=False)
+        threading.Thread(target=_terminate_after, args=(processes, self.job_timeout), daemon=True).start()
+        logger.warning("Render pool replaced")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def pending(self) -> int:
+        """Jobs currently queued or rendering, plus queue slots reserved for batches"""
+        return self._pending
+
+    def reserve(self, jobs: int):
+        """
+        Hold queue slots for up to `jobs` concurrent renders (made with
+        reserved=True) so a batch cannot be turned away halfway through.
+        Raises PDFPoolBusy when the queue has no room; pair with release().
+        """
+        if self._pending + jobs > self.queue_depth:
+            pdf_busy_total.inc()
+            raise PDFPoolBusy(f"PDF render queue is full ({self.queue_depth} jobs)")
+        self._pending += jobs
+
+    def release(self, jobs: int):
+        self._pending -= jobs
+
+    async def render(self, items: List[Dict], *, reserved: bool = False, **options) -> bytes:
+        """Render a quotation PDF off the event loop and return its bytes
+
+        Raises PDFPoolBusy when the queue is full (unless the job uses a slot
+        held with reserve()) and asyncio.TimeoutError when a job takes longer
+        than job_timeout.
+        """
+        return await self._run(_render, len(items), items, options, reserved=reserved)
+
+    async def render_merged(self, quotations: List[Dict], **options) -> bytes:
+        """Render several quotations into one PDF (see HDCQuotationPDF.generate_merged_quotation)"""
+        item_count = sum(len(quotation['items']) for quotation in quotations)
+        return await self._run(_render_merged, item_count, quotations, options)
+
+    async def _run(self, job_function, item_count: int, *args, reserved: bool = False) -> bytes:
+        if not reserved:
+            self.reserve(1)
+        started = time.perf_counter()
+        executor = self._executor
+        try:
+            if executor is None:
+                # No process pool configured (PDF_WORKERS=0): render in a thread
+                job = asyncio.to_thread(job_function, *args)
+            else:
+                loop = asyncio.get_running_loop()
+                job = loop.run_in_executor(executor, job_function, *args)
+            pdf_bytes, timings = await asyncio.wait_for(job, timeout=self.job_timeout)
+            items = size_bucket(item_count)
+            pdf_render_seconds.observe(time.perf_counter() - started, items)
+            for stage, seconds in timings.items():
+                pdf_stage_seconds.observe(seconds, stage, items)
+            return pdf_bytes
+        except BrokenProcessPool:
+            # A worker died (e.g. killed by the OS); replace the pool for later jobs
+            await asyncio.to_thread(self._replace, executor)
+            raise
+        except asyncio.TimeoutError:
+            # The render is still running and holds a worker: move later jobs to a fresh pool
+            if executor is not None:
+                await asyncio.to_thread(self._replace, executor)
+            raise
+        finally:
+            if not reserved:
+                self.release(1)
+
+
+# Shared pool used by the API
+pdf_pool = PDFRenderPool()
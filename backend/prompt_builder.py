@@ -0,0 +1,270 @@
+import math
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+from inventory_index import COMPACT_INVENTORY_LEGEND
+from metrics import metrics
+from app_logging import get_logger
+
+try:
+    # cl100k counts (in requirements.txt); without it, or offline before its vocabulary is
+    # cached, count_tokens() falls back to an estimate. Either way the counts are approximate
+    # for providers with their own tokenizers; reported usage replaces them when available.
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = get_logger("prompt")
+
+TOKENIZER_ENCODING = "cl100k_base"
+
+# Words, digit runs and punctuation runs; digits tokenize in groups of up to 3
+_PIECE_PATTERN = re.compile(r'[A-Za-z]+|\d+|[^\sA-Za-z\d]+')
+
+# Anthropic prompt cache breakpoint: everything up to and including the marked block is cached
+CACHE_BREAKPOINT = {"type": "ephemeral"}
+
+llm_tokens_total = metrics.counter(
+    "llm_tokens_total", "AI tokens used, by kind (input, cached_input, cache_write, output)", ["provider", "kind"])
+llm_cost_total = metrics.counter("llm_cost_usd_total", "Estimated AI cost in USD (list prices)", ["provider"])
+
+_encoding = None  # Set by load_tokenizer(); count_tokens() never loads it itself
+_encoding_lock = threading.Lock()
+
+
+def load_tokenizer() -> bool:
+    """
+    Load the tiktoken encoding, which downloads its vocabulary on first use:
+    call it once at startup, off the event loop. Returns False when tiktoken
+    is missing or the vocabulary cannot be loaded (offline); token counts
+    are then estimated.
+    """
+    global _encoding, tiktoken
+    with _encoding_lock:
+        if _encoding is None and tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+            except Exception as e:
+                logger.warning("tiktoken unavailable, estimating token counts: %s", e)
+                tiktoken = None
+            else:
+                count_tokens.cache_clear()  # Drop the estimates made while loading
+    return _encoding is not None
+
+
+@lru_cache(maxsize=256)
+def count_tokens(text: str) -> int:
+    """
+    Tokens in text. Once load_tokenizer() has loaded tiktoken this is the
+    cl100k count (close to, not exactly, every provider's own tokenizer);
+    before that, or without it, an estimate from word, number and
+    punctuation runs that errs on the high side.
+    """
+    encoding = _encoding
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    tokens = 0
+    for piece in _PIECE_PATTERN.findall(text):
+        if piece[0].isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        elif piece.isascii() and piece[0].isalpha():
+            tokens += 1 + (len(piece) - 1) // 6
+        elif piece.isascii():
+            tokens += math.ceil(len(piece) / 2)
+        else:
+            tokens += len(piece)  # Non-Latin script: about one token per character
+    return tokens
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """A provider's model, its limits and list prices (USD per million tokens)"""
+    model: str
+    context_window: int
+    max_output_tokens: int
+    input_price: float = 0.0
+    output_price: float = 0.0
+    cached_input_price: Optional[float] = None  # Prompt cache reads (input_price if there is no discount)
+    cache_write_price: Optional[float] = None  # Prompt cache writes (input_price if they cost nothing extra)
+
+    @property
+    def input_budget(self) -> int:
+        """Prompt tokens that fit next to max_output_tokens in the context window"""
+        return self.context_window - self.max_output_tokens
+
+    def cost(self, input_tokens: int, output_tokens: int, cached_input_tokens: int = 0,
+             cache_write_tokens: int = 0) -> float:
+        """Estimated USD cost of a call; input_tokens includes the cached and cache-write tokens"""
+        uncached = max(0, input_tokens - cached_input_tokens - cache_write_tokens)
+        cached_price = self.input_price if self.cached_input_price is None else self.cached_input_price
+        write_price = self.input_price if self.cache_write_price is None else self.cache_write_price
+        return (uncached * self.input_price + cached_input_tokens * cached_price
+                + cache_write_tokens * write_price + output_tokens * self.output_price) / 1_000_000
+
+
+@dataclass(frozen=True)
+class Prompt:
+    """
+    A quotation prompt split into its parts, most stable first: the system
+    prompt (same for every request), the inventory (same for the notes of a
+    batch, or for every note with INVENTORY_PREFILTER=0) and the note. Providers
+    with prefix caching (OpenAI, Groq, Gemini) reuse the cached prefix as is;
+    for Claude, anthropic_system() / anthropic_content() mark the breakpoints.
+    """
+    system_prompt: str
+    inventory: str
+    note: str
+    cache_inventory: bool = False  # The same inventory was sent recently, so caching it pays off
+
+    @property
+    def text(self) -> str:
+        return f"{self.system_prompt}\n\n{self.inventory}\n\n{self.note}"
+
+    @property
+    def input_tokens(self) -> int:
+        return count_tokens(self.system_prompt) + count_tokens(self.inventory) + count_tokens(self.note)
+
+    def anthropic_system(self) -> List[Dict]:
+        return [{"type": "text", "text": self.system_prompt, "cache_control": CACHE_BREAKPOINT}]
+
+    def anthropic_content(self) -> List[Dict]:
+        inventory = {"type": "text", "text": self.inventory}
+        if self.cache_inventory:
+            inventory["cache_control"] = CACHE_BREAKPOINT
+        return [inventory, {"type": "text", "text": self.note}]
+
+
+class PromptBuilder:
+    """
+    Builds the provider prompts. Remembers the last few inventories it put
+    in a prompt: an inventory seen before gets a cache breakpoint (a cache
+    write costs more than a plain input token, so a one-off inventory is not
+    marked).
+    """
+
+    def __init__(self, recent_inventories: int = 64):
+        self.recent_inventories = recent_inventories
+        self._recent: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def build(self, raw_text: str, inventory_json: str, system_prompt: str) -> Prompt:
+        with self._lock:
+            seen = inventory_json in self._recent
+            self._recent[inventory_json] = None
+            self._recent.move_to_end(inventory_json)
+            while len(self._recent) > self.recent_inventories:
+                self._recent.popitem(last=False)
+        return Prompt(
+            system_prompt=system_prompt,
+            inventory=f"Inventory List ({COMPACT_INVENTORY_LEGEND}):\n{inventory_json}",
+            note=f"Agent Input:\n{raw_text}",
+            cache_inventory=seen,
+        )
+
+
+def fit_inventory(ranked_items: Sequence, budget: int, render: Callable[[Sequence], str],
+                  category: Callable[[object], str] = lambda item: item.category) -> List:
+    """
+    The items of ranked_items (best first) that fit in budget tokens once
+    rendered: first the best item of every category, so the model still sees
+    an option for each kind of item, then the rest by rank. At least one item
+    is kept.
+    """
+    costs = [count_tokens(render([item])) for item in ranked_items]
+    seen_categories = set()
+    first, rest = [], []
+    for position, item in enumerate(ranked_items):
+        (rest if category(item) in seen_categories else first).append(position)
+        seen_categories.add(category(item))
+
+    kept, used = set(), 0
+    for position in first + rest:
+        if used + costs[position] <= budget or not kept:
+            kept.add(position)
+            used += costs[position]
+    return [item for position, item in enumerate(ranked_items) if position in kept]
+
+
+@dataclass
+class CallUsage:
+    """Tokens and estimated cost of one provider call"""
+    provider: str
+    model: str
+    input_tokens: int
+    output_tokens: int
+    cached_input_tokens: int = 0
+    cache_write_tokens: int = 0
+    cost_usd: float = 0.0
+    estimated: bool = False  # Counted locally because the provider did not report usage
+
+
+class UsageRecorder:
+    """The provider calls made for one request (every attempt, including failed and hedged ones)"""
+
+    def __init__(self):
+        self.calls: List[CallUsage] = []
+        self._lock = threading.Lock()
+
+    def add(self, call: CallUsage):
+        with self._lock:
+            self.calls.append(call)
+
+    def summary(self) -> Optional[Dict]:
+        """Totals and per-call usage, or None if no provider was called"""
+        if not self.calls:
+            return None
+        return {
+            "input_tokens": sum(call.input_tokens for call in self.calls),
+            "output_tokens": sum(call.output_tokens for call in self.calls),
+            "cached_input_tokens": sum(call.cached_input_tokens for call in self.calls),
+            "estimated_cost_usd": round(sum(call.cost_usd for call in self.calls), 6),
+            "calls": [asdict(call) for call in self.calls],
+        }
+
+
+_current_usage: ContextVar[Optional[UsageRecorder]] = ContextVar("current_usage", default=None)
+
+
+@contextmanager
+def recording_usage() -> Iterator[UsageRecorder]:
+    """Collect the usage record_usage() reports in this block (and the tasks it starts)"""
+    recorder = UsageRecorder()
+    token = _current_usage.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current_usage.reset(token)
+
+
+def record_usage(provider: str, spec: ModelSpec, input_tokens: int, output_tokens: int,
+                 cached_input_tokens: int = 0, cache_write_tokens: int = 0, estimated: bool = False,
+                 recorder: Optional[UsageRecorder] = None) -> CallUsage:
+    """Count a provider call in the metrics and in the request's recorder (the current one unless given)"""
+    call = CallUsage(
+        provider=provider,
+        model=spec.model,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cached_input_tokens=cached_input_tokens,
+        cache_write_tokens=cache_write_tokens,
+        cost_usd=round(spec.cost(input_tokens, output_tokens, cached_input_tokens, cache_write_tokens), 6),
+        estimated=estimated,
+    )
+    llm_tokens_total.inc(provider, "input", amount=input_tokens)
+    llm_tokens_total.inc(provider, "output", amount=output_tokens)
+    if cached_input_tokens:
+        llm_tokens_total.inc(provider, "cached_input", amount=cached_input_tokens)
+    if cache_write_tokens:
+        llm_tokens_total.inc(provider, "cache_write", amount=cache_write_tokens)
+    llm_cost_total.inc(provider, amount=call.cost_usd)
+
+    recorder = recorder or _current_usage.get()
+    if recorder is not None:
+        recorder.add(call)
+    return call
@@ -0,0 +1,83 @@
+import importlib.util
+from types import ModuleType
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app_logging import get_logger
+
+logger = get_logger("providers")
+
+# HTTP/2 needs the optional h2 package (pip install httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+ClientFactory = Callable[[str, Any], Any]  # (API key, pooled HTTP client or None) -> SDK client
+
+
+class ProviderClients:
+    """
+    AI provider SDK clients, created once and reused for every request.
+
+    Each provider registers a factory building its client from an API key
+    and, for httpx based SDKs, the SDK module: the provider then gets its own
+    keep-alive connection pool (pool_sizes, timeouts), built with the SDK's
+    DefaultAsyncHttpxClient since SDKs ship different httpx versions. get()
+    returns the existing client and only calls the factory again when the
+    key changed; the new client keeps the pool. Connections and TLS
+    sessions are reused across requests, and a slow provider cannot use up
+    another's connections.
+    """
+
+    def __init__(self, pool_sizes: Dict[str, int], timeouts: Dict[str, float], connect_timeout: float = 5.0,
+                 keepalive_expiry: float = 60.0, http2: bool = True):
+        self.pool_sizes = pool_sizes
+        self.timeouts = timeouts
+        self.connect_timeout = connect_timeout
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self._factories: Dict[str, Tuple[ClientFactory, Optional[ModuleType]]] = {}
+        self._clients: Dict[str, Tuple[str, Any]] = {}  # Provider -> (API key, client)
+        self._http_clients: Dict[str, Any] = {}
+
+    def register(self, name: str, factory: ClientFactory, sdk: Optional[ModuleType] = None):
+        """sdk: the provider's SDK module when it takes an httpx http_client (anthropic, groq, openai)"""
+        self._factories[name] = (factory, sdk)
+
+    def http_client(self, name: str) -> Any:
+        """The provider's pooled HTTP client (shared by every SDK client built for it)"""
+        client = self._http_clients.get(name)
+        if client is None:
+            _, sdk = self._factories[name]
+            pool_size = self.pool_sizes.get(name, 10)
+            limits = type(sdk.DEFAULT_CONNECTION_LIMITS)  # httpx.Limits of the SDK's httpx
+            client = sdk.DefaultAsyncHttpxClient(
+                http2=self.http2,
+                limits=limits(max_connections=pool_size, max_keepalive_connections=pool_size,
+                              keepalive_expiry=self.keepalive_expiry),
+                timeout=sdk.Timeout(self.timeouts.get(name, 60.0), connect=self.connect_timeout),
+            )
+            self._http_clients[name] = client
+        return client
+
+    def get(self, name: str, api_key: str) -> Any:
+        """The provider's client for api_key, built on first use or when the key changed"""
+        current = self._clients.get(name)
+        if current is not None and current[0] == api_key:
+            return current[1]
+        factory, sdk = self._factories[name]
+        client = factory(api_key, self.http_client(name) if sdk is not None else None)
+        # The old client is not closed: it shares the provider's connection pool
+        self._clients[name] = (api_key, client)
+        if current is not None:
+            logger.info("%s API key changed, client rebuilt", name)
+        return client
+
+    def warm_up(self, api_keys: Dict[str, Optional[str]]):
+        """Build the clients of the providers that have a key (at startup)"""
+        for name, api_key in api_keys.items():
+            if api_key and name in self._factories:
+                self.get(name, api_key)
+
+    async def aclose(self):
+        for client in self._http_clients.values():
+            await client.aclose()
+        self._http_clients.clear()
+        self._clients.clear()
@@ -0,0 +1,215 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from contextlib import nullcontext
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from prompt_builder import ModelSpec, count_tokens, record_usage
+
+ProcessFunction = Callable[[str, str, str, str], Awaitable[Any]]  # (raw text, inventory, API key, system prompt)
+StreamFunction = Callable[[str, str, str, str], AsyncIterator[str]]
+
+
+class Provider(ABC):
+    """
+    One AI backend. process() returns the quotation items for a note and
+    stream() yields the answer text as it is generated (when
+    supports_streaming). api_key_env names the environment variable holding
+    the key; a provider without one is always available. Subclasses must
+    implement both methods (stream() may raise NotImplementedError when
+    supports_streaming is False).
+    """
+
+    name = ""
+    label = ""  # Shown to users and stored with the quotation
+    api_key_env: Optional[str] = None
+    supports_streaming = False
+
+    def api_key(self) -> Optional[str]:
+        """The key to call the provider with, or None if it is not configured"""
+        if self.api_key_env is None:
+            return ""
+        return os.getenv(self.api_key_env) or None
+
+    @abstractmethod
+    async def process(self, raw_text: str, inventory_json: str, api_key: str, system_prompt: str) -> Any:
+        ...
+
+    @abstractmethod
+    def stream(self, raw_text: str, inventory_json: str, api_key: str, system_prompt: str) -> AsyncIterator[str]:
+        ...
+
+
+class FunctionProvider(Provider):
+    """A provider implemented by a process function and an optional stream function"""
+
+    def __init__(self, name: str, label: str, api_key_env: Optional[str], process: ProcessFunction,
+                 stream: Optional[StreamFunction] = None):
+        self.name = name
+        self.label = label
+        self.api_key_env = api_key_env
+        self._process = process
+        self._stream = stream
+        self.supports_streaming = stream is not None
+
+    async def process(self, raw_text: str, inventory_json: str, api_key: str, system_prompt: str) -> Any:
+        return await self._process(raw_text, inventory_json, api_key, system_prompt)
+
+    def stream(self, raw_text: str, inventory_json: str, api_key: str, system_prompt: str) -> AsyncIterator[str]:
+        if self._stream is None:
+            raise NotImplementedError(f"{self.name} does not stream")
+        return self._stream(raw_text, inventory_json, api_key, system_prompt)
+
+
+class MockProviderError(Exception):
+    """Simulated provider failure (worded as a rate limit so circuit breakers react to it)"""
+
+
+def normalize_note(raw_text: str) -> str:
+    return " ".join(raw_text.lower().split())
+
+
+def load_recorded_responses(path: str) -> Tuple[Dict[str, str], List[str]]:
+    """
+    Recorded answers from a JSONL file of {"raw_text": ..., "response": ...}
+    lines: (answer by normalized note, all answers in file order). A
+    response may be the answer text or its decoded JSON.
+    """
+    by_note: Dict[str, str] = {}
+    responses: List[str] = []
+    if not path or not os.path.exists(path):
+        return by_note, responses
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            response = record.get("response")
+            if not isinstance(response, str):
+                response = json.dumps(response)
+            responses.append(response)
+            if record.get("raw_text"):
+                by_note[normalize_note(record["raw_text"])] = response
+    return by_note, responses
+
+
+class MockProvider(Provider):
+    """
+    Offline provider for load tests: replays recorded answers after a
+    simulated latency and fails at a configured rate, without network or
+    quota. A note that was recorded gets its own answer; any other note
+    gets one of the recorded answers chosen by a hash of the note, so the
+    same note always gets the same answer. Latency jitter and failures come
+    from a seeded random generator, so a run can be repeated exactly.
+
+    parse turns an answer into quotation items (the same parsing the real
+    providers use). With a spec, each successful call reports its token use
+    (counted locally) as if it had been made to that model.
+    """
+
+    supports_streaming = True
+
+    def __init__(self, responses_path: str, parse: Callable[[str], Any], latency: float = 0.8,
+                 jitter: float = 0.2, error_rate: float = 0.0, seed: int = 0, name: str = "mock",
+                 label: str = "Mock AI", limit: Optional[asyncio.Semaphore] = None,
+                 spec: Optional[ModelSpec] = None):
+        self.name = name
+        self.label = label
+        self.responses_path = responses_path
+        self.parse = parse
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.limit = limit
+        self.spec = spec
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._by_note, self._responses = load_recorded_responses(responses_path)
+
+    def reload(self):
+        self._by_note, self._responses = load_recorded_responses(self.responses_path)
+
+    def _draw(self) -> Tuple[float, bool]:
+        """(latency, fail) for the next call"""
+        with self._random_lock:
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            return delay, self._random.random() < self.error_rate
+
+    def _slot(self):
+        """The concurrency limit to hold during a call (none configured: a no-op)"""
+        return self.limit if self.limit is not None else nullcontext()
+
+    def answer(self, raw_text: str) -> str:
+        recorded = self._by_note.get(normalize_note(raw_text))
+        if recorded is not None:
+            return recorded
+        if not self._responses:
+            raise MockProviderError(f"No recorded responses in {self.responses_path}")
+        return self._responses[zlib.crc32(normalize_note(raw_text).encode('utf-8')) % len(self._responses)]
+
+    async def process(self, raw_text: str, inventory_json: str, api_key: str, system_prompt: str) -> Any:
+        delay, fail = self._draw()
+        async with self._slot():
+            await asyncio.sleep(delay)
+        if fail:
+            raise MockProviderError("mock provider: simulated 429 rate limit")
+        answer = self.answer(raw_text)
+        if self.spec is not None:
+            input_tokens = count_tokens(system_prompt) + count_tokens(inventory_json) + count_tokens(raw_text)
+            record_usage(self.name, self.spec, input_tokens, count_tokens(answer), estimated=True)
+        return self.parse(answer)
+
+    async def stream(self, raw_text: str, inventory_json: str, api_key: str, system_prompt: str) -> AsyncIterator[str]:
+        delay, fail = self._draw()
+        text = self.answer(raw_text)
+        chunks = [text[start:start + 64] for start in range(0, len(text), 64)] or [""]
+        async with self._slot():  # Held for the whole stream, like a real provider's connection
+            for index, chunk in enumerate(chunks):
+                await asyncio.sleep(delay / len(chunks))
+                if fail and index >= len(chunks) // 2:
+                    raise MockProviderError("mock provider: simulated 429 rate limit")
+                yield chunk
+
+
+class ProviderRegistry:
+    """Providers by name; order() gives the ones to try for a request, in the configured order"""
+
+    def __init__(self, order: List[str]):
+        self.order = order
+        self._providers: Dict[str, Provider] = {}
+
+    def register(self, provider: Provider):
+        if not isinstance(provider, Provider):
+            raise TypeError(f"{provider!r} is not a Provider")
+        self._providers[provider.name] = provider
+
+    def get(self, name: str) -> Provider:
+        return self._providers[name]
+
+    def __iter__(self) -> Iterator[Provider]:
+        return iter(self._providers.values())
+
+    def configured(self) -> List[Provider]:
+        """Providers named in the order, skipping unknown names"""
+        return [self._providers[name] for name in self.order if name in self._providers]
+
+    def available(self, streaming: bool = False) -> List[Tuple[Provider, str]]:
+        """(provider, API key) of the configured providers that have a key, in order"""
+        result = []
+        for provider in self.configured():
+            if streaming and not provider.supports_streaming:
+                continue
+            api_key = provider.api_key()
+            if api_key is not None:
+                result.append((provider, api_key))
+        return result
+
+    def unknown(self) -> List[str]:
+        return [name for name in self.order if name not in self._providers]
@@ -0,0 +1,345 @@
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# Defaults for the "rules" section of inventory.json (cabling_calculation,
+# storage_calculation) when it leaves a value out
+DEFAULT_CABLE_PER_CAMERA_M = 35
+DEFAULT_BUILDING_HEIGHT_FACTOR_M = 3.5  # Riser per camera for each floor above the first
+DEFAULT_WASTAGE_FACTOR = 1.15
+DEFAULT_STORAGE_TB_BY_CAMERAS = {"4": 2, "8": 4}  # Up to 4 cameras: 2TB, up to 8: 4TB
+DEFAULT_STORAGE_TB_PER_CAMERA_DAY = 0.025  # 2TB records 4 cameras for ~20 days
+
+# Numbers the engine computes with, by rules section (camera_dependencies nests one level deeper)
+NUMERIC_RULES = {
+    ("camera_dependencies", "ip_camera"): ("cable_per_camera", "jack_boots_per_camera", "co_box_per_camera"),
+    ("camera_dependencies", "analog_camera"): ("cable_per_camera", "co_box_per_camera"),
+    ("cabling_calculation",): ("average_per_camera", "building_height_factor", "horizontal_average", "wastage_factor"),
+    ("storage_calculation",): ("tb_per_camera_day",),
+}
+OBJECT_RULES = ("nvr_dependencies", "standard_additions")
+
+# Site-engineering guidelines from system_prompt.txt that are not rules data
+CABLE_ROUND_TO_M = 10  # Cable is rounded up to the next 10 m
+ACCESSORY_ROUND_TO = 5  # Jack & boots / co boxes: 18 -> 20, 9 -> 10
+SWITCH_UPLINK_PORTS = 2  # A 10 port POE switch powers 8 cameras
+
+# How to find the item for each role: (category prefix or None, words that must all be in the name)
+ROLE_MATCHERS = {
+    "nvr": ("nvr_dvr/", ["nvr"]),
+    "dvr": ("nvr_dvr/", ["dvr"]),
+    "hard_disk": ("storage/", []),
+    "poe_switch": ("networking/", ["poe"]),
+    "patch_cord": (None, ["patch"]),
+    "cabling": ("services/", ["cabling"]),
+    "jack_boots": (None, ["jack"]),
+    "co_box": (None, ["co box"]),
+    "hdmi": (None, ["hdmi"]),
+    "monitor": (None, ["monitor"]),
+    "mouse": (None, ["mouse"]),
+    "surge_protector": (None, ["surge"]),
+    "electrical_materials": (None, ["electrical"]),
+    "adaptor": (None, ["adaptor"]),
+    "nvr_config": ("services/", ["nvr", "configuration"]),
+    "camera_install": ("services/", ["camera", "installation"]),
+    "installation_basic": ("services/", ["installation", "basic"]),
+}
+
+_SPEC_PATTERNS = {
+    "channels": re.compile(r'(\d+)\s*-?\s*ch', re.IGNORECASE),
+    "capacity": re.compile(r'(\d+(?:\.\d+)?)\s*tb', re.IGNORECASE),
+    "ports": re.compile(r'(\d+)\s*-?\s*port', re.IGNORECASE),
+}
+
+
+class RuleError(ValueError):
+    """Raised for requirements the engine cannot quote (unknown item, missing inventory)"""
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value) and value >= 0
+
+
+def check_rules(rules) -> None:
+    """Raise RuleError if the rules section has the wrong shape or a factor that is not a number"""
+    if not isinstance(rules, dict):
+        raise RuleError("rules must be an object")
+    for path, keys in NUMERIC_RULES.items():
+        section = rules
+        for name in path:
+            section = section.get(name, {})
+            if not isinstance(section, dict):
+                raise RuleError(f"rules.{'.'.join(path)} must be an object")
+        for key in keys:
+            if key in section and not _is_number(section[key]):
+                raise RuleError(f"rules.{'.'.join(path)}.{key} must be a number, not {section[key]!r}")
+    for name in OBJECT_RULES:
+        if not isinstance(rules.get(name, {}), dict):
+            raise RuleError(f"rules.{name} must be an object")
+    tb_by_cameras = rules.get("storage_calculation", {}).get("tb_by_cameras", {})
+    if not isinstance(tb_by_cameras, dict) or not all(
+            cameras.isdigit() and _is_number(terabytes) for cameras, terabytes in tb_by_cameras.items()):
+        raise RuleError(f"rules.storage_calculation.tb_by_cameras must map camera counts to terabytes, not {tb_by_cameras!r}")
+
+
+@dataclass(frozen=True)
+class JobRequirements:
+    """What the customer asked for; everything else is derived from the rules"""
+    cameras: Dict[str, int]  # Camera item id -> quantity
+    floors: int = 1
+    backup_days: Optional[int] = None
+    cable_m: Optional[int] = None  # Length the agent noted; the computed length wins if larger
+    monitor: bool = False
+    extra_items: Dict[str, int] = field(default_factory=dict)  # Other items quoted as-is (id -> quantity)
+
+
+class QuoteLine(NamedTuple):
+    item_id: str
+    description: str
+    quantity: int
+    rate: float
+    amount: float
+    rule: str  # Why the line is there
+
+
+def _round_up(value: float, step: int) -> int:
+    return int(math.ceil(value / step - 1e-9) * step)
+
+
+class RulesEngine:
+    """
+    Expands the core of a job (cameras, floors, backup days) into a full
+    quotation using the "rules" section of inventory.json and inventory rates:
+    NVR, hard disk, POE switch and patch cords, cabling, jack & boots, co
+    boxes, HDMI, mouse, surge protector, electrical materials, installation.
+
+    Which inventory item fills each role is decided once in the constructor
+    (first match in catalogue order; NVRs, hard disks and switches by size),
+    so expand() is only arithmetic. Build a new engine when the inventory or
+    the rules change; malformed rules raise RuleError (see check_rules).
+    """
+
+    def __init__(self, items: Iterable, rules: Optional[Dict] = None, specs: Optional[Dict[str, Dict]] = None):
+        self.items = {item.id: item for item in items}
+        self.rules = rules or {}
+        check_rules(self.rules)
+        specs = specs or {}
+
+        camera_rules = self.rules.get("camera_dependencies", {})
+        self._ip_rules = camera_rules.get("ip_camera", {})
+        self._analog_rules = camera_rules.get("analog_camera", {})
+        self._cabling = self.rules.get("cabling_calculation", {})
+        storage = self.rules.get("storage_calculation", {})
+        self._storage_by_cameras = sorted(
+            (int(cameras), float(terabytes))
+            for cameras, terabytes in storage.get("tb_by_cameras", DEFAULT_STORAGE_TB_BY_CAMERAS).items())
+        self._storage_per_camera_day = storage.get("tb_per_camera_day", DEFAULT_STORAGE_TB_PER_CAMERA_DAY)
+        self._additions = self.rules.get("standard_additions", {})
+
+        self._analog_ids = set()
+        self._camera_ids = set()
+        for item in self.items.values():
+            if item.category.startswith("cameras/"):
+                self._camera_ids.add(item.id)
+                item_specs = specs.get(item.id, {})
+                if item_specs.get("type") == "analog" or "analog" in item.name.lower():
+                    self._analog_ids.add(item.id)
+
+        self._roles = {role: self._find(role) for role in ROLE_MATCHERS}
+        self._nvrs = self._sized(self._all("nvr"), "channels", specs)
+        self._dvrs = self._sized(self._all("dvr"), "channels", specs)
+        self._hard_disks = self._sized(self._all("hard_disk"), "capacity", specs)
+        self._switches = self._sized(self._all("poe_switch"), "ports", specs)
+        self._recorder_ids = {item.id for _, item in self._nvrs + self._dvrs}
+        self._switch_ids = {item.id for _, item in self._switches}
+        self._disk_ids = {item.id for _, item in self._hard_disks}
+        install = self._roles["camera_install"]
+        self._install_minimum = specs.get(install.id, {}).get("min_charge", 1) if install is not None else 1
+
+    # Setup
+
+    def _all(self, role: str) -> List:
+        prefix, words = ROLE_MATCHERS[role]
+        return [item for item in self.items.values()
+                if (prefix is None or item.category.startswith(prefix))
+                and all(word in item.name.lower() for word in words)]
+
+    def _find(self, role: str):
+        matches = self._all(role)
+        return matches[0] if matches else None
+
+    @staticmethod
+    def _sized(items: List, spec: str, specs: Dict[str, Dict]) -> List[Tuple[float, object]]:
+        """(size, item) sorted by size; the first item in catalogue order wins a tie"""
+        sized = []
+        for position, item in enumerate(items):
+            value = specs.get(item.id, {}).get(spec)
+            if value is None or isinstance(value, str):
+                match = _SPEC_PATTERNS[spec].search(str(value) if value is not None else item.name)
+                value = float(match.group(1)) if match else None
+            if value:
+                sized.append((float(value), position, item))
+        return [(size, item) for size, _, item in sorted(sized, key=lambda entry: (entry[0], entry[1]))]
+
+    # Lookups used by the note parser
+
+    def candidates(self, role: str) -> List:
+        """Inventory items that can fill a role, in catalogue order"""
+        return self._all(role)
+
+    def sized(self, role: str) -> List[Tuple[float, object]]:
+        """(size, item) for the sized roles: nvr/dvr (channels), hard_disk (TB), poe_switch (ports)"""
+        return {"nvr": self._nvrs, "dvr": self._dvrs, "hard_disk": self._hard_disks, "poe_switch": self._switches}[role]
+
+    def cameras(self, analog: bool = False) -> List:
+        """IP (or analog) camera items in catalogue order"""
+        return [item for item in self.items.values()
+                if item.id in self._camera_ids and (item.id in self._analog_ids) == analog]
+
+    def pick_size(self, role: str, needed: float) -> Tuple[Optional[object], int]:
+        """(item, quantity) of a sized role that covers `needed` (see _pick_size); (None, 0) if the role has no items"""
+        options = self.sized(role)
+        return self._pick_size(options, needed) if options else (None, 0)
+
+    # Expansion
+
+    def _line(self, item, quantity: float, rule: str) -> QuoteLine:
+        quantity = int(math.ceil(quantity))
+        return QuoteLine(item.id, item.description or item.name, quantity, item.price, item.price * quantity, rule)
+
+    @staticmethod
+    def _pick_size(options: List[Tuple[float, object]], needed: float) -> Tuple[object, int]:
+        """Smallest option that covers `needed`, or as many of the largest as it takes"""
+        for size, item in options:
+            if size >= needed:
+                return item, 1
+        largest = options[-1][0]
+        item = next(item for size, item in options if size == largest)  # First in catalogue order
+        return item, int(math.ceil(needed / largest))
+
+    def cable_length(self, cameras: int, floors: int, per_camera: float) -> int:
+        """
+        Cable for a job: per-camera runs plus a riser of building_height_factor
+        per camera for each floor above the first, times wastage_factor,
+        rounded up to 10 m
+        """
+        height = self._cabling.get("building_height_factor", DEFAULT_BUILDING_HEIGHT_FACTOR_M)
+        wastage = self._cabling.get("wastage_factor", DEFAULT_WASTAGE_FACTOR)
+        riser = cameras * (max(1, floors) - 1) * height
+        return _round_up((cameras * per_camera + riser) * wastage, CABLE_ROUND_TO_M)
+
+    def storage_needed(self, cameras: int, backup_days: Optional[int]) -> float:
+        """Disk space in TB for the cameras (by backup days when given, else the usual size for the camera count)"""
+        if backup_days:
+            return cameras * backup_days * self._storage_per_camera_day
+        for max_cameras, terabytes in self._storage_by_cameras:
+            if cameras <= max_cameras:
+                return terabytes
+        max_cameras, terabytes = self._storage_by_cameras[-1]
+        return terabytes * math.ceil(cameras / max_cameras)
+
+    def expand(self, job: JobRequirements) -> List[QuoteLine]:
+        lines: List[QuoteLine] = []
+        ip_cameras = analog_cameras = 0
+        for item_id, quantity in job.cameras.items():
+            if item_id not in self._camera_ids:
+                raise RuleError(f"'{item_id}' is not a camera in the inventory")
+            if quantity <= 0:
+                continue
+            lines.append(self._line(self.items[item_id], quantity, "requested"))
+            if item_id in self._analog_ids:
+                analog_cameras += quantity
+            else:
+                ip_cameras += quantity
+        for item_id, quantity in job.extra_items.items():
+            if item_id not in self.items:
+                raise RuleError(f"Unknown inventory item '{item_id}'")
+            if quantity > 0:
+                lines.append(self._line(self.items[item_id], quantity, "requested"))
+
+        cameras = ip_cameras + analog_cameras
+        if not cameras:
+            return lines
+        requested = {line.item_id for line in lines}
+
+        def add(role: str, quantity: float, rule: str):
+            item = self._roles.get(role)
+            if item is not None and quantity > 0 and item.id not in requested:
+                lines.append(self._line(item, quantity, rule))
+
+        # Recorders: NVR for IP cameras, DVR for analog ones
+        # Items of a role the customer chose themselves (e.g. a specific NVR) replace the rule's pick
+        recorders = sum(line.quantity for line in lines if line.item_id in self._recorder_ids)
+        chosen = recorders > 0
+        for options, count, kind in ((self._nvrs, ip_cameras, "NVR"), (self._dvrs, analog_cameras, "DVR")):
+            if count and options and not chosen:
+                recorder, quantity = self._pick_size(options, count)
+                lines.append(self._line(recorder, quantity, f"{kind} channels for {count} cameras"))
+                recorders += quantity
+        if not recorders and (self._nvrs or self._dvrs):
+            # e.g. analog cameras with no DVR in stock: record on an NVR
+            recorder, recorders = self._pick_size(self._nvrs or self._dvrs, cameras)
+            lines.append(self._line(recorder, recorders, f"recorder channels for {cameras} cameras"))
+
+        # Storage
+        if self._hard_disks and requested.isdisjoint(self._disk_ids):
+            needed = self.storage_needed(cameras, job.backup_days)
+            disk, quantity = self._pick_size(self._hard_disks, needed)
+            lines.append(self._line(disk, quantity, f"{needed:g}TB for {cameras} cameras"))
+
+        # Power / network: POE switch for IP cameras, adaptors for analog ones
+        if ip_cameras and self._switches:
+            switches = sum(line.quantity for line in lines if line.item_id in self._switch_ids)
+            if not switches:
+                size, switch = self._switches[0]
+                ports = max(1, size - SWITCH_UPLINK_PORTS)
+                switches = int(math.ceil(ip_cameras / ports))
+                lines.append(self._line(switch, switches, f"POE ports for {ip_cameras} cameras"))
+            patch_cords = 2 if "patch_cords" in self._additions else 0
+            add("patch_cord", patch_cords * switches, "2 per switch")
+        elif ip_cameras:
+            add("adaptor", ip_cameras, "one per camera (no POE switch in stock)")
+        add("adaptor", analog_cameras, "one per analog camera")
+
+        # Cabling (charge includes cable, pipe and labour)
+        per_camera = self._ip_rules.get("cable_per_camera",
+                                        self._cabling.get("average_per_camera", DEFAULT_CABLE_PER_CAMERA_M))
+        analog_per_camera = self._analog_rules.get("cable_per_camera", per_camera)
+        average = (ip_cameras * per_camera + analog_cameras * analog_per_camera) / cameras
+        meters = self.cable_length(cameras, job.floors, average)
+        if job.cable_m and job.cable_m > meters:
+            meters = _round_up(job.cable_m, CABLE_ROUND_TO_M)
+        add("cabling", meters, f"{cameras} x {average:g}m + {job.floors} floor(s)")
+
+        # Connectors and mounting
+        add("jack_boots", _round_up(ip_cameras * self._ip_rules.get("jack_boots_per_camera", 3), ACCESSORY_ROUND_TO),
+            "per IP camera")
+        co_boxes = (ip_cameras * self._ip_rules.get("co_box_per_camera", 1.5)
+                    + analog_cameras * self._analog_rules.get("co_box_per_camera", 1.5))
+        add("co_box", _round_up(co_boxes, ACCESSORY_ROUND_TO), "per camera")
+
+        # Recorder accessories (nvr_dependencies)
+        nvr_requires = self.rules.get("nvr_dependencies", {}).get("requires", [])
+        if recorders:
+            if "hdmi" in nvr_requires:
+                add("hdmi", recorders, "one per recorder")
+            if "mouse" in nvr_requires:
+                add("mouse", recorders, "one per recorder")
+            if "surge_protector" in nvr_requires or "surge_protector" in self._additions:
+                add("surge_protector", recorders, "one per recorder")
+            if job.monitor:
+                add("monitor", 1, "requested")
+        if "electrical_materials" in self._additions:
+            add("electrical_materials", 1, "every installation")
+
+        # Installation charges
+        if ip_cameras:
+            if recorders and self.rules.get("nvr_dependencies", {}).get("configuration_needed", True):
+                add("nvr_config", recorders, "per recorder")
+            add("camera_install", max(ip_cameras, self._install_minimum),
+                f"per camera (minimum {self._install_minimum:g})")
+        if analog_cameras:
+            add("installation_basic", 1, "analog installation")
+
+        return lines
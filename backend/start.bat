@@ -15,4 +15,4 @@ echo Press Ctrl+C to stop
 echo.
 
 REM Start the server
-python main.py
+uvicorn main:app --host 0.0.0.0 --port 8000
@@ -0,0 +1,104 @@
+import json
+from typing import Dict, List, Optional
+
+
+class ItemStreamParser:
+    """
+    Incremental parser that pulls quotation items out of a JSON response while
+    it is still being generated.
+
+    Feed it text chunks as they arrive; each call returns the item objects that
+    were completed by that chunk. Items are the objects inside the top-level
+    array, or inside the "items" array of the top-level object. Text before
+    the JSON (e.g. a ```json fence or a preamble) and after it is ignored.
+    """
+
+    def __init__(self, array_key: str = "items"):
+        self.array_key = array_key
+        self._data = ''
+        self._stack: List[list] = []  # [container type, key of the container]
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._expect_key = False
+        self._last_key: Optional[str] = None
+        self._item_start: Optional[int] = None
+        self._item_depth = 0
+        self._finished = False
+
+    @property
+    def finished(self) -> bool:
+        """True once the top-level JSON value has been closed"""
+        return self._finished
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """Consume a chunk of text and return the items it completed"""
+        completed = []
+        if self._finished or not chunk:
+            return completed
+
+        base = len(self._data)
+        self._data += chunk
+
+        for offset, char in enumerate(chunk):
+            position = base + offset
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._stack and self._stack[-1][0] == '{' and self._expect_key:
+                        self._last_key = json.loads(self._data[self._string_start:position + 1])
+                continue
+
+            if not self._stack and char not in '{[':
+                continue  # Outside the JSON value (markdown fence, preamble)
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = position
+            elif char in '{[':
+                parent = self._stack[-1] if self._stack else None
+                key = self._last_key if parent is not None and parent[0] == '{' else None
+                if char == '{' and self._is_item_array(parent):
+                    self._item_start = position
+                    self._item_depth = len(self._stack) + 1
+                self._stack.append([char, key])
+                self._expect_key = char == '{'
+                self._last_key = None
+            elif char in '}]':
+                if not self._stack:
+                    continue
+                depth = len(self._stack)
+                self._stack.pop()
+                if char == '}' and self._item_start is not None and depth == self._item_depth:
+                    item_text = self._data[self._item_start:position + 1]
+                    self._item_start = None
+                    try:
+                        completed.append(json.loads(item_text))
+                    except ValueError:
+                        pass  # Malformed item; the final full parse decides what to do
+                if not self._stack:
+                    self._finished = True
+                    break
+                self._expect_key = False
+            elif char == ',':
+                self._expect_key = self._stack[-1][0] == '{'
+            elif char == ':':
+                self._expect_key = False
+
+        return completed
+
+    def _is_item_array(self, container: Optional[list]) -> bool:
+        if container is None or container[0] != '[':
+            return False
+        if len(self._stack) == 1:
+            return True  # Top-level array of items
+        return len(self._stack) == 2 and container[1] == self.array_key
+
+    def text(self) -> str:
+        """Everything fed so far"""
+        return self._data
@@ -0,0 +1,187 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from streaming_json import ItemStreamParser
+from app_logging import get_logger
+
+logger = get_logger("output")
+
+# JSON schema of an AI answer. Passed to the providers' structured output
+# features (Gemini response_schema, Claude / OpenAI tool input) so the answer
+# is valid JSON of this shape instead of free text with a JSON block in it.
+QUOTATION_ITEM_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "description": {"type": "string"},
+        "quantity": {"type": "integer"},
+        "rate": {"type": "number"},
+        "amount": {"type": "number"},
+    },
+    "required": ["description", "quantity", "rate", "amount"],
+}
+QUOTATION_SCHEMA = {
+    "type": "object",
+    "properties": {"items": {"type": "array", "items": QUOTATION_ITEM_SCHEMA}},
+    "required": ["items"],
+}
+QUOTATION_TOOL_NAME = "record_quotation"
+QUOTATION_TOOL_DESCRIPTION = "Record the quotation items for the agent's site note"
+
+AMOUNT_TOLERANCE = 0.005  # Relative difference allowed between amount and rate x quantity
+
+_NUMBER_PATTERN = re.compile(r'-?\d+(?:\.\d+)?')
+
+
+class StructuredOutputError(ValueError):
+    """Raised when no valid quotation item can be recovered from an AI answer"""
+
+
+def repair_json(text: str) -> Optional[str]:
+    """
+    The first JSON object or array in text (skipping markdown fences and
+    preambles), closed if the answer was cut off: the incomplete trailing
+    element is dropped and open arrays / objects are closed. None if there
+    is no complete element to keep.
+    """
+    start = next((position for position, char in enumerate(text) if char in '{['), None)
+    if start is None:
+        return None
+    stack: List[str] = []
+    in_string = escaped = False
+    cut, cut_stack = None, None  # Last position where everything before is complete
+
+    for position in range(start, len(text)):
+        char = text[position]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append(char)
+        elif char in '}]':
+            if not stack:
+                break
+            stack.pop()
+            if not stack:
+                return text[start:position + 1]
+            cut, cut_stack = position + 1, list(stack)
+        elif char == ',':
+            cut, cut_stack = position, list(stack)
+
+    if cut is None:
+        return None
+    closing = ''.join('}' if opener == '{' else ']' for opener in reversed(cut_stack))
+    return text[start:cut].rstrip().rstrip(',') + closing
+
+
+def _number(value: Any) -> Optional[float]:
+    """A number from a JSON value; tolerates strings like "3,990" or "5 nos" """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = _NUMBER_PATTERN.search(value.replace(',', ''))
+        if match:
+            return float(match.group())
+    return None
+
+
+def normalize_item(data: Any) -> Optional[Dict]:
+    """
+    A quotation item dict with the right types and amount == rate x quantity,
+    or None if it cannot be made valid. A missing field is derived from the
+    other two; an amount that does not match is recomputed.
+    """
+    if not isinstance(data, dict):
+        return None
+    description = data.get("description")
+    if not isinstance(description, str) or not description.strip():
+        return None
+    quantity, rate, amount = (_number(data.get(key)) for key in ("quantity", "rate", "amount"))
+
+    if quantity is None and rate and amount is not None:
+        quantity = amount / rate
+    if rate is None and quantity and amount is not None:
+        rate = amount / quantity
+    if quantity is None or rate is None:
+        return None
+    quantity = int(round(quantity))
+
+    expected = rate * quantity
+    if amount is None or abs(amount - expected) > max(0.01, abs(expected) * AMOUNT_TOLERANCE):
+        if amount is not None:
+            logger.info("Amount %g for '%s' != %g x %d; using %g", amount, description.strip(), rate, quantity, expected)
+        amount = expected
+    return {"description": description.strip(), "quantity": quantity, "rate": rate, "amount": amount}
+
+
+def _items_of(value: Any) -> Optional[List]:
+    if isinstance(value, list):
+        return value
+    if isinstance(value, dict):
+        if isinstance(value.get("items"), list):
+            return value["items"]
+        if "description" in value:
+            return [value]
+    return None
+
+
+def decode_response(response: Any) -> Tuple[List, str]:
+    """
+    The raw item list of an AI answer (decoded JSON or text) and how it was
+    recovered: "json", "repaired" (fenced, wrapped or truncated JSON) or
+    "salvaged" (the complete items of otherwise broken JSON).
+    """
+    if not isinstance(response, str):
+        items = _items_of(response)
+        if items is None:
+            raise StructuredOutputError("Invalid response format from AI")
+        return items, "json"
+
+    try:
+        items = _items_of(json.loads(response))
+        if items is not None:
+            return items, "json"
+    except ValueError:
+        pass
+
+    repaired = repair_json(response)
+    if repaired is not None:
+        try:
+            items = _items_of(json.loads(repaired))
+            if items is not None:
+                return items, "repaired"
+        except ValueError:
+            pass
+
+    items = ItemStreamParser().feed(response)
+    if items:
+        return items, "salvaged"
+    raise StructuredOutputError("Invalid response format from AI")
+
+
+def parse_quotation_items(response: Any) -> List[Dict]:
+    """
+    Valid quotation item dicts from an AI answer: a JSON string (possibly
+    fenced, wrapped in prose or truncated) or an already decoded tool
+    input. Invalid items are dropped; raises StructuredOutputError if none
+    is left.
+    """
+    return validate_items(*decode_response(response))
+
+
+def validate_items(raw_items: List, recovery: str = "json") -> List[Dict]:
+    """The valid items of a decoded answer (see decode_response); raises StructuredOutputError if none"""
+    items = [item for item in (normalize_item(raw) for raw in raw_items) if item is not None]
+    if recovery != "json" or len(items) != len(raw_items):
+        logger.info("Recovered %d of %d items (%s)", len(items), len(raw_items), recovery)
+    if not items:
+        raise StructuredOutputError("No valid quotation items in AI response")
+    return items
@@ -0,0 +1,44 @@
+import importlib
+import os
+import shutil
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Data files main reads and writes relative to the working directory
+APP_FILES = ("inventory.json", "system_prompt.txt", "mock_responses.jsonl")
+
+
+@pytest.fixture(scope="session")
+def app_dir(tmp_path_factory):
+    """A scratch copy of the backend data files, used as the working directory"""
+    directory = tmp_path_factory.mktemp("backend")
+    for name in APP_FILES:
+        shutil.copy(os.path.join(BACKEND_DIR, name), directory / name)
+    previous = os.getcwd()
+    os.chdir(directory)
+    yield directory
+    os.chdir(previous)
+
+
+@pytest.fixture(scope="session")
+def app_module(app_dir):
+    """The API module, imported against the scratch data (no AI keys, no reload watcher)"""
+    os.environ.update({"CONFIG_RELOAD": "0", "PDF_WORKERS": "0", "LLM_PROVIDERS": "mock", "MOCK_LATENCY": "0"})
+    return importlib.import_module("main")
+
+
+@pytest.fixture(scope="session")
+def client(app_module):
+    from fastapi.testclient import TestClient
+    with TestClient(app_module.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def main(app_module, client):
+    """The API module once started: the database, inventory and knowledge are loaded on startup"""
+    return app_module
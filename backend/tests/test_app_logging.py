@@ -0,0 +1,24 @@
+import json
+import logging
+
+import pytest
+
+from app_logging import REDACTED, Redactor, StructuredFormatter
+
+
+@pytest.mark.parametrize("name", ["api_key", "apiKey", "client_secret", "access_token", "password", "Authorization"])
+def test_secret_fields_are_redacted(name):
+    assert Redactor().redact_field(name, "value") == REDACTED
+
+
+@pytest.mark.parametrize("name", ["prompt_tokens", "input_tokens", "max_tokens", "cache_key", "tokenizer"])
+def test_other_fields_are_kept(name):
+    assert Redactor().redact_field(name, 42) == 42
+
+
+def test_key_formats_are_redacted_in_messages():
+    record = logging.LogRecord("hdc.test", logging.INFO, __file__, 1, "calling with %s", ("gsk_abcdefgh12345678",), None)
+    record.prompt_tokens = 120
+    entry = json.loads(StructuredFormatter().format(record))
+    assert entry["msg"] == f"calling with {REDACTED}"
+    assert entry["prompt_tokens"] == 120
@@ -0,0 +1,43 @@
+import asyncio
+import os
+
+from cache import TieredCache, canonical_hash
+
+
+def test_canonical_hash_ignores_key_order():
+    assert canonical_hash({"a": 1, "b": [1, 2]}) == canonical_hash({"b": [1, 2], "a": 1})
+
+
+def test_memory_eviction_falls_back_to_disk(tmp_path):
+    cache = TieredCache("test", max_entries=1, disk_dir=str(tmp_path))
+    cache.set("a", b"first")
+    cache.set("b", b"second")
+    assert cache.get("a") == b"first"
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.get("missing") is None
+
+
+def test_async_access_matches_sync(tmp_path):
+    cache = TieredCache("test", max_entries=1, disk_dir=str(tmp_path))
+
+    async def exercise():
+        await cache.aset("a", b"first")
+        await cache.aset("b", b"second")
+        return await cache.aget("b"), await cache.aget("a"), await cache.aget("missing")
+
+    assert asyncio.run(exercise()) == (b"second", b"first", None)
+    stats = cache.stats()
+    assert (stats["hits"], stats["disk_hits"], stats["misses"]) == (2, 1, 1)
+    assert sorted(os.listdir(tmp_path)) == ["a.bin", "b.bin"]
+
+
+def test_expired_entries_are_dropped(tmp_path):
+    cache = TieredCache("test", ttl=-1, disk_dir=str(tmp_path))
+    cache.set("a", b"value")
+    assert cache.get("a") is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_entries_survive_a_restart(tmp_path):
+    TieredCache("test", disk_dir=str(tmp_path)).set("a", b"value")
+    assert asyncio.run(TieredCache("test", disk_dir=str(tmp_path)).aget("a")) == b"value"
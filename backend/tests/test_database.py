@@ -0,0 +1,97 @@
+import sqlite3
+import threading
+
+import pytest
+
+from database import QuotationDatabase
+
+ITEMS = [
+    {"id": "cam", "name": "Camera", "category": "cameras/ip_cameras", "price": 3990, "unit": "piece",
+     "description": "Camera", "extra": {"resolution": "3mp"}},
+    {"id": "nvr", "name": "Nvr", "category": "nvr_dvr/nvr", "price": 6000, "unit": "piece", "description": "Nvr",
+     "extra": {"channels": 8}},
+]
+
+
+def line(description, amount, inventory_id=None, category=None):
+    return {"description": description, "quantity": 1, "rate": amount, "amount": amount,
+            "inventory_id": inventory_id, "category": category}
+
+
+@pytest.fixture
+def database(tmp_path):
+    database = QuotationDatabase(str(tmp_path / "quotations.db"))
+    yield database
+    database.close()
+
+
+def test_runs_in_wal_mode(database):
+    assert database._connection().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_readers_are_not_blocked_by_an_open_write(database, tmp_path):
+    database.replace_inventory(ITEMS, {"storage_calculation": {}})
+    writer = sqlite3.connect(str(tmp_path / "quotations.db"))
+    writer.execute("BEGIN IMMEDIATE")
+    writer.execute("UPDATE inventory_items SET price = 1")
+    try:
+        prices = []
+        reader = threading.Thread(target=lambda: prices.extend(item["price"] for item in database.inventory_items()))
+        reader.start()
+        reader.join(5)
+        assert prices == [3990, 6000]  # The last committed state, without waiting for the writer
+    finally:
+        writer.rollback()
+        writer.close()
+
+
+def test_inventory_round_trip_keeps_order_specs_and_rules(database):
+    rules = {"cabling_calculation": {"wastage_factor": 1.15}, "storage_calculation": {"tb_per_camera_day": 0.025}}
+    database.replace_inventory(ITEMS, rules)
+    assert [item["id"] for item in database.inventory_items()] == ["cam", "nvr"]
+    assert database.inventory_items("nvr_dvr/nvr")[0]["price"] == 6000
+    assert database.inventory_specs() == {"cam": {"resolution": "3mp"}, "nvr": {"channels": 8}}
+    assert list(database.inventory_rules()) == list(rules)
+
+    # Items without `extra` keep the stored one; rules are only replaced when given
+    database.replace_inventory([{key: value for key, value in ITEMS[1].items() if key != "extra"}])
+    assert [item["id"] for item in database.inventory_items()] == ["nvr"]
+    assert database.inventory_specs() == {"nvr": {"channels": 8}}
+    assert database.inventory_rules() == rules
+
+
+def test_meta_values(database):
+    assert database.get_meta("inventory_file_hash") is None
+    database.set_meta("inventory_file_hash", "a")
+    database.set_meta("inventory_file_hash", "b")
+    assert database.get_meta("inventory_file_hash") == "b"
+
+
+def test_quotation_history_filters(database):
+    first = database.save_quotation("5 cameras", "Mock AI", [line("Camera", 3990, "cam", "cameras/ip_cameras")],
+                                    created_at=100)
+    second = database.save_quotation("nvr", "local parser", [line("Nvr 8 channel", 6000, "nvr", "nvr_dvr/nvr"),
+                                                             line("Cable", 500)], cache_hit=True, created_at=200)
+    assert [q["id"] for q in database.find_quotations()] == [second, first]
+    assert [q["id"] for q in database.find_quotations(inventory_id="cam")] == [first]
+    assert [q["id"] for q in database.find_quotations(category="nvr_dvr")] == [second]
+    assert [q["id"] for q in database.find_quotations(category="nvr")] == []
+    assert [q["id"] for q in database.find_quotations(text="cable")] == [second]
+    assert [q["id"] for q in database.find_quotations(since=150)] == [second]
+    assert [q["id"] for q in database.find_quotations(until=150)] == [first]
+    assert [q["id"] for q in database.find_quotations(ai_provider="Mock AI")] == [first]
+
+    saved = database.get_quotation(second)
+    assert saved["cache_hit"] is True and saved["total"] == 6500
+    assert [item["description"] for item in saved["items"]] == ["Nvr 8 channel", "Cable"]
+    assert database.get_quotation(12345) is None
+
+
+def test_data_survives_reopening(tmp_path):
+    path = str(tmp_path / "quotations.db")
+    database = QuotationDatabase(path)
+    database.save_quotation("note", "Mock AI", [line("Camera", 10)])
+    database.close()
+    reopened = QuotationDatabase(path)
+    assert len(reopened.find_quotations()) == 1
+    reopened.close()
@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+import pytest
+
+from dispatch import CircuitBreaker, ProviderUnavailable, call_with_breaker, hedged_race, stream_with_breaker
+
+
+async def chunks(*parts, delay=0.0):
+    for part in parts:
+        await asyncio.sleep(delay)
+        yield part
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_stream_passes_chunks_and_closes_breaker():
+    breaker = CircuitBreaker(failure_threshold=1)
+    breaker.failures = 1
+    breaker.opened_at = -breaker.cooldown  # Half open: one trial allowed
+    result = asyncio.run(collect(stream_with_breaker(breaker, 1, lambda: chunks("a", "b"))))
+    assert result == ["a", "b"]
+    assert breaker.state == "closed"
+
+
+def test_stream_timeout_opens_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+    stream = stream_with_breaker(breaker, 0.05, lambda: chunks("a", "b", delay=0.03), name="slow")
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(collect(stream))
+    assert breaker.state == "open"
+    with pytest.raises(ProviderUnavailable):
+        asyncio.run(collect(stream_with_breaker(breaker, 1, lambda: chunks("a"))))
+
+
+def answer(value, delay=0.0, error=None, log=None):
+    async def call():
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if log is not None:
+                log.append(f"{value} cancelled")
+            raise
+        if error is not None:
+            raise error
+        return value
+    return call
+
+
+def test_hedge_starts_the_next_provider_after_the_delay():
+    log = []
+    attempts = [("slow", answer("slow", 1.0, log=log)), ("fast", answer("fast", 0.01))]
+    started = time.perf_counter()
+    assert asyncio.run(hedged_race(attempts, hedge_delay=0.05)) == ("fast", "fast")
+    assert time.perf_counter() - started < 0.5
+    assert log == ["slow cancelled"]
+
+
+def test_failure_starts_the_next_provider_at_once():
+    attempts = [("broken", answer("broken", error=RuntimeError("500"))), ("backup", answer("backup"))]
+    started = time.perf_counter()
+    assert asyncio.run(hedged_race(attempts, hedge_delay=5)) == ("backup", "backup")
+    assert time.perf_counter() - started < 1
+
+
+def test_race_raises_the_last_error_when_all_fail():
+    attempts = [("a", answer("a", error=RuntimeError("first"))), ("b", answer("b", error=RuntimeError("second")))]
+    with pytest.raises(RuntimeError, match="second"):
+        asyncio.run(hedged_race(attempts, hedge_delay=0.01))
+    with pytest.raises(ProviderUnavailable):
+        asyncio.run(hedged_race([], hedge_delay=0.01))
+
+
+def test_breaker_opens_on_quota_errors_only():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=60)
+
+    async def fail(error):
+        with pytest.raises(type(error)):
+            await call_with_breaker(breaker, 1, answer("x", error=error))
+
+    asyncio.run(fail(RuntimeError("invalid request")))
+    assert breaker.state == "closed"
+    asyncio.run(fail(RuntimeError("429 rate limit")))
+    asyncio.run(fail(RuntimeError("quota exceeded")))
+    assert breaker.state == "open"
+    with pytest.raises(ProviderUnavailable):
+        asyncio.run(call_with_breaker(breaker, 1, answer("x")))
+
+
+def test_half_open_breaker_lets_one_trial_through():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+    breaker.record_failure(asyncio.TimeoutError())
+    assert breaker.state == "half_open"
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_timeout_counts_as_a_breaker_failure():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+    with pytest.raises(asyncio.TimeoutError, match="slow timed out"):
+        asyncio.run(call_with_breaker(breaker, 0.01, answer("x", 1.0), name="slow"))
+    assert breaker.state == "open"
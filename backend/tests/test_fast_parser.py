@@ -0,0 +1,73 @@
+import pytest
+
+
+@pytest.fixture
+def parser(main):
+    return main.knowledge.parser
+
+
+@pytest.mark.parametrize("note, item_id, quantity", [
+    ("16 channel nvr", "nvr_8ch_tplink", 2),
+    ("8tb hdd", "hdd_toshiba_4tb", 2),
+    ("24 port poe switch", "poe_switch_10port", 3),
+    ("12 cameras 8tb", "hdd_toshiba_4tb", 2),
+])
+def test_sizes_beyond_the_largest_item_take_several(parser, note, item_id, quantity):
+    assert parser.parse(note).job.extra_items[item_id] == quantity
+
+
+def test_quotes_a_plain_note(parser):
+    lines, note = parser.quote("Camera ip - 5 nos, Cable - 200m")
+    quoted = {line.item_id: line.quantity for line in lines}
+    assert note.job.cameras == {"cam_3mp_bullet": 5}
+    assert quoted["cam_3mp_bullet"] == 5
+    assert quoted["nvr_8ch_tplink"] == 1
+    assert note.confidence == 1.0
+
+
+@pytest.mark.parametrize("note", [
+    "4 cameras, no nvr needed",
+    "4 cameras without monitor",
+    "0 cameras",
+    "need cameras for shop",
+    "5 cameras 4mp",
+    "2 cameras per floor, 3 floors",
+    "5 cameras 4000 each",
+    "6 bullet cameras and 2 dome cameras",
+    "1.5 cameras",
+    "cable 200m 5 cameras",
+])
+def test_notes_it_cannot_quote_faithfully_are_escalated(parser, note):
+    parsed = parser.parse(note)
+    assert parsed.uncovered
+    assert parsed.confidence == 0.0
+
+
+@pytest.mark.parametrize("note, cameras", [
+    ("camera - 5 no", {"cam_3mp_bullet": 5}),
+    ("3mp camera 5 nos", {"cam_3mp_bullet": 5}),
+    ("2 4mp 360 cameras", {"cam_4mp_360": 2}),
+    ("2 floors 6 cameras 1 month backup", {"cam_3mp_bullet": 6}),
+])
+def test_quantities_and_specs(parser, note, cameras):
+    parsed = parser.parse(note)
+    assert parsed.job.cameras == cameras
+    assert parsed.confidence == 1.0
+
+
+def test_unassigned_numbers_are_not_understood(parser):
+    parsed = parser.parse("5 cameras 4000 each")
+    assert "4000" in parsed.unknown
+    assert parsed.coverage < 1.0
+
+
+@pytest.mark.parametrize("note, disks", [
+    ("5 cameras, 1 hdd", {"hdd_toshiba_4tb": 1}),  # 5 cameras need 4TB
+    ("1 hdd, 5 cameras", {"hdd_toshiba_4tb": 1}),
+    ("4 cameras, 1 hdd", {"hdd_wd_purple_2tb": 1}),
+    ("12 cameras, 2 hdd", {"hdd_toshiba_4tb": 2}),  # 8TB over two disks
+    ("5 cameras, 1 hdd 2tb", {"hdd_wd_purple_2tb": 1}),  # A stated size is kept
+    ("1 hdd", {"hdd_wd_purple_2tb": 1}),  # No cameras to size it for
+])
+def test_explicit_disks_without_a_size_are_sized_for_the_cameras(parser, note, disks):
+    assert parser.parse(note).job.extra_items == disks
@@ -0,0 +1,62 @@
+import asyncio
+import os
+
+import pytest
+
+from file_watcher import FileWatcher, awatch
+
+MODES = [False, pytest.param(True, marks=pytest.mark.skipif(awatch is None, reason="watchfiles not installed"))]
+
+
+async def watch_until(watcher, changes, action, timeout=5.0):
+    """Start the watcher, run action, wait for the first callback and stop"""
+    watcher.start()
+    await asyncio.sleep(0.2)  # Let the watch (and its first poll / native watch) start
+    action()
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not changes and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.02)
+    await watcher.stop()
+
+
+@pytest.mark.parametrize("native", MODES)
+def test_replaced_file_is_reported(tmp_path, native):
+    watched, other = tmp_path / "inventory.json", tmp_path / "other.json"
+    watched.write_text("{}")
+    changes = []
+    watcher = FileWatcher([str(watched)], changes.append, poll_interval=0.05, use_native=native)
+
+    def replace():
+        other.write_text("{}")  # Not watched
+        temp = tmp_path / ".inventory.json.tmp"
+        temp.write_text('{"cameras": {}}')
+        os.replace(temp, watched)  # Atomic writers and editors replace the file
+
+    asyncio.run(watch_until(watcher, changes, replace))
+    assert changes and changes[0] == {str(watched)}
+
+
+def test_callback_errors_do_not_stop_the_watcher(tmp_path):
+    watched = tmp_path / "system_prompt.txt"
+    watched.write_text("a")
+    calls = []
+
+    def on_change(changed):
+        calls.append(changed)
+        if len(calls) == 1:
+            raise ValueError("bad file")
+
+    async def scenario():
+        watcher = FileWatcher([str(watched)], on_change, poll_interval=0.05, use_native=False)
+        watcher.start()
+        for content in ("bb", "ccc"):
+            await asyncio.sleep(0.1)
+            watched.write_text(content)
+            for _ in range(100):
+                if len(calls) == len(content) - 1:
+                    break
+                await asyncio.sleep(0.02)
+        await watcher.stop()
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
@@ -0,0 +1,91 @@
+import pytest
+
+
+@pytest.fixture
+def item_id(client):
+    return client.get("/api/inventory").json()[0]["id"]
+
+
+@pytest.mark.parametrize("changes", [{"name": None}, {"price": None}, {"category": None}, {"unit": None}])
+def test_update_rejects_null_required_field(client, item_id, changes):
+    before = client.get("/api/inventory").json()[0]
+    response = client.put(f"/api/inventory/{item_id}", json=changes)
+    assert response.status_code == 422
+    assert client.get("/api/inventory").json()[0] == before
+
+
+def test_update_rejects_invalid_price(client, item_id):
+    response = client.put(f"/api/inventory/{item_id}", json={"price": "cheap"})
+    assert response.status_code == 422
+
+
+def test_update_changes_only_given_fields(client, item_id):
+    before = client.get("/api/inventory").json()[0]
+    response = client.put(f"/api/inventory/{item_id}", json={"price": before["price"] + 100, "description": None})
+    assert response.status_code == 200
+    after = client.get("/api/inventory").json()[0]
+    assert after == {**before, "price": before["price"] + 100, "description": None}
+
+
+def test_update_unknown_item(client):
+    assert client.put("/api/inventory/no_such_item", json={"price": 1}).status_code == 404
+
+
+@pytest.mark.parametrize("category", ["rules", "rules/extra"])
+def test_items_cannot_go_into_the_rules_section(client, item_id, category):
+    item = {"id": "clash_item", "name": "Clash", "category": category, "price": 1, "unit": "piece"}
+    assert client.post("/api/inventory", json=item).status_code == 422
+    assert client.put(f"/api/inventory/{item_id}", json={"category": category}).status_code == 422
+    assert all(entry["id"] != "clash_item" for entry in client.get("/api/inventory").json())
+
+
+def test_unchanged_inventory_is_a_304(client, item_id):
+    etag = client.get("/api/inventory").headers["ETag"]
+    assert client.get("/api/inventory", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/api/inventory?category=cameras", headers={"If-None-Match": etag}).status_code == 200
+
+    price = client.get("/api/inventory").json()[0]["price"]
+    client.put(f"/api/inventory/{item_id}", json={"price": price + 1})
+    try:
+        assert client.get("/api/inventory", headers={"If-None-Match": etag}).status_code == 200
+    finally:
+        client.put(f"/api/inventory/{item_id}", json={"price": price})
+
+
+def test_cursor_pages_cover_the_list_once(client):
+    everything = [item["id"] for item in client.get("/api/inventory").json()]
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 4, "fields": "name"} if cursor is None else {"limit": 4, "fields": "name", "cursor": cursor}
+        page = client.get("/api/inventory", params=params).json()
+        assert all(set(item) == {"id", "name"} for item in page["items"])
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == everything
+
+
+def test_filters_by_section_and_words(client):
+    cameras = client.get("/api/inventory", params={"category": "cameras"}).json()
+    assert cameras and all(item["category"].startswith("cameras/") for item in cameras)
+    assert [item["id"] for item in client.get("/api/inventory", params={"q": "360 camera"}).json()] == ["cam_4mp_360"]
+    assert client.get("/api/inventory", params={"fields": "colour"}).status_code == 400
+
+
+def test_since_returns_only_the_changes(client):
+    version = client.get("/api/inventory", params={"limit": 1}).json()["version"]
+    added = {"id": "since_item", "name": "Since item", "category": "accessories/misc", "price": 10, "unit": "piece"}
+    client.post("/api/inventory", json=added)
+    client.post("/api/inventory", json={**added, "id": "since_gone"})
+    client.delete("/api/inventory/since_gone")
+    try:
+        changes = client.get("/api/inventory", params={"since": version}).json()
+        assert [item["id"] for item in changes["items"]] == ["since_item"]
+        assert changes["deleted"] == ["since_gone"]
+        assert not changes["reset"]
+        filtered = client.get("/api/inventory", params={"since": version, "category": "cameras"}).json()
+        assert filtered["items"] == [] and set(filtered["deleted"]) == {"since_item", "since_gone"}
+        assert client.get("/api/inventory", params={"since": 0}).json()["reset"]
+    finally:
+        client.delete("/api/inventory/since_item")
@@ -0,0 +1,64 @@
+import json
+
+from inventory_file import InventoryFile, nest_inventory
+
+DOCUMENT = {
+    "nvr_dvr": {
+        "nvr": [
+            {"id": "nvr_8ch", "name": "Nvr 8 channel", "rate": 6900, "channels": 8, "warranty": "2 YEAR"},
+            {"id": "nvr_16ch", "name": "Nvr 16 channel", "rate": 9900, "channels": 16},
+        ],
+    },
+    "storage": {"hard_disk": [{"id": "hdd_2tb", "name": "2TB disk", "rate": 7500, "capacity": "2TB"}]},
+    "rules": {"storage_calculation": {"tb_per_camera_day": 0.025}},
+}
+
+
+def item(id, name, category, price, unit="piece", description=None):
+    return {"id": id, "name": name, "category": category, "price": price, "unit": unit,
+            "description": description if description is not None else name}
+
+
+ITEMS = [
+    item("nvr_8ch", "Nvr 8 channel", "nvr_dvr/nvr", 6900),
+    item("nvr_16ch", "Nvr 16 channel", "nvr_dvr/nvr", 9900),
+    item("hdd_2tb", "2TB disk", "storage/hard_disk", 7500),
+]
+
+
+def test_unchanged_items_round_trip():
+    assert nest_inventory(DOCUMENT, ITEMS) == DOCUMENT
+
+
+def test_moved_item_keeps_its_extra_fields():
+    items = [ITEMS[0], {**ITEMS[1], "category": "nvr_dvr/large"}, ITEMS[2]]
+    nested = nest_inventory(DOCUMENT, items)
+    assert [entry["id"] for entry in nested["nvr_dvr"]["nvr"]] == ["nvr_8ch"]
+    assert nested["nvr_dvr"]["large"] == [DOCUMENT["nvr_dvr"]["nvr"][1]]
+
+
+def test_deleted_item_is_dropped_and_new_item_appended():
+    items = [ITEMS[0], ITEMS[2], item("hdd_4tb", "4TB disk", "storage/hard_disk", 8600, description="4TB surveillance disk")]
+    nested = nest_inventory(DOCUMENT, items)
+    assert [entry["id"] for entry in nested["nvr_dvr"]["nvr"]] == ["nvr_8ch"]
+    assert nested["storage"]["hard_disk"][1] == {"id": "hdd_4tb", "name": "4TB disk", "description": "4TB surveillance disk",
+                                                  "rate": 8600}
+
+
+def test_rules_stay_last_and_clashing_items_never_replace_them():
+    items = ITEMS + [item("clash", "Clash", "rules", 1), item("new_section", "Other", "other", 5, unit="lot")]
+    nested = nest_inventory(DOCUMENT, items)
+    assert list(nested) == ["nvr_dvr", "storage", "other", "rules"]
+    assert nested["rules"] == DOCUMENT["rules"]
+    assert nested["other"] == {"items": [{"id": "new_section", "name": "Other", "rate": 5, "unit": "lot"}]}
+
+
+def test_save_round_trips_through_the_file(tmp_path):
+    path = tmp_path / "inventory.json"
+    path.write_text(json.dumps(DOCUMENT))
+    inventory_file = InventoryFile(str(path))
+    inventory_file.save([ITEMS[0], {**ITEMS[2], "category": "storage/disks", "price": 7000}])
+    saved = json.loads(path.read_text())
+    assert saved["storage"] == {"hard_disk": [], "disks": [{**DOCUMENT["storage"]["hard_disk"][0], "rate": 7000}]}
+    inventory_file.save([ITEMS[0], {**ITEMS[2], "category": "storage/disks", "price": 7000}])
+    assert json.loads(path.read_text()) == saved
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from inventory_index import InventoryIndex, compact_inventory_json
+from prompt_builder import count_tokens, fit_inventory
+
+
+@pytest.fixture
+def snapshot(main):
+    return main.knowledge
+
+
+def test_cameras_pull_in_their_dependencies(snapshot):
+    selected = {item.id for item in snapshot.index.select("5 ip cameras")}
+    assert {"cam_3mp_bullet", "nvr_8ch_tplink", "hdd_wd_purple_2tb", "poe_switch_10port", "jack_boots"} <= selected
+
+
+def test_select_keeps_catalogue_order(snapshot):
+    order = [item.id for item in snapshot.items]
+    selected = [item.id for item in snapshot.index.select("monitor and hdmi, 4 cameras")]
+    assert selected == sorted(selected, key=order.index)
+
+
+def test_nothing_matching_gives_the_first_max_items(snapshot):
+    index = InventoryIndex(snapshot.items, snapshot.rules, max_items=5)
+    assert index.select("zzz qqq") == list(snapshot.items[:5])
+
+
+def test_compact_json_uses_short_keys(snapshot):
+    item = next(item for item in snapshot.items if item.id == "nvr_8ch_tplink")
+    assert json.loads(compact_inventory_json([item])) == [
+        {"id": "nvr_8ch_tplink", "n": item.description or item.name, "c": item.category, "r": item.price, "u": item.unit}]
+    assert ": " not in compact_inventory_json(snapshot.items)
+
+
+def test_fit_inventory_keeps_one_item_of_each_category_first(snapshot):
+    ranked = snapshot.index.rank("5 ip cameras")
+    everything = count_tokens(compact_inventory_json(ranked))
+    kept = fit_inventory(ranked, everything // 2, compact_inventory_json)
+    assert 0 < len(kept) < len(ranked)
+    assert {item.category for item in kept} == {item.category for item in ranked}
+    assert fit_inventory(ranked, 0, compact_inventory_json) == ranked[:1]
+    assert fit_inventory(ranked, everything * 2, compact_inventory_json) == ranked
@@ -0,0 +1,120 @@
+import time
+
+from pydantic import BaseModel
+
+from inventory_store import InventoryStore
+
+
+class Item(BaseModel):
+    id: str
+    category: str
+    price: float = 1
+
+
+def items(count, category="cameras"):
+    return [Item(id=f"item_{number}", category=category) for number in range(count)]
+
+
+def ids(page):
+    return [item.id for item in page]
+
+
+def test_pages_follow_insertion_order():
+    store = InventoryStore(items(5))
+    first, cursor = store.page(limit=2)
+    second, cursor = store.page(after=cursor, limit=2)
+    third, end = store.page(after=cursor, limit=2)
+    assert ids(first + second + third) == [f"item_{number}" for number in range(5)]
+    assert end is None
+
+
+def test_page_cursor_survives_deletes_and_adds():
+    store = InventoryStore(items(4))
+    first, cursor = store.page(limit=2)
+    store.delete("item_1")  # Already returned
+    store.delete("item_2")  # Not yet returned
+    store.add(Item(id="item_1", category="cameras"))  # Re-added: goes to the end
+    rest, end = store.page(after=cursor)
+    assert ids(first) == ["item_0", "item_1"]
+    assert ids(rest) == ["item_3", "item_1"]
+    assert end is None
+
+
+def test_page_filters_and_updates_keep_position():
+    store = InventoryStore(items(3) + [Item(id="disk", category="storage")])
+    store.update(Item(id="item_0", category="cameras", price=5))
+    page, _ = store.page(predicate=lambda item: item.category == "cameras")
+    assert ids(page) == ["item_0", "item_1", "item_2"]
+    page, _ = store.page(after=0, predicate=lambda item: item.category == "storage")
+    assert ids(page) == ["disk"]
+
+
+def logged_store(tmp_path, saved, **options):
+    return InventoryStore(items(2), log_path=str(tmp_path / "changes.jsonl"), item_factory=lambda data: Item(**data),
+                          save_snapshot=lambda snapshot: saved.append(ids(snapshot)), **options)
+
+
+def test_changes_are_replayed_after_a_restart(tmp_path):
+    store = logged_store(tmp_path, [])
+    store.add(Item(id="new", category="storage"))
+    store.update(Item(id="item_0", category="cameras", price=9))
+    store.delete("item_1")
+
+    restarted = logged_store(tmp_path, [])
+    assert ids(restarted.list()) == ["item_0", "new"]
+    assert restarted.get("item_0").price == 9
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    store = logged_store(tmp_path, [])
+    store.add(Item(id="new", category="storage"))
+    with open(tmp_path / "changes.jsonl", "a") as f:
+        f.write('{"op": "put", "item": {"id": "half')
+    assert ids(logged_store(tmp_path, []).list()) == ["item_0", "item_1", "new"]
+
+
+def test_compaction_saves_a_snapshot_and_starts_a_new_log(tmp_path):
+    saved = []
+    store = logged_store(tmp_path, saved, compact_after=100)
+    store.add(Item(id="new", category="storage"))
+    store.flush()
+    assert saved == [["item_0", "item_1", "new"]]
+    assert not (tmp_path / "changes.jsonl").exists() and not (tmp_path / "changes.jsonl.old").exists()
+    store.flush()  # Nothing new to save
+    assert len(saved) == 1
+
+
+def test_failed_compaction_keeps_the_log_for_the_next_start(tmp_path):
+    def failing_save(snapshot):
+        raise OSError("disk full")
+
+    store = InventoryStore(items(1), log_path=str(tmp_path / "changes.jsonl"), item_factory=lambda data: Item(**data),
+                           save_snapshot=failing_save)
+    store.add(Item(id="first", category="storage"))
+    store.flush()
+    store.add(Item(id="second", category="storage"))
+    assert (tmp_path / "changes.jsonl.old").exists()
+    restarted = InventoryStore(items(1), log_path=str(tmp_path / "changes.jsonl"), item_factory=lambda data: Item(**data))
+    assert ids(restarted.list()) == ["item_0", "first", "second"]
+
+
+def test_compact_after_triggers_a_background_save(tmp_path):
+    saved = []
+    store = logged_store(tmp_path, saved, compact_after=2)
+    store.add(Item(id="a", category="storage"))
+    store.add(Item(id="b", category="storage"))
+    deadline = time.monotonic() + 5
+    while not saved and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert saved == [["item_0", "item_1", "a", "b"]]
+
+
+def test_reload_keeps_unsaved_changes_on_top(tmp_path):
+    store = logged_store(tmp_path, [])
+    version = store.version
+    store.update(Item(id="item_0", category="cameras", price=7))
+    assert store.reload([Item(id="item_0", category="cameras", price=3), Item(id="file_only", category="storage")])
+    assert store.get("item_0").price == 7
+    assert ids(store.list()) == ["item_0", "file_only"]
+    changed, deleted = store.changes_since(version)
+    assert ids(changed) == ["item_0", "file_only"] and deleted == ["item_1"]
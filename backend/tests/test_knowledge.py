@@ -0,0 +1,69 @@
+import copy
+import json
+import os
+
+import pytest
+
+
+def test_version_follows_rules_and_specs(main, monkeypatch):
+    snapshot = main.knowledge
+    items = list(snapshot.items)
+    same = main.build_knowledge(items, snapshot.rules, snapshot.system_prompt)
+    assert same.version == snapshot.version
+
+    rules = copy.deepcopy(snapshot.rules)
+    rules["camera_dependencies"]["ip_camera"]["cable_per_camera"] += 5
+    assert main.build_knowledge(items, rules, snapshot.system_prompt).version != snapshot.version
+
+    specs = main.database.inventory_specs()
+    specs["nvr_8ch_tplink"] = {**specs.get("nvr_8ch_tplink", {}), "channels": 16}
+    monkeypatch.setattr(main.database, "inventory_specs", lambda: specs)
+    assert main.build_knowledge(items, snapshot.rules, snapshot.system_prompt).version != snapshot.version
+
+
+def edit_inventory_file(main, edit):
+    with open(main.INVENTORY_FILE) as f:
+        document = json.load(f)
+    edit(document)
+    with open(main.INVENTORY_FILE, "w") as f:
+        json.dump(document, f)
+    main.reload_changed_files({os.path.abspath(main.INVENTORY_FILE)})
+
+
+@pytest.fixture
+def inventory_file(main):
+    with open(main.INVENTORY_FILE) as f:
+        original = f.read()
+    yield
+    with open(main.INVENTORY_FILE, "w") as f:
+        f.write(original)
+    main.reload_changed_files({os.path.abspath(main.INVENTORY_FILE)})
+
+
+def set_rate(document, rate):
+    document["nvr_dvr"]["nvr"][0]["rate"] = rate
+
+
+def test_reload_with_bad_rules_changes_nothing(main, inventory_file):
+    snapshot = main.knowledge
+    file_hash = main.database.get_meta("inventory_file_hash")
+
+    def edit(document):
+        set_rate(document, 1)
+        document["rules"]["cabling_calculation"]["wastage_factor"] = "a lot"
+
+    edit_inventory_file(main, edit)
+    assert main.knowledge is snapshot
+    assert main.inventory_db.get("nvr_8ch_tplink").price == 6000
+    assert main.database.get_meta("inventory_file_hash") == file_hash
+
+
+def test_reload_swaps_items_and_rules_together(main, inventory_file):
+    def edit(document):
+        set_rate(document, 6100)
+        document["rules"]["cabling_calculation"]["wastage_factor"] = 1.2
+
+    edit_inventory_file(main, edit)
+    assert main.inventory_db.get("nvr_8ch_tplink").price == 6100
+    assert main.knowledge.rules["cabling_calculation"]["wastage_factor"] == 1.2
+    assert any(item.id == "nvr_8ch_tplink" and item.price == 6100 for item in main.knowledge.items)
@@ -0,0 +1,85 @@
+import pytest
+
+from metrics import MetricsRegistry, size_bucket
+
+
+def lines(registry):
+    return registry.render().splitlines()
+
+
+def test_counter_renders_per_label_values():
+    registry = MetricsRegistry(enabled=True)
+    requests = registry.counter("requests_total", "Requests", ["provider", "outcome"])
+    requests.inc("groq", "ok")
+    requests.inc("groq", "ok", amount=2)
+    requests.inc("mock", 'say "hi"')
+    output = lines(registry)
+    assert "# TYPE requests_total counter" in output
+    assert 'requests_total{provider="groq",outcome="ok"} 3' in output
+    assert 'requests_total{provider="mock",outcome="say \\"hi\\""} 1' in output
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry(enabled=True)
+    latency = registry.histogram("latency_seconds", "Latency", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 5.0):
+        latency.observe(value, "render")
+    output = lines(registry)
+    assert 'latency_seconds_bucket{stage="render",le="0.1"} 1' in output
+    assert 'latency_seconds_bucket{stage="render",le="1"} 3' in output
+    assert 'latency_seconds_bucket{stage="render",le="+Inf"} 4' in output
+    assert 'latency_seconds_sum{stage="render"} 6.25' in output
+    assert 'latency_seconds_count{stage="render"} 4' in output
+
+
+def test_span_times_a_block_even_when_it_raises():
+    registry = MetricsRegistry(enabled=True)
+    with registry.span("parse"):
+        pass
+    with pytest.raises(ValueError):
+        with registry.span("parse"):
+            raise ValueError("boom")
+    custom = registry.histogram("pdf_seconds", "PDF", ["items"])
+    with registry.span("unused", custom, "1-5"):
+        pass
+    output = lines(registry)
+    assert 'stage_duration_seconds_count{stage="parse"} 2' in output
+    assert 'pdf_seconds_count{items="1-5"} 1' in output
+
+
+def test_disabled_registry_records_nothing():
+    registry = MetricsRegistry(enabled=False)
+    counter = registry.counter("requests_total", "Requests")
+    counter.inc()
+    registry.histogram("latency_seconds", "Latency").observe(1.0)
+    with registry.span("parse"):
+        pass
+    assert not any(line for line in lines(registry) if not line.startswith("#"))
+
+
+def test_collectors_are_read_at_render_time_and_failures_are_skipped():
+    registry = MetricsRegistry(enabled=True)
+    state = {"hits": 1}
+    registry.collector(lambda: [("cache_hits", "gauge", "Cache hits", [({"cache": "pdf"}, state["hits"])])])
+    registry.collector(lambda: 1 / 0)
+    state["hits"] = 7
+    assert 'cache_hits{cache="pdf"} 7' in lines(registry)
+
+
+def test_same_name_returns_the_registered_metric():
+    registry = MetricsRegistry(enabled=True)
+    assert registry.counter("requests_total", "Requests") is registry.counter("requests_total", "Requests")
+
+
+@pytest.mark.parametrize("count, bucket", [(1, "1-5"), (5, "1-5"), (6, "6-10"), (100, "51-100"), (101, "101+")])
+def test_size_buckets(count, bucket):
+    assert size_bucket(count) == bucket
+
+
+def test_metrics_endpoint(client):
+    client.post("/api/process", json={"raw_text": "6 cameras, 2 floors"})
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE quotations_total counter" in response.text
+    assert 'stage_duration_seconds_count{stage="save_ai_response"}' in response.text
@@ -0,0 +1,80 @@
+import asyncio
+import io
+import zipfile
+
+import pytest
+from starlette.requests import ClientDisconnect
+
+QUOTATION = {"items": [{"description": "Camera", "quantity": 2, "rate": 3990, "amount": 7980}],
+             "customer_name": "Test", "reference_no": "T-1"}
+
+
+def batch(client, count):
+    quotations = [{**QUOTATION, "reference_no": f"T-{number}"} for number in range(count)]
+    return client.post("/api/generate-pdf/batch", json={"quotations": quotations, "format": "zip"})
+
+
+def test_zip_batch(client, main):
+    response = batch(client, 3)
+    assert response.status_code == 200
+    names = sorted(zipfile.ZipFile(io.BytesIO(response.content)).namelist())
+    assert names == ["HDC_Quotation_001_T-0.pdf", "HDC_Quotation_002_T-1.pdf", "HDC_Quotation_003_T-2.pdf"]
+    assert main.pdf_pool.pending == 0
+
+
+def test_zip_batch_on_a_full_queue_is_503(client, main, monkeypatch):
+    monkeypatch.setattr(main.pdf_pool, "queue_depth", 0)
+    assert batch(client, 2).status_code == 503
+
+
+def test_zip_batch_notes_late_failures_in_the_archive(client, main, monkeypatch):
+    render = main.render_cached_pdf
+
+    async def flaky(fields, reserved=False):
+        if fields["reference_no"] == "T-1":
+            await asyncio.sleep(0.05)
+            raise asyncio.TimeoutError()
+        return await render(fields, reserved)
+
+    monkeypatch.setattr(main, "render_cached_pdf", flaky)
+    response = batch(client, 2)
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert sorted(archive.namelist()) == ["HDC_Quotation_001_T-0.pdf", "HDC_Quotation_002_T-1.error.txt"]
+    assert main.pdf_pool.pending == 0
+
+
+def test_zip_batch_disconnect_before_the_body_frees_the_slots(main):
+    async def scenario():
+        request = main.BatchPDFRequest(quotations=[{**QUOTATION, "reference_no": f"D-{number}"} for number in range(4)],
+                                       format="zip")
+        response = await main.generate_quotation_pdf_batch(request)
+        assert main.pdf_pool.pending > 0
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            raise OSError("client went away")  # ASGI 2.4 servers raise on send to a closed connection
+
+        scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+        with pytest.raises(ClientDisconnect):
+            await response(scope, receive, send)
+
+    asyncio.run(scenario())
+    assert main.pdf_pool.pending == 0
+
+
+def test_pdf_cache_key_follows_the_renderer_version(main, monkeypatch):
+    request = main.PDFRequest(**QUOTATION, quotation_date="01/01/2025")
+    before = main.resolve_pdf_fields(request)
+    monkeypatch.setattr(main, "PDF_RENDERER_VERSION", "changed")
+    after = main.resolve_pdf_fields(request)
+    assert after["cache_key"] != before["cache_key"]
+    assert after["reference_no"] == before["reference_no"]
+
+
+def test_pdf_stats_report_the_resolved_fonts(client):
+    stats = client.get("/api/pdf/stats").json()
+    assert "MalayalamFont" in stats["fonts"]
+    assert stats["pending"] == 0
@@ -0,0 +1,31 @@
+from pdf_generator import HDCQuotationPDF, get_quotation_template
+
+ITEMS = [
+    {"description": "3 mp color bullet Ip ai camera tplink", "rate": 3990, "quantity": 4, "amount": 15960},
+    {"description": "Installation Charges", "rate": 500, "quantity": 4, "amount": 2000},
+]
+
+
+def test_generators_share_one_template_per_font():
+    first, second = HDCQuotationPDF(), HDCQuotationPDF()
+    assert first.template is second.template is get_quotation_template(first.malayalam_font)
+    assert get_quotation_template("Helvetica") is get_quotation_template("Helvetica")
+
+
+def test_each_document_gets_fresh_info_page_flowables():
+    template = get_quotation_template()
+    first, second = template.info_page(), template.info_page()
+    assert len(first) == len(second)
+    assert all(a is not b for a, b in zip(first, second))
+
+
+def test_repeated_renders_give_the_same_document():
+    generator = HDCQuotationPDF()
+
+    def render():
+        return generator.generate_quotation(ITEMS, customer_name="Test", quotation_date="01/01/2026",
+                                            reference_no="HDC-1").getvalue()
+
+    first, second = render(), render()
+    assert first.startswith(b"%PDF") and second.startswith(b"%PDF")
+    assert len(first) == len(second)
@@ -0,0 +1,68 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from pdf_pool import PDFPoolBusy, PDFRenderPool
+
+
+def sleep_job(seconds):
+    time.sleep(seconds)
+    return b"done", {}
+
+
+def exit_job():
+    os._exit(1)
+
+
+@pytest.fixture
+def pool():
+    pool = PDFRenderPool(workers=1, queue_depth=2, job_timeout=0.5)
+    pool.start()
+    yield pool
+    pool.shutdown()
+
+
+def test_started_pool_reports_the_worker_fonts(pool):
+    assert "MalayalamFont" in pool.fonts
+
+
+def test_timed_out_job_recycles_the_pool(pool):
+    old = pool._executor
+    stuck = list(old._processes.values())
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(pool._run(sleep_job, 1, 30))
+    assert pool._executor is not old
+    assert asyncio.run(pool._run(sleep_job, 1, 0)) == b"done"
+    stuck[0].join(5)
+    assert not stuck[0].is_alive()
+    assert pool.pending == 0
+
+
+def test_broken_pool_is_replaced(pool):
+    old = pool._executor
+    with pytest.raises(BrokenProcessPool):
+        asyncio.run(pool._run(exit_job, 1))
+    assert pool._executor is not old
+    assert asyncio.run(pool._run(sleep_job, 1, 0)) == b"done"
+
+
+def test_full_queue_is_rejected(pool):
+    pool.reserve(2)
+    with pytest.raises(PDFPoolBusy):
+        asyncio.run(pool._run(sleep_job, 1, 0))
+    pool.release(2)
+    assert asyncio.run(pool._run(sleep_job, 1, 0)) == b"done"
+
+
+def test_worker_reimport_of_main_loads_nothing(tmp_path):
+    # What a spawned worker does when the server was started with "python main.py"
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = f"import runpy; runpy.run_path({os.path.join(backend_dir, 'main.py')!r}, run_name='__mp_main__')"
+    subprocess.run([sys.executable, "-c", code], cwd=tmp_path, check=True, timeout=60,
+                   env={**os.environ, "PYTHONPATH": backend_dir, "DATABASE_FILE": "quotations.db"})
+    assert not (tmp_path / "quotations.db").exists()
@@ -0,0 +1,61 @@
+import json
+
+
+def events(response):
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_stream_escalates_to_the_provider_chain(client, main):
+    before = main.provider_requests_total._values.get(("mock", "ok"), 0)
+    response = client.post("/api/process/stream", json={"raw_text": "need cameras for shop, no nvr"})
+    assert response.status_code == 200
+    done = events(response)[-1]
+    assert done["type"] == "done"
+    assert done["message"].endswith("using Mock AI")
+    assert main.provider_requests_total._values[("mock", "ok")] == before + 1
+
+
+def test_confident_notes_are_quoted_locally(client, main):
+    response = client.post("/api/process", json={"raw_text": "Camera ip - 5 nos, Cable - 200m"})
+    assert response.status_code == 200
+    assert response.json()["message"].endswith(f"using {main.LOCAL_PARSER_LABEL}")
+
+
+def test_repeated_notes_come_from_the_cache(client, main):
+    note = "3 cameras, 1 hdmi"
+    client.post("/api/process", json={"raw_text": note})
+    hits = main.process_cache.stats()["hits"]
+    assert client.post("/api/process", json={"raw_text": note}).status_code == 200
+    assert main.process_cache.stats()["hits"] == hits + 1
+
+
+def test_batch_reports_a_failed_note_and_returns_the_rest(client, main, monkeypatch):
+    finish = main.finish_processing
+
+    async def flaky(raw_text, *args, **kwargs):
+        if raw_text == "broken note":
+            raise RuntimeError("database is locked")
+        return await finish(raw_text, *args, **kwargs)
+
+    monkeypatch.setattr(main, "finish_processing", flaky)
+    notes = {"requests": [{"raw_text": "2 cameras"}, {"raw_text": "broken note"}]}
+
+    results = client.post("/api/process/batch", json=notes).json()
+    assert [result["success"] for result in results] == [True, False]
+    assert results[1] == {"index": 1, "items": [], "success": False, "message": "Processing failed: database is locked",
+                          "usage": None}
+
+    streamed = sorted(events(client.post("/api/process/batch?stream=true", json=notes)), key=lambda result: result["index"])
+    assert [result["success"] for result in streamed] == [True, False]
+
+
+def test_stream_without_items_counts_as_a_provider_error(client, main, monkeypatch):
+    async def empty_answer(*args, **kwargs):
+        yield '{"items": []}'
+
+    monkeypatch.setattr(main.provider_registry.get("mock"), "stream", empty_answer)
+    counts = main.provider_requests_total._values
+    ok, errors = counts.get(("mock", "ok"), 0), counts.get(("mock", "error"), 0)
+    response = client.post("/api/process/stream", json={"raw_text": "need cameras for the warehouse, no nvr"})
+    assert response.status_code == 200
+    assert (counts.get(("mock", "ok"), 0), counts[("mock", "error")]) == (ok, errors + 1)
@@ -0,0 +1,48 @@
+import pytest
+
+import prompt_builder
+
+
+class FakeEncoding:
+    def encode(self, text, disallowed_special=()):
+        return list(text)
+
+
+class FakeTiktoken:
+    def __init__(self, error=None):
+        self.error = error
+        self.loads = 0
+
+    def get_encoding(self, name):
+        self.loads += 1
+        if self.error is not None:
+            raise self.error
+        return FakeEncoding()
+
+
+@pytest.fixture
+def tokenizer(monkeypatch):
+    def install(fake):
+        monkeypatch.setattr(prompt_builder, "tiktoken", fake)
+        monkeypatch.setattr(prompt_builder, "_encoding", None)
+        prompt_builder.count_tokens.cache_clear()
+        return fake
+
+    yield install
+    prompt_builder.count_tokens.cache_clear()
+
+
+def test_counting_never_loads_the_tokenizer(tokenizer):
+    fake = tokenizer(FakeTiktoken())
+    estimate = prompt_builder.count_tokens("four 4mp bullet cameras")
+    assert fake.loads == 0
+    assert prompt_builder.load_tokenizer()
+    assert fake.loads == 1
+    assert prompt_builder.count_tokens("four 4mp bullet cameras") == 23 != estimate  # Not the cached estimate
+
+
+def test_failed_load_falls_back_to_the_estimate(tokenizer):
+    tokenizer(FakeTiktoken(OSError("offline")))
+    estimate = prompt_builder.count_tokens("four 4mp bullet cameras")
+    assert not prompt_builder.load_tokenizer()
+    assert prompt_builder.count_tokens("four 4mp bullet cameras") == estimate
@@ -0,0 +1,55 @@
+import asyncio
+
+import openai
+
+from provider_clients import ProviderClients
+
+
+def clients_with_factory(sdk=openai):
+    built = []
+
+    def factory(api_key, http_client):
+        built.append((api_key, http_client))
+        return object()
+
+    clients = ProviderClients({"openai": 4}, {"openai": 30.0}, http2=False)
+    clients.register("openai", factory, sdk=sdk)
+    return clients, built
+
+
+def test_client_is_reused_for_the_same_key():
+    clients, built = clients_with_factory()
+    first = clients.get("openai", "key-1")
+    assert clients.get("openai", "key-1") is first
+    assert len(built) == 1
+
+
+def test_new_key_builds_a_client_on_the_same_pool():
+    clients, built = clients_with_factory()
+    first = clients.get("openai", "key-1")
+    second = clients.get("openai", "key-2")
+    assert second is not first
+    assert built[0][1] is built[1][1] is clients.http_client("openai")
+
+
+def test_pool_uses_the_configured_size_and_timeout():
+    clients, _ = clients_with_factory()
+    http_client = clients.http_client("openai")
+    assert http_client.timeout.read == 30.0
+    assert http_client._transport._pool._max_connections == 4
+    asyncio.run(clients.aclose())
+    assert http_client.is_closed
+
+
+def test_sdks_without_an_http_client_get_none():
+    clients, built = clients_with_factory(sdk=None)
+    clients.get("openai", "key-1")
+    assert built == [("key-1", None)]
+
+
+def test_warm_up_builds_only_the_providers_with_a_key():
+    clients, built = clients_with_factory()
+    clients.warm_up({"openai": None, "unknown": "key"})
+    assert built == []
+    clients.warm_up({"openai": "key-1"})
+    assert [api_key for api_key, _ in built] == ["key-1"]
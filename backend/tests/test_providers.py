@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+import pytest
+
+from providers import FunctionProvider, MockProvider, Provider, ProviderRegistry
+
+
+class ProcessOnly(Provider):
+    name = "partial"
+
+    async def process(self, raw_text, inventory_json, api_key, system_prompt):
+        return []
+
+
+def test_incomplete_providers_cannot_be_created():
+    with pytest.raises(TypeError):
+        ProcessOnly()
+
+
+def test_registry_only_takes_providers():
+    with pytest.raises(TypeError):
+        ProviderRegistry(["x"]).register(object())
+
+
+def test_available_keeps_the_configured_order(monkeypatch):
+    async def process(*args):
+        return []
+
+    monkeypatch.delenv("TEST_PROVIDER_KEY", raising=False)
+    registry = ProviderRegistry(["keyed", "mock", "missing"])
+    registry.register(FunctionProvider("keyed", "Keyed", "TEST_PROVIDER_KEY", process))
+    registry.register(MockProvider("", parse=lambda text: text, latency=0, jitter=0))
+    assert [provider.name for provider, _ in registry.available()] == ["mock"]
+    assert registry.available(streaming=True)[0][0].name == "mock"
+    assert registry.unknown() == ["missing"]
+
+    monkeypatch.setenv("TEST_PROVIDER_KEY", "secret")
+    assert [provider.name for provider, _ in registry.available()] == ["keyed", "mock"]
+    assert [provider.name for provider, _ in registry.available(streaming=True)] == ["mock"]
+
+
+def test_mock_provider_replays_recorded_answers(tmp_path):
+    responses = tmp_path / "responses.jsonl"
+    responses.write_text('{"raw_text": "5 Cameras", "response": {"items": []}}\n', encoding="utf-8")
+    provider = MockProvider(str(responses), parse=lambda text: text, latency=0, jitter=0)
+    assert asyncio.run(provider.process("5  cameras", "", "", "")) == '{"items": []}'
+
+
+def test_mock_stream_holds_the_limit_while_streaming(tmp_path):
+    responses = tmp_path / "responses.jsonl"
+    responses.write_text('{"raw_text": "note", "response": {"items": [' + '{"description": "x"},' * 40 + '{}]}}\n',
+                         encoding="utf-8")
+
+    async def scenario():
+        limit = asyncio.Semaphore(1)
+        provider = MockProvider(str(responses), parse=lambda text: text, latency=0.05, jitter=0, limit=limit)
+        stream = provider.stream("note", "", "", "")
+        first = await stream.__anext__()
+        assert limit.locked()
+        rest = [chunk async for chunk in stream]
+        assert not limit.locked()
+        return first + "".join(rest)
+
+    assert asyncio.run(scenario()) == MockProvider(str(responses), parse=str).answer("note")
+
+
+
+@pytest.mark.parametrize("slots, rounds", [(None, 1), (3, 1), (1, 3)])
+def test_provider_calls_overlap_up_to_the_limit(tmp_path, slots, rounds):
+    responses = tmp_path / "responses.jsonl"
+    responses.write_text('{"raw_text": "note", "response": {"items": []}}\n', encoding="utf-8")
+
+    async def scenario():
+        limit = asyncio.Semaphore(slots) if slots else None
+        provider = MockProvider(str(responses), parse=lambda text: text, latency=0.2, jitter=0, limit=limit)
+        started = time.perf_counter()
+        answers = await asyncio.gather(*(provider.process("note", "", "", "") for _ in range(3)))
+        return answers, time.perf_counter() - started
+
+    answers, elapsed = asyncio.run(scenario())
+    assert answers == ['{"items": []}'] * 3
+    assert 0.2 * rounds <= elapsed < 0.2 * (rounds + 1)
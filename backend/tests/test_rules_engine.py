@@ -0,0 +1,77 @@
+import pytest
+
+from rules_engine import JobRequirements, RuleError, RulesEngine
+
+
+@pytest.fixture
+def engine(main):
+    return main.knowledge.rules_engine
+
+
+def quantities(lines):
+    return {line.item_id: line.quantity for line in lines}
+
+
+@pytest.mark.parametrize("role, needed, expected", [
+    ("nvr", 8, ("nvr_8ch_tplink", 1)),
+    ("nvr", 16, ("nvr_8ch_tplink", 2)),
+    ("hard_disk", 2, ("hdd_wd_purple_2tb", 1)),
+    ("hard_disk", 3, ("hdd_toshiba_4tb", 1)),
+    ("hard_disk", 8, ("hdd_toshiba_4tb", 2)),
+    ("poe_switch", 24, ("poe_switch_10port", 3)),
+])
+def test_pick_size_covers_the_size(engine, role, needed, expected):
+    item, quantity = engine.pick_size(role, needed)
+    assert (item.id, quantity) == expected
+
+
+def test_expand_adds_dependent_items(engine):
+    lines = quantities(engine.expand(JobRequirements(cameras={"cam_3mp_bullet": 4})))
+    assert lines["cam_3mp_bullet"] == 4
+    assert lines["nvr_8ch_tplink"] == 1
+    assert lines["hdd_wd_purple_2tb"] == 1
+    assert lines["poe_switch_10port"] == 1
+    assert lines["patch_cord"] == 2
+    assert lines["ip_cam_install"] == 4
+
+
+def test_expand_sizes_recorders_and_disks_for_many_cameras(engine):
+    lines = quantities(engine.expand(JobRequirements(cameras={"cam_3mp_bullet": 12})))
+    assert lines["nvr_8ch_tplink"] == 2
+    assert lines["poe_switch_10port"] == 2
+
+
+def test_expand_rejects_unknown_camera(engine):
+    with pytest.raises(RuleError):
+        engine.expand(JobRequirements(cameras={"monitor": 1}))
+
+
+def test_cable_length_uses_the_cabling_rules(engine):
+    # (4 x 35m + 4 x 1 floor x 3.5m) x 1.15 = 177.1 -> 180
+    assert engine.cable_length(4, 2, 35) == 180
+    assert engine.cable_length(4, 1, 35) == 170
+
+
+def test_rules_override_the_defaults(main):
+    snapshot = main.knowledge
+    rules = {**snapshot.rules,
+             "cabling_calculation": {"building_height_factor": 5, "wastage_factor": 1},
+             "storage_calculation": {"tb_by_cameras": {"8": 4}, "tb_per_camera_day": 0.05}}
+    engine = RulesEngine(snapshot.items, rules, main.database.inventory_specs())
+    assert engine.cable_length(2, 3, 35) == 90  # 2 x 35m + 2 x 2 floors x 5m
+    assert engine.storage_needed(4, None) == 4
+    assert engine.storage_needed(4, 10) == 2
+
+
+def test_analog_cameras_use_adaptors_and_basic_installation(engine):
+    lines = quantities(engine.expand(JobRequirements(cameras={"cam_cctv_low": 3})))
+    assert lines["nvr_8ch_tplink"] == 1  # No DVR in stock
+    assert lines["adaptor"] == 3
+    assert lines["installation_basic"] == 1
+    assert "poe_switch_10port" not in lines
+
+
+def test_noted_cable_wins_when_longer(engine):
+    computed = quantities(engine.expand(JobRequirements(cameras={"cam_3mp_bullet": 2})))["utp_cabling_white"]
+    noted = quantities(engine.expand(JobRequirements(cameras={"cam_3mp_bullet": 2}, cable_m=computed + 25)))
+    assert noted["utp_cabling_white"] == computed + 30
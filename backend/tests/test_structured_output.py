@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from structured_output import StructuredOutputError, decode_response, normalize_item, parse_quotation_items, repair_json
+
+CAMERA = {"description": "Camera", "quantity": 2, "rate": 3990, "amount": 7980}
+
+
+@pytest.mark.parametrize("data, expected", [
+    (CAMERA, CAMERA),
+    ({"description": " Camera ", "quantity": "2 nos", "rate": "3,990", "amount": "7,980"}, CAMERA),
+    ({"description": "Camera", "quantity": 2, "rate": 3990}, CAMERA),  # Amount derived
+    ({"description": "Camera", "rate": 3990, "amount": 7980}, CAMERA),  # Quantity derived
+    ({"description": "Camera", "quantity": 2, "amount": 7980}, CAMERA),  # Rate derived
+    ({"description": "Camera", "quantity": 2, "rate": 3990, "amount": 9000}, CAMERA),  # Wrong amount recomputed
+    ({"description": "Camera", "quantity": 1.6, "rate": 3990, "amount": 7980}, CAMERA),
+])
+def test_items_are_normalized(data, expected):
+    item = normalize_item(data)
+    assert item == expected
+    assert isinstance(item["quantity"], int)
+
+
+@pytest.mark.parametrize("data", [
+    None, [], "Camera", {"quantity": 2, "rate": 3990}, {"description": " ", "quantity": 2, "rate": 1},
+    {"description": "Camera", "quantity": 2}, {"description": "Camera", "quantity": True, "rate": 3990},
+])
+def test_invalid_items_are_dropped(data):
+    assert normalize_item(data) is None
+
+
+def test_truncated_json_is_closed_after_the_last_complete_item():
+    text = '{"items": [{"description": "Camera", "quantity": 2}, {"description": "Nv'
+    assert json.loads(repair_json(text)) == {"items": [{"description": "Camera", "quantity": 2}]}
+    assert repair_json('{"items": [{"description": "Cam') is None
+    assert repair_json("no json here") is None
+
+
+def test_fenced_answer_with_preamble_is_repaired():
+    answer = 'Here is the quotation:\n```json\n{"items": [' + json.dumps(CAMERA) + ']}\n```\nLet me know!'
+    assert decode_response(answer) == ([CAMERA], "repaired")
+
+
+@pytest.mark.parametrize("response, recovery", [
+    (json.dumps({"items": [CAMERA]}), "json"),
+    (json.dumps([CAMERA]), "json"),
+    ({"items": [CAMERA]}, "json"),  # Tool input, already decoded
+    (json.dumps(CAMERA), "json"),  # A single item
+    ('{"items": [' + json.dumps(CAMERA) + ', {"description": "Nvr", "quantity": 1,', "repaired"),
+])
+def test_decoded_items_and_recovery(response, recovery):
+    items, how = decode_response(response)
+    assert (items[0], how) == (CAMERA, recovery)
+
+
+def test_complete_items_are_salvaged_from_broken_json():
+    answer = '{"items": [' + json.dumps(CAMERA) + ', {"description": oops}]}'
+    items, how = decode_response(answer)
+    assert (items, how) == ([CAMERA], "salvaged")
+
+
+def test_answers_without_a_valid_item_raise():
+    with pytest.raises(StructuredOutputError):
+        parse_quotation_items("Sorry, I cannot help with that.")
+    with pytest.raises(StructuredOutputError):
+        parse_quotation_items('{"items": [{"description": "Camera"}]}')
+    assert parse_quotation_items('{"items": [{"description": "Camera"}, ' + json.dumps(CAMERA) + ']}') == [CAMERA]
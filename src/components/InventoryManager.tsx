@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { Button } from '@/components/ui/button'
 import { Input } from '@/components/ui/input'
 import { Label } from '@/components/ui/label'
@@ -11,8 +11,17 @@ interface InventoryManagerProps {
   onOpenChange: (open: boolean) => void
 }
 
+// Response of GET /api/inventory?since=<version>
+interface InventoryDelta {
+  items: InventoryItem[]
+  deleted: string[]
+  version: number
+  reset: boolean
+}
+
 export function InventoryManager({ open, onOpenChange }: InventoryManagerProps) {
   const [items, setItems] = useState<InventoryItem[]>([])
+  const inventoryVersion = useRef<number | null>(null)
   const [isLoading, setIsLoading] = useState(false)
   const [isAdding, setIsAdding] = useState(false)
   const [newItem, setNewItem] = useState<Partial<InventoryItem>>({
@@ -31,12 +40,24 @@ export function InventoryManager({ open, onOpenChange }: InventoryManagerProps)
   }, [open])
 
   const fetchInventory = async () => {
-    setIsLoading(true)
+    // First load gets the full list; later refreshes only fetch what changed since our version
+    const since = inventoryVersion.current ?? 0
+    setIsLoading(inventoryVersion.current === null)
     try {
-      const response = await fetch('http://localhost:8000/api/inventory')
+      const response = await fetch(`http://localhost:8000/api/inventory?since=${since}`)
       if (response.ok) {
-        const data = await response.json()
-        setItems(data)
+        const data: InventoryDelta = await response.json()
+        setItems(current => {
+          if (data.reset) return data.items
+          const changed = new Map(data.items.map(item => [item.id, item]))
+          const deleted = new Set(data.deleted)
+          const merged = current
+            .filter(item => !deleted.has(item.id))
+            .map(item => changed.get(item.id) ?? item)
+          const known = new Set(current.map(item => item.id))
+          return [...merged, ...data.items.filter(item => !known.has(item.id))]
+        })
+        inventoryVersion.current = data.version
       }
     } catch (error) {
       console.error('Error fetching inventory:', error)
@@ -65,7 +86,7 @@ export function InventoryManager({ open, onOpenChange }: InventoryManagerProps)
       })
 
       if (response.ok) {
-        await fetchInventory() // Refresh list from backend
+        await fetchInventory() // Pull the changes from backend
         setNewItem({ name: '', category: 'other', price: 0, unit: 'piece', description: '' })
         setIsAdding(false)
       }
@@ -81,7 +102,7 @@ export function InventoryManager({ open, onOpenChange }: InventoryManagerProps)
       })
 
       if (response.ok) {
-        await fetchInventory() // Refresh list from backend
+        await fetchInventory() // Pull the changes from backend
       }
     } catch (error) {
       console.error('Error deleting item:', error)
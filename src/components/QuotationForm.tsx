@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { Button } from '@/components/ui/button'
 import { Input } from '@/components/ui/input'
 import { Label } from '@/components/ui/label'
@@ -36,6 +36,9 @@ export function QuotationForm({ onBackToAI, initialItems }: QuotationFormProps)
 
   const [items, setItems] = useState<QuotationItem[]>([])
 
+  // Last downloaded PDF, reused when the backend answers 304 Not Modified
+  const lastPdf = useRef<{ etag: string; blob: Blob } | null>(null)
+
   // Load initial items if provided
   useEffect(() => {
     if (initialItems && initialItems.length > 0) {
@@ -99,20 +102,32 @@ export function QuotationForm({ onBackToAI, initialItems }: QuotationFormProps)
       }
 
       // Call backend API to generate PDF
+      const headers: Record<string, string> = {
+        'Content-Type': 'application/json',
+      }
+      if (lastPdf.current) {
+        headers['If-None-Match'] = lastPdf.current.etag
+      }
+
       const response = await fetch('http://localhost:8000/api/generate-pdf', {
         method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
+        headers,
         body: JSON.stringify(pdfData)
       })
 
-      if (!response.ok) {
+      let blob: Blob
+      if (response.status === 304 && lastPdf.current) {
+        // Same quotation as last time - reuse the PDF we already have
+        blob = lastPdf.current.blob
+      } else if (response.ok) {
+        blob = await response.blob()
+        const etag = response.headers.get('ETag')
+        lastPdf.current = etag ? { etag, blob } : null
+      } else {
         throw new Error('Failed to generate PDF')
       }
 
       // Download the PDF
-      const blob = await response.blob()
       const url = window.URL.createObjectURL(blob)
       const a = document.createElement('a')
       a.href = url
@@ -30,8 +30,8 @@ export function TextInputForm({ onOpenQuotation }: TextInputFormProps) {
     setIsLoading(true)
 
     try {
-      // Call backend API
-      const response = await fetch('http://localhost:8000/api/process', {
+      // Call streaming backend API (one JSON event per line)
+      const response = await fetch('http://localhost:8000/api/process/stream', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -39,18 +39,50 @@ export function TextInputForm({ onOpenQuotation }: TextInputFormProps) {
         body: JSON.stringify({ raw_text: text })
       })
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error('Failed to process request')
       }
 
-      const data = await response.json()
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
+      let streamedItems: QuotationItem[] = []
+      let data: { items: QuotationItem[]; message: string } | null = null
+
+      while (data === null) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+
+        const lines = buffer.split('\n')
+        buffer = lines.pop() ?? ''
+        for (const line of lines) {
+          if (!line.trim()) continue
+          const event = JSON.parse(line)
+          if (event.type === 'item') {
+            streamedItems = [...streamedItems, event.item]
+            setResult(`Received ${streamedItems.length} items... (latest: ${event.item.description})`)
+          } else if (event.type === 'reset') {
+            streamedItems = []
+          } else if (event.type === 'done') {
+            data = event
+          } else if (event.type === 'error') {
+            throw new Error(event.detail)
+          }
+        }
+      }
+
+      if (data === null) {
+        throw new Error('Stream ended before the quotation was complete')
+      }
+      const finalData = data
 
       // Show result
-      setResult(`${data.message} - Generated ${data.items.length} items`)
+      setResult(`${finalData.message} - Generated ${finalData.items.length} items`)
 
       // Auto-navigate to quotation with populated items
       setTimeout(() => {
-        onOpenQuotation(data.items)
+        onOpenQuotation(finalData.items)
       }, 1000)
 
     } catch (error) {